@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from raffles.models import Raffle, RaffleOrder
+
+
+class CustomerAreaTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.client.force_login(self.user)
+
+    def campaign(self, name, *quantities):
+        raffle = Raffle.objects.create(
+            name=name, prize_name='Moto', total_numbers=50,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        raffle.initialize_numbers()
+        for quantity in quantities:
+            order = RaffleOrder.objects.create(raffle=raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+            order.allocate_numbers()
+            order.mark_as_paid()
+        return raffle
+
+    def area(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('customer_area'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_summary_per_campaign(self):
+        raffle = self.campaign('Campanha', 3, 2)
+
+        response, _ = self.area()
+
+        [campaign] = response.context['my_campaigns_grouped']
+        self.assertEqual(campaign['raffle'], raffle)
+        self.assertEqual((campaign['purchased_count'], campaign['total_amount']), (5, 10))
+        self.assertEqual(len(campaign['orders']), 2)
+
+    def test_query_count_does_not_grow_with_the_history(self):
+        self.campaign('Primeira', 1)
+        self.area()
+        _, one_campaign = self.area()
+
+        self.campaign('Segunda', 2, 4)
+        self.campaign('Terceira', 1, 1, 1)
+        response, three_campaigns = self.area()
+
+        self.assertEqual(len(response.context['my_campaigns_grouped']), 3)
+        self.assertEqual(one_campaign, three_campaigns)
+
+    @mock.patch('accounts.views.CUSTOMER_NUMBERS_PAGE_SIZE', 2)
+    def test_numbers_are_paged_by_number(self):
+        raffle = self.campaign('Campanha', 5)
+        url = reverse('customer_numbers', args=[raffle.pk])
+
+        seen = []
+        after = 0
+        while after is not None:
+            page = self.client.get(url, {'after': after}).json()
+            self.assertLessEqual(len(page['numbers']), 2)
+            seen += [item['number'] for item in page['numbers']]
+            after = page['next']
+
+        self.assertEqual(seen, sorted(raffle.numbers.filter(user=self.user).values_list('number', flat=True)))
+        self.assertEqual(len(seen), 5)
@@ -148,12 +148,24 @@ def customer_login(request):
     return render(request, 'accounts/customer_login.html')
 
 
+# Compras exibidas por campanha na área do cliente (as mais recentes)
+CUSTOMER_ORDERS_PER_RAFFLE = 20
+# Números por página na área do cliente (carregados sob demanda por campanha)
+CUSTOMER_NUMBERS_PAGE_SIZE = 200
+
+
 @login_required
 def customer_area(request):
-    """Area do cliente - ver seus numeros e historico"""
-    from raffles.models import RaffleNumber, RaffleOrder, Referral, PrizeNumber, Raffle, SiteConfiguration
-    from django.db.models import F
-    from django.db.models.functions import Coalesce
+    """Area do cliente - ver seus numeros e historico
+
+    The summary is built from a fixed set of grouped queries, whatever the
+    purchase history. The numbers of each campaign are loaded page by page
+    from customer_numbers when the campaign is opened.
+    """
+    from raffles.models import RaffleNumber, RaffleOrder, Referral, Raffle, SiteConfiguration
+    from django.db.models import F, Max, Sum, Count, Window
+    from django.db.models.functions import RowNumber
+    from collections import defaultdict
 
     # Get active campaign for "back to campaign" button
     active_campaign = None
@@ -164,158 +176,156 @@ def customer_area(request):
         # If no default set, get first active raffle
         active_campaign = Raffle.objects.filter(status=Raffle.Status.ACTIVE).first()
 
-    my_numbers = RaffleNumber.objects.filter(
-        user=request.user,
-        status__in=['reserved', 'vendido']
-    ).select_related('raffle').order_by(
-        # Ordena pelo mais recente entre sold_at e reserved_at
-        Coalesce('sold_at', 'reserved_at').desc(nulls_last=True),
-        '-id'  # Fallback para ID se ambos forem null
+    # Totais pagos por campanha, da compra mais recente para a mais antiga
+    paid_totals = list(
+        RaffleOrder.objects.filter(
+            user=request.user,
+            status=RaffleOrder.Status.PAID
+        ).values('raffle_id').annotate(
+            total_amount=Sum('amount'),
+            total_tickets=Sum('quantity'),
+            last_order_at=Max('created_at'),
+        ).order_by('-last_order_at')
     )
-    
-    # Get all prize numbers for the user's raffles and mark them
-    # Include all prize numbers (released or not) so user can see them in yellow
-    prize_numbers_dict = {}
-    user_raffle_ids = list(set([n.raffle_id for n in my_numbers]))
-    
-    # Only fetch prize numbers from raffles where user has numbers
-    if user_raffle_ids:
-        prize_numbers = PrizeNumber.objects.filter(raffle_id__in=user_raffle_ids)
-        
-        for prize in prize_numbers:
-            # Create key matching template format exactly
-            # Template: number.raffle.id|stringformat:"d"|add:"_"|add:number.number|stringformat:"d"
-            key = f"{prize.raffle_id}_{prize.number}"
-            prize_numbers_dict[key] = True  # Simple True for template checking
-
-    my_orders = RaffleOrder.objects.filter(
-        user=request.user
-    ).select_related('raffle').order_by('-created_at')
+    raffle_ids = [row['raffle_id'] for row in paid_totals]
 
-    # Group orders by campaign with totals
-    from collections import defaultdict
-    from django.db.models import Sum
+    # Números do usuário por campanha e origem
+    number_counts = defaultdict(lambda: defaultdict(int))
+    for raffle_id, source, total in RaffleNumber.objects.filter(
+        user=request.user,
+        status=RaffleNumber.Status.SOLD
+    ).values_list('raffle_id', 'source').annotate(total=Count('id')).order_by():
+        number_counts[raffle_id][source] += total
 
+    # Compras mais recentes de cada campanha (todas as situações)
+    recent_orders = RaffleOrder.objects.filter(
+        user=request.user,
+        raffle_id__in=raffle_ids
+    ).annotate(
+        position=Window(RowNumber(), partition_by=F('raffle_id'), order_by=F('created_at').desc())
+    ).filter(position__lte=CUSTOMER_ORDERS_PER_RAFFLE).order_by('-created_at')
     orders_by_raffle = defaultdict(list)
-    for order in my_orders:
-        if order.status == RaffleOrder.Status.PAID:
-            orders_by_raffle[order.raffle].append(order)
+    for order in recent_orders:
+        orders_by_raffle[order.raffle_id].append(order)
+
+    # Get successful referrals grouped by campaign
+    all_referrals = Referral.objects.filter(
+        inviter=request.user,
+        status=Referral.Status.REDEEMED
+    ).select_related('invitee').order_by('raffle', '-redeemed_at')
+    referrals_by_raffle = defaultdict(list)
+    for referral in all_referrals:
+        referrals_by_raffle[referral.raffle_id].append(referral)
+
+    # Get user's referral codes (one per campaign)
+    referral_codes = Referral.objects.filter(inviter=request.user)
+    referral_codes_by_raffle = defaultdict(list)
+    for referral in referral_codes:
+        referral_codes_by_raffle[referral.raffle_id].append(referral)
+
+    raffles = Raffle.objects.in_bulk(set(raffle_ids) | set(referrals_by_raffle) | set(referral_codes_by_raffle))
 
     # Create grouped campaigns structure
+    tickets_by_raffle = {}
     my_campaigns_grouped = []
-    for raffle, orders in orders_by_raffle.items():
-        # Contar números comprados (source='purchase')
-        purchased_count = RaffleNumber.objects.filter(
-            raffle=raffle,
-            order__user=request.user,
-            order__status=RaffleOrder.Status.PAID,
-            source='purchase'
-        ).count()
-        
-        # Contar bônus de compra (purchase_bonus)
-        purchase_bonus_count = RaffleNumber.objects.filter(
-            raffle=raffle,
-            order__user=request.user,
-            order__status=RaffleOrder.Status.PAID,
-            source='purchase_bonus'
-        ).count()
-        
-        # Contar bônus de indicação (inviter + invitee)
+    for row in paid_totals:
+        raffle = raffles[row['raffle_id']]
+        counts = number_counts[raffle.id]
+        tickets_by_raffle[raffle.id] = row['total_tickets'] or 0
+
+        purchased_count = counts[RaffleNumber.Source.PURCHASE]
+        purchase_bonus_count = counts[RaffleNumber.Source.PURCHASE_BONUS]
         # Inviter: você indicou alguém (base + progressivo)
         # Invitee: você foi indicado por alguém
-        referral_bonus_count = RaffleNumber.objects.filter(
-            raffle=raffle,
-            order__user=request.user,
-            order__status=RaffleOrder.Status.PAID,
-            source__in=['referral_inviter', 'referral_invitee']
-        ).count()
-        
-        # Total de bônus (compra + indicação)
-        total_bonus = purchase_bonus_count + referral_bonus_count
-        
-        # Total de números (comprados + bônus)
-        total_numbers_count = purchased_count + total_bonus
-        
-        total_amount = sum(order.amount for order in orders)
+        referral_bonus_count = counts[RaffleNumber.Source.REFERRAL_INVITER] + counts[RaffleNumber.Source.REFERRAL_INVITEE]
 
         my_campaigns_grouped.append({
             'raffle': raffle,
-            'orders': orders,
+            'orders': orders_by_raffle[raffle.id],
             'purchased_count': purchased_count,  # Números comprados
             'purchase_bonus_count': purchase_bonus_count,  # Bônus de compra
             'referral_bonus_count': referral_bonus_count,  # Bônus de indicação
-            'total_quantity': total_numbers_count,  # Total
-            'total_amount': total_amount  # Investido
+            'total_quantity': purchased_count + purchase_bonus_count + referral_bonus_count,  # Total
+            'total_amount': row['total_amount'] or 0  # Investido
         })
 
-    # Get successful referrals grouped by campaign
-    all_referrals = Referral.objects.filter(
-        inviter=request.user,
-        status=Referral.Status.REDEEMED
-    ).select_related('invitee', 'raffle').order_by('raffle', '-redeemed_at')
-
-    # Group referrals by raffle
-    referrals_by_raffle = defaultdict(list)
-    for referral in all_referrals:
-        referrals_by_raffle[referral.raffle].append(referral)
-
     # Convert to list of dicts for template
     my_referrals_grouped = []
-    for raffle, referrals in referrals_by_raffle.items():
-        # Count bonus numbers for this specific raffle
-        bonus_count = RaffleNumber.objects.filter(
-            user=request.user,
-            raffle=raffle,
-            source=RaffleNumber.Source.REFERRAL_INVITER
-        ).count()
-
+    for raffle_id, referrals in referrals_by_raffle.items():
         my_referrals_grouped.append({
-            'raffle': raffle,
+            'raffle': raffles[raffle_id],
             'referrals': referrals,
             'count': len(referrals),
-            'bonus_numbers': bonus_count
+            'bonus_numbers': number_counts[raffle_id][RaffleNumber.Source.REFERRAL_INVITER]
         })
 
     # Count total bonus numbers earned from all referrals
-    bonus_numbers_count = RaffleNumber.objects.filter(
-        user=request.user,
-        source=RaffleNumber.Source.REFERRAL_INVITER
-    ).count()
-
-    # Get user's referral codes with ticket counts per campaign
-    # Get all referral codes for this user
-    all_referral_codes = Referral.objects.filter(
-        inviter=request.user
-    ).select_related('raffle')
+    bonus_numbers_count = sum(
+        counts[RaffleNumber.Source.REFERRAL_INVITER] for counts in number_counts.values()
+    )
 
-    # For each referral, calculate total tickets bought in that specific raffle
+    # Only include codes where the user bought 10+ tickets in THIS specific raffle
     my_referral_codes = []
-    for referral in all_referral_codes:
-        total_tickets = RaffleOrder.objects.filter(
-            user=request.user,
-            raffle=referral.raffle,
-            status=RaffleOrder.Status.PAID
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-
-        # Only include if user bought 10+ tickets in THIS specific raffle
+    for raffle_id, referrals in referral_codes_by_raffle.items():
+        total_tickets = tickets_by_raffle.get(raffle_id, 0)
         if total_tickets >= 10:
-            # Add total_tickets as an attribute for display
-            referral.total_tickets = total_tickets
-            my_referral_codes.append(referral)
+            for referral in referrals:
+                referral.raffle = raffles[raffle_id]
+                referral.total_tickets = total_tickets
+                my_referral_codes.append(referral)
 
     context = {
-        'my_numbers': my_numbers,
-        'my_orders': my_orders,
         'my_campaigns_grouped': my_campaigns_grouped,
         'my_referrals_grouped': my_referrals_grouped,
         'bonus_numbers_count': bonus_numbers_count,
         'my_referral_codes': my_referral_codes,
-        'prize_numbers_dict': prize_numbers_dict,
         'active_campaign': active_campaign,
     }
     return render(request, 'accounts/customer_area.html', context)
 
 
+@login_required
+def customer_numbers(request, raffle_id):
+    """One page of the user's numbers in a campaign (JSON), ordered by number
+
+    Keyset-paginated with ?after=<last number of the previous page>.
+    """
+    from django.http import JsonResponse
+    from raffles.models import RaffleNumber, PrizeNumber
+
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetro after inválido'}, status=400)
+
+    page = list(
+        RaffleNumber.objects.filter(
+            raffle_id=raffle_id,
+            user=request.user,
+            status__in=[RaffleNumber.Status.RESERVED, RaffleNumber.Status.SOLD],
+            number__gt=after
+        ).order_by('number').values_list('number', 'source')[:CUSTOMER_NUMBERS_PAGE_SIZE + 1]
+    )
+    has_more = len(page) > CUSTOMER_NUMBERS_PAGE_SIZE
+    page = page[:CUSTOMER_NUMBERS_PAGE_SIZE]
+
+    # Números premiados aparecem em destaque (liberados ou não)
+    prizes = set(
+        PrizeNumber.objects.filter(
+            raffle_id=raffle_id,
+            number__in=[number for number, _ in page]
+        ).values_list('number', flat=True)
+    )
+
+    return JsonResponse({
+        'numbers': [
+            {'number': number, 'source': source, 'prize': number in prizes}
+            for number, source in page
+        ],
+        'next': page[-1][0] if has_more else None,
+    })
+
+
 def logout_view(request):
     """Logout"""
     auth_logout(request)
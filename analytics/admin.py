@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import PageView
+from .models import PageView, PageViewDaily, VisitorSketch, ConversionFunnel
 
 
 @admin.register(PageView)
 class PageViewAdmin(admin.ModelAdmin):
     list_display = ('get_page_info', 'raffle', 'ip_address', 'viewed_at')
     list_filter = ('page_type', 'raffle', 'viewed_at', 'country')
-    search_fields = ('ip_address', 'raffle__name', 'user_agent')
+    search_fields = ('ip_address', 'raffle__name', 'user_agent__value')
     readonly_fields = ('viewed_at', 'user_agent', 'ip_address', 'referer', 'country')
     date_hierarchy = 'viewed_at'
     
@@ -22,3 +22,59 @@ class PageViewAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(PageViewDaily)
+class PageViewDailyAdmin(admin.ModelAdmin):
+    list_display = ('date', 'page_type', 'raffle', 'views')
+    list_filter = ('page_type', 'date')
+    list_select_related = ('raffle',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VisitorSketch)
+class VisitorSketchAdmin(admin.ModelAdmin):
+    list_display = ('date', 'raffle', 'estimated_visitors', 'updated_at')
+    list_select_related = ('raffle',)
+    date_hierarchy = 'date'
+    exclude = ('registers',)
+    
+    def estimated_visitors(self, obj):
+        return obj.sketch().count()
+    estimated_visitors.short_description = 'Visitantes únicos (estimativa)'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ConversionFunnel)
+class ConversionFunnelAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'raffle', 'referral_code', 'views', 'orders', 'paid_orders', 'revenue')
+    list_filter = ('raffle',)
+    list_select_related = ('raffle',)
+    search_fields = ('referral_code',)
+    date_hierarchy = 'hour'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
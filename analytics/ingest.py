@@ -0,0 +1,259 @@
+"""
+Buffered ingestion of page views.
+
+The middleware only puts a small event in a bounded in-process queue. One
+writer thread per process drains it and saves the events with bulk_create
+every BATCH_SIZE events or FLUSH_INTERVAL seconds, whichever comes first.
+When the queue is full the event is dropped: analytics must never slow
+down or block a request.
+
+Each batch also updates the HyperLogLog sketches of unique visitors per
+day and raffle (VisitorSketch) and the views of the conversion funnel
+(ConversionFunnel).
+
+The writer only inserts. The retention policy (daily rollup, pruning of
+old raw rows) runs as a scheduled job: ``manage.py prune_page_views``.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.db import connection, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LRU:
+    """Tiny least-recently-used map, only touched by the writer thread"""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def discard(self, key):
+        self._items.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._items
+
+
+class PageViewWriter:
+    """Bounded queue plus a single background writer"""
+
+    QUEUE_SIZE = 10000
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 1.0
+    SLUG_CACHE_SIZE = 256
+    STRING_CACHE_SIZE = 1024
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+        # Caches usados só pela thread que grava
+        self._slug_ids = LRU(self.SLUG_CACHE_SIZE)
+        self._user_agent_ids = LRU(self.STRING_CACHE_SIZE)
+        self._referer_ids = LRU(self.STRING_CACHE_SIZE)
+        self.dropped = 0
+
+    def add(self, event):
+        """Queue an event without blocking. Returns False when it was dropped"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"⚠️ Fila de visualizações cheia, {self.dropped} eventos descartados até agora")
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pageview-writer', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """Wait for the first event, then collect until BATCH_SIZE or FLUSH_INTERVAL"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.FLUSH_INTERVAL
+        while len(batch) < self.BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.flush(batch)
+            except Exception as e:
+                logger.error(f"Erro ao gravar {len(batch)} visualizações: {e}", exc_info=True)
+                # A conexão pode ter ficado inválida; a próxima gravação abre outra
+                connection.close()
+
+    def drain(self):
+        """Save whatever is still queued, in the calling thread"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(events), self.BATCH_SIZE):
+            self.flush(events[start:start + self.BATCH_SIZE])
+
+    def flush(self, events):
+        """Save a batch of events with a single INSERT"""
+        self._resolve_raffles(events)
+        try:
+            self._insert(events)
+        except IntegrityError:
+            # Um id em cache pode ter sido removido pela retenção em outro processo
+            self._user_agent_ids = LRU(self.STRING_CACHE_SIZE)
+            self._referer_ids = LRU(self.STRING_CACHE_SIZE)
+            self._insert(events)
+        self._update_sketches(events)
+        self._update_funnel(events)
+
+    def _update_sketches(self, events):
+        """Add the visitors of the batch to today's sketches (site and per raffle)"""
+        from .hll import HyperLogLog
+        from .models import VisitorSketch
+
+        sketches = defaultdict(HyperLogLog)
+        for event in events:
+            visitor = VisitorSketch.visitor_key(event['ip_address'], event['user_agent'])
+            sketches[None].add(visitor)
+            if event.get('raffle_id'):
+                sketches[event['raffle_id']].add(visitor)
+        VisitorSketch.record(timezone.localdate(), sketches)
+
+    def _update_funnel(self, events):
+        """Add the public raffle page views of the batch to the current hour of the funnel"""
+        from .models import ConversionFunnel, PageView
+
+        counts = Counter(
+            (event['raffle_id'], event.get('referral_code', ''))
+            for event in events
+            if event['page_type'] == PageView.PageType.RAFFLE_PUBLIC and event.get('raffle_id')
+        )
+        if not counts:
+            return
+        self._resolve_referral_codes(counts)
+        ConversionFunnel.add_views(timezone.now(), counts)
+
+    def _resolve_referral_codes(self, counts):
+        """Move views with a code that is not a referral of that raffle to the empty code
+
+        The code comes from the ?ref= of the link, so anything can arrive here.
+        """
+        from raffles.models import Referral
+
+        codes = {code for _, code in counts if code}
+        if not codes:
+            return
+        valid = set(Referral.objects.filter(code__in=codes).values_list('raffle_id', 'code'))
+        for raffle_id, code in list(counts):
+            if code and (raffle_id, code) not in valid:
+                counts[(raffle_id, '')] += counts.pop((raffle_id, code))
+
+    def _insert(self, events):
+        from .models import PageView, UserAgent, Referer
+
+        user_agent_ids = self._resolve_strings(UserAgent, self._user_agent_ids, [event['user_agent'] for event in events])
+        referer_ids = self._resolve_strings(Referer, self._referer_ids, [event['referer'] for event in events])
+        PageView.objects.bulk_create([
+            PageView(
+                page_type=event['page_type'],
+                raffle_id=event.get('raffle_id'),
+                user_agent_id=user_agent_ids.get(event['user_agent']),
+                ip_address=event['ip_address'],
+                referer_id=referer_ids.get(event['referer']),
+            )
+            for event in events
+        ])
+
+    def _resolve_strings(self, model, cache, values):
+        """Map user agents/referers to their lookup ids (LRU first, then one query)"""
+        ids = {}
+        missing = set()
+        for value in values:
+            if not value or value in ids:
+                continue
+            value_id = cache.get(value)
+            if value_id is None:
+                missing.add(value)
+            else:
+                ids[value] = value_id
+        if missing:
+            for value, value_id in model.ids_for(missing).items():
+                cache.set(value, value_id)
+                ids[value] = value_id
+        return ids
+
+    def _resolve_raffles(self, events):
+        """Turn slugs into ids and drop ids of raffles that do not exist
+
+        A single query per batch; slugs already seen come from the LRU.
+        Unknown ids would make the whole bulk insert fail on the foreign key.
+        """
+        from raffles.models import Raffle
+
+        slugs = {event['raffle_slug'] for event in events if event.get('raffle_slug')}
+        missing_slugs = {slug for slug in slugs if slug not in self._slug_ids}
+        ids = {event['raffle_id'] for event in events if event.get('raffle_id')}
+        ids.update(self._slug_ids.get(slug) for slug in slugs - missing_slugs)
+
+        existing = set()
+        if ids or missing_slugs:
+            for raffle_id, slug in Raffle.objects.filter(Q(id__in=ids) | Q(slug__in=missing_slugs)).values_list('id', 'slug'):
+                existing.add(raffle_id)
+                if slug in missing_slugs:
+                    self._slug_ids.set(slug, raffle_id)
+
+        for event in events:
+            slug = event.pop('raffle_slug', None)
+            if slug:
+                event['raffle_id'] = self._slug_ids.get(slug)
+            if event.get('raffle_id') not in existing:
+                event['raffle_id'] = None
+                # Rifa excluída ou slug trocado: esquecer o que estava no cache
+                if slug:
+                    self._slug_ids.discard(slug)
+
+
+writer = PageViewWriter()
+
+
+@atexit.register
+def _drain_on_exit():
+    try:
+        writer.drain()
+    except Exception as e:
+        logger.error(f"Erro ao gravar visualizações pendentes: {e}")
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from analytics.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Agrega os dias completos e remove as visualizações brutas antigas (política de retenção)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ANALYTICS_RAW_RETENTION_DAYS,
+            help=f'Manter as visualizações brutas dos últimos N dias (padrão: {settings.ANALYTICS_RAW_RETENTION_DAYS})'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Registros removidos por lote (padrão: 5000)')
+
+    def handle(self, *args, **options):
+        result = apply_retention(days=options['days'], batch_size=options['batch_size'])
+
+        self.stdout.write(f"📊 {result['rolled_days']} dia(s) agregado(s)")
+        if result['cutoff'] is None:
+            self.stdout.write(self.style.WARNING('⚠️  Nenhum dia agregado ainda, nada foi removido'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {result['deleted_views']} visualização(ões) anteriores a {result['cutoff']:%d/%m/%Y} removida(s), "
+            f"{result['deleted_user_agents']} user agent(s) e {result['deleted_referers']} referer(s) sem uso"
+        ))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.models import ConversionFunnel
+
+
+class Command(BaseCommand):
+    help = 'Recalcula pedidos e pagamentos do funil de conversão a partir dos pedidos (backfill/correção)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Quantos dias para trás recalcular (padrão: 30)')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        buckets = ConversionFunnel.rebuild_orders(since)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Funil recalculado desde {timezone.localtime(since):%d/%m/%Y %H:%M}: {buckets} hora(s) com pedidos'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from analytics.models import PageViewDaily
+
+
+class Command(BaseCommand):
+    help = 'Agrega as visualizações dos dias completos em PageViewDaily'
+
+    def handle(self, *args, **options):
+        days = PageViewDaily.rollup()
+        last = PageViewDaily.rolled_through()
+        self.stdout.write(self.style.SUCCESS(f'✅ {days} dia(s) agregado(s). Agregado até: {last or "-"}'))
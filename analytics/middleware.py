@@ -1,7 +1,7 @@
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
-from django.db import connection
 from analytics.models import PageView
-import threading
+from analytics.ingest import writer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +18,11 @@ class PageViewTrackingMiddleware(MiddlewareMixin):
         'customer_area': 'customer_area',
     }
     
+    # Endpoints JSON chamados pelas próprias páginas (não são visualizações)
+    IGNORED_VIEWS = {
+        'customer_numbers',
+    }
+    
     # Caminhos a ignorar
     IGNORED_PATHS = [
         '/admin/',
@@ -30,6 +35,9 @@ class PageViewTrackingMiddleware(MiddlewareMixin):
     
     def should_track(self, request):
         """Verifica se a requisição deve ser rastreada"""
+        if not settings.ANALYTICS_TRACKING:
+            return False
+        
         path = request.path
         
         # Ignorar caminhos específicos
@@ -41,6 +49,10 @@ class PageViewTrackingMiddleware(MiddlewareMixin):
         if request.method != 'GET':
             return False
         
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name in self.IGNORED_VIEWS:
+            return False
+        
         return True
     
     def get_client_ip(self, request):
@@ -54,16 +66,12 @@ class PageViewTrackingMiddleware(MiddlewareMixin):
         
         return ip[:50]  # Limitar a 50 caracteres
     
-    def get_page_type(self, request):
-        """Determina o tipo de página baseado na URL"""
-        resolver = None
-        try:
-            from django.urls import resolve
-            resolver = resolve(request.path)
-        except:
+    def get_page_type(self, match):
+        """Determina o tipo de página a partir da URL já resolvida"""
+        if match is None:
             return PageView.PageType.OTHER
         
-        view_name = resolver.url_name or ''
+        view_name = match.url_name or ''
         
         # Mapear view names para page types
         if 'home' in view_name:
@@ -77,58 +85,39 @@ class PageViewTrackingMiddleware(MiddlewareMixin):
         else:
             return PageView.PageType.OTHER
     
-    def get_raffle_id(self, request, view_name):
-        """Extrai o ID da raffle da requisição (se aplicável)"""
-        try:
-            from django.urls import resolve
-            resolver = resolve(request.path)
-            
-            # Para URLs que têm 'pk' ou 'slug'
-            if 'pk' in resolver.kwargs:
-                return resolver.kwargs.get('pk')
-            elif 'slug' in resolver.kwargs:
-                # Converter slug para ID
-                from raffles.models import Raffle
-                slug = resolver.kwargs.get('slug')
-                raffle = Raffle.objects.filter(slug=slug).first()
-                if raffle:
-                    return raffle.id
-        except:
-            pass
+    def build_event(self, request):
+        """Monta o evento com o que já está na requisição (sem consultas ao banco)"""
+        # O Django já resolveu a URL para chamar a view: reaproveitar o resultado
+        match = getattr(request, 'resolver_match', None)
+        event = {
+            'page_type': self.get_page_type(match),
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+            'ip_address': self.get_client_ip(request),
+            'referer': request.META.get('HTTP_REFERER', '')[:500],
+        }
         
-        return None
+        # Para URLs que têm 'pk' ou 'slug' (o slug vira ID na thread que grava)
+        if match is not None:
+            if 'pk' in match.kwargs:
+                event['raffle_id'] = match.kwargs.get('pk')
+            elif 'slug' in match.kwargs:
+                event['raffle_slug'] = match.kwargs.get('slug')
+        
+        # Código de indicação do link compartilhado (funil de conversão)
+        referral_code = request.GET.get('ref', '')
+        if referral_code:
+            event['referral_code'] = referral_code[:10]
+        
+        return event
     
     def process_response(self, request, response):
-        """Registra a visualização em background"""
+        """Coloca a visualização na fila de gravação em lote"""
         if not self.should_track(request):
             return response
         
-        # Executar em thread separada para não bloquear a resposta
-        thread = threading.Thread(
-            target=self._track_view,
-            args=(request,)
-        )
-        thread.daemon = True
-        thread.start()
-        
-        return response
-    
-    def _track_view(self, request):
-        """Registra a visualização no banco de dados"""
         try:
-            from django.urls import resolve
-            
-            resolver = resolve(request.path)
-            view_name = resolver.url_name or ''
-            page_type = self.get_page_type(request)
-            raffle_id = self.get_raffle_id(request, view_name)
-            
-            PageView.objects.create(
-                page_type=page_type,
-                raffle_id=raffle_id,
-                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
-                ip_address=self.get_client_ip(request),
-                referer=request.META.get('HTTP_REFERER', '')[:500],
-            )
+            writer.add(self.build_event(request))
         except Exception as e:
             logger.error(f"Erro ao registrar visualização: {e}")
+        
+        return response
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_add_country_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Data')),
+                ('page_type', models.CharField(choices=[('home', 'Home'), ('raffle_public', 'Página Pública de Raffle'), ('raffle_details', 'Detalhes da Raffle'), ('customer_area', 'Minha Área'), ('other', 'Outra Página')], default='other', max_length=20, verbose_name='Tipo de Página')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Visualizações')),
+                ('raffle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_page_views', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Visualizações por Dia',
+                'verbose_name_plural': 'Visualizações por Dia',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['raffle', 'date'], name='analytics_daily_raffle_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pageviewdaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('raffle__isnull', False)), fields=('date', 'page_type', 'raffle'), name='analytics_daily_raffle_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='pageviewdaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('raffle__isnull', True)), fields=('date', 'page_type'), name='analytics_daily_no_raffle_uniq'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_pageviewdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True, verbose_name='Hash')),
+                ('value', models.TextField(verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Referer',
+                'verbose_name_plural': 'Referers',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True, verbose_name='Hash')),
+                ('value', models.TextField(verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'User Agent',
+                'verbose_name_plural': 'User Agents',
+            },
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='page_views', to='analytics.useragent', verbose_name='User Agent'),
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='referer_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='page_views', to='analytics.referer', verbose_name='Referer'),
+        ),
+    ]
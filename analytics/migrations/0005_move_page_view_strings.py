@@ -0,0 +1,99 @@
+import hashlib
+from collections import defaultdict
+
+from django.db import migrations, transaction
+
+# Visualizações por lote: cada lote é uma transação curta
+BATCH_SIZE = 5000
+
+
+def hash_value(value):
+    # Igual a analytics.models.LookupString.hash_value
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def ids_for(model, values, using):
+    by_hash = {hash_value(value): value for value in values if value}
+    if not by_hash:
+        return {}
+    found = dict(model.objects.using(using).filter(hash__in=by_hash).values_list('hash', 'id'))
+    missing = [model(hash=value_hash, value=value) for value_hash, value in by_hash.items() if value_hash not in found]
+    if missing:
+        model.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+        found.update(model.objects.using(using).filter(hash__in=[row.hash for row in missing]).values_list('hash', 'id'))
+    return {by_hash[value_hash]: row_id for value_hash, row_id in found.items()}
+
+
+def move_strings_to_lookups(apps, schema_editor):
+    """Point every page view to the deduplicated user agent/referer rows"""
+    PageView = apps.get_model('analytics', 'PageView')
+    UserAgent = apps.get_model('analytics', 'UserAgent')
+    Referer = apps.get_model('analytics', 'Referer')
+    using = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                PageView.objects.using(using)
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'user_agent', 'referer')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            user_agent_ids = ids_for(UserAgent, {row[1] for row in batch}, using)
+            referer_ids = ids_for(Referer, {row[2] for row in batch}, using)
+
+            # Um UPDATE por combinação distinta, não por linha
+            groups = defaultdict(list)
+            for view_id, user_agent, referer in batch:
+                groups[(user_agent_ids.get(user_agent), referer_ids.get(referer))].append(view_id)
+            for (user_agent_id, referer_id), view_ids in groups.items():
+                if user_agent_id is None and referer_id is None:
+                    continue
+                PageView.objects.using(using).filter(id__in=view_ids).update(
+                    user_agent_ref_id=user_agent_id,
+                    referer_ref_id=referer_id,
+                )
+        last_id = batch[-1][0]
+
+
+def restore_strings(apps, schema_editor):
+    PageView = apps.get_model('analytics', 'PageView')
+    using = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                PageView.objects.using(using)
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'user_agent_ref__value', 'referer_ref__value')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            groups = defaultdict(list)
+            for view_id, user_agent, referer in batch:
+                groups[(user_agent or '', referer or '')].append(view_id)
+            for (user_agent, referer), view_ids in groups.items():
+                PageView.objects.using(using).filter(id__in=view_ids).update(
+                    user_agent=user_agent[:500],
+                    referer=referer[:500],
+                )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Cada lote faz commit próprio
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0004_useragent_referer'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_strings_to_lookups, restore_strings),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_move_page_view_strings'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pageview',
+            name='user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='referer',
+        ),
+        migrations.RenameField(
+            model_name='pageview',
+            old_name='user_agent_ref',
+            new_name='user_agent',
+        ),
+        migrations.RenameField(
+            model_name='pageview',
+            old_name='referer_ref',
+            new_name='referer',
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_remove_page_view_strings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Data')),
+                ('registers', models.BinaryField(verbose_name='Registros')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('raffle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Sketch de Visitantes',
+                'verbose_name_plural': 'Sketches de Visitantes',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='visitorsketch',
+            constraint=models.UniqueConstraint(condition=models.Q(('raffle__isnull', False)), fields=('date', 'raffle'), name='analytics_sketch_raffle_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitorsketch',
+            constraint=models.UniqueConstraint(condition=models.Q(('raffle__isnull', True)), fields=('date',), name='analytics_sketch_site_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversionFunnel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('referral_code', models.CharField(blank=True, default='', max_length=10, verbose_name='Código de Indicação')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Visualizações')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Pedidos')),
+                ('paid_orders', models.PositiveIntegerField(default=0, verbose_name='Pedidos Pagos')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Arrecadado')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='funnel_hours', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Funil de Conversão',
+                'verbose_name_plural': 'Funil de Conversão',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='conversionfunnel',
+            index=models.Index(fields=['raffle', 'hour'], name='analytics_funnel_raffle_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversionfunnel',
+            constraint=models.UniqueConstraint(fields=('hour', 'raffle', 'referral_code'), name='analytics_funnel_uniq'),
+        ),
+    ]
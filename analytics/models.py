@@ -1,8 +1,69 @@
-from django.db import models
+import hashlib
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
 from django.utils import timezone
 from raffles.models import Raffle
 
 
+class LookupString(models.Model):
+    """Distinct string stored once and referenced by id (user agents, referers)"""
+
+    hash = models.CharField('Hash', max_length=32, unique=True)
+    value = models.TextField('Valor')
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.value
+
+    @staticmethod
+    def hash_value(value):
+        return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def ids_for(cls, values):
+        """Map each non-empty string to the id of its row, creating the missing ones"""
+        by_hash = {cls.hash_value(value): value for value in values if value}
+        if not by_hash:
+            return {}
+
+        found = dict(cls.objects.filter(hash__in=by_hash).values_list('hash', 'id'))
+        missing = [cls(hash=value_hash, value=value) for value_hash, value in by_hash.items() if value_hash not in found]
+        if missing:
+            # Outro processo pode ter criado a mesma string ao mesmo tempo
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            found.update(
+                cls.objects.filter(hash__in=[row.hash for row in missing]).values_list('hash', 'id')
+            )
+        return {by_hash[value_hash]: row_id for value_hash, row_id in found.items()}
+
+    @classmethod
+    def prune_unused(cls, batch_size=1000):
+        """Delete the strings no page view points to anymore, in batches"""
+        deleted = 0
+        while True:
+            ids = list(cls.objects.filter(page_views__isnull=True).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+
+
+class UserAgent(LookupString):
+    class Meta:
+        verbose_name = 'User Agent'
+        verbose_name_plural = 'User Agents'
+
+
+class Referer(LookupString):
+    class Meta:
+        verbose_name = 'Referer'
+        verbose_name_plural = 'Referers'
+
+
 class PageView(models.Model):
     """Modelo para registrar visualizações de páginas"""
     
@@ -29,9 +90,24 @@ class PageView(models.Model):
         help_text='Raffle relacionada (se aplicável)'
     )
     
-    user_agent = models.CharField('User Agent', max_length=500, blank=True)
+    # User agent e referer se repetem muito: ficam em tabelas próprias, uma linha por valor
+    user_agent = models.ForeignKey(
+        UserAgent,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='page_views',
+        verbose_name='User Agent'
+    )
     ip_address = models.CharField('IP Address', max_length=50, blank=True)
-    referer = models.CharField('Referer', max_length=500, blank=True)
+    referer = models.ForeignKey(
+        Referer,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='page_views',
+        verbose_name='Referer'
+    )
     
     # Geolocalização básica (opcional, pode ser expandido)
     country = models.CharField('País', max_length=100, blank=True)
@@ -50,6 +126,22 @@ class PageView(models.Model):
     
     def __str__(self):
         return f"{self.get_page_type_display()} - {self.viewed_at.strftime('%Y-%m-%d %H:%M')}"
+
+    @classmethod
+    def delete_before(cls, cutoff, batch_size=5000):
+        """Delete the raw views older than ``cutoff`` in short batches
+
+        Each batch is its own statement, so the table is never locked for
+        long and replication/WAL stays smooth. Returns how many rows went.
+        """
+        deleted = 0
+        while True:
+            ids = list(
+                cls.objects.filter(viewed_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
     
     @classmethod
     def get_total_views(cls, days=None):
@@ -99,3 +191,366 @@ class PageView(models.Model):
             .annotate(count=Count('id'))
             .order_by('date')
         )
+
+
+def start_of_day(day):
+    """Aware datetime of the local midnight that starts ``day``"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class PageViewDaily(models.Model):
+    """Visualizações agregadas por dia, tipo de página e rifa
+
+    Os dias completos vêm daqui; só os dias ainda não agregados (normalmente
+    apenas hoje) são lidos da tabela PageView.
+    """
+
+    # Dias agregados por consulta ao processar um histórico longo
+    ROLLUP_CHUNK_DAYS = 7
+
+    date = models.DateField('Data')
+    page_type = models.CharField(
+        'Tipo de Página',
+        max_length=20,
+        choices=PageView.PageType.choices,
+        default=PageView.PageType.OTHER
+    )
+    raffle = models.ForeignKey(
+        Raffle,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_page_views'
+    )
+    views = models.PositiveIntegerField('Visualizações', default=0)
+
+    class Meta:
+        verbose_name = 'Visualizações por Dia'
+        verbose_name_plural = 'Visualizações por Dia'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'page_type', 'raffle'],
+                condition=models.Q(raffle__isnull=False),
+                name='analytics_daily_raffle_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'page_type'],
+                condition=models.Q(raffle__isnull=True),
+                name='analytics_daily_no_raffle_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['raffle', 'date'], name='analytics_daily_raffle_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.get_page_type_display()} - {self.views}"
+
+    @classmethod
+    def rolled_through(cls):
+        """Last day already aggregated (None before the first rollup)"""
+        return cls.objects.aggregate(last=Max('date'))['last']
+
+    @classmethod
+    def tail_start(cls):
+        """First instant not covered by the rollup: raw rows from here on"""
+        last = cls.rolled_through()
+        return start_of_day(last + timedelta(days=1)) if last else None
+
+    @classmethod
+    def rollup(cls, until=None):
+        """Aggregate the raw views of every complete day not rolled up yet
+
+        Goes up to ``until`` (exclusive, default and at most today), so the
+        raw rows of today stay as the live tail. Idempotent: the days are
+        rewritten as a whole. Returns how many days were processed.
+        """
+        today = timezone.localdate()
+        until = min(until or today, today)
+
+        last = cls.rolled_through()
+        if last is not None:
+            day = last + timedelta(days=1)
+        else:
+            first = PageView.objects.aggregate(first=Min('viewed_at'))['first']
+            if first is None:
+                return 0
+            day = timezone.localtime(first).date()
+
+        processed = 0
+        while day < until:
+            chunk_end = min(day + timedelta(days=cls.ROLLUP_CHUNK_DAYS), until)
+            rows = (
+                PageView.objects
+                .filter(viewed_at__gte=start_of_day(day), viewed_at__lt=start_of_day(chunk_end))
+                .annotate(date=TruncDate('viewed_at'))
+                .values('date', 'page_type', 'raffle_id')
+                .annotate(views=Count('id'))
+            )
+            try:
+                with transaction.atomic():
+                    cls.objects.filter(date__gte=day, date__lt=chunk_end).delete()
+                    cls.objects.bulk_create([
+                        cls(date=row['date'], page_type=row['page_type'], raffle_id=row['raffle_id'], views=row['views'])
+                        for row in rows
+                    ], batch_size=1000)
+            except IntegrityError:
+                # Outro processo agregou os mesmos dias ao mesmo tempo
+                return processed
+            processed += (chunk_end - day).days
+            day = chunk_end
+
+        return processed
+
+    @classmethod
+    def count_by(cls, *fields, since=None):
+        """Views grouped by ``fields`` ('date', 'page_type', 'raffle_id'), from day ``since`` on
+
+        Returns {tuple of field values: views}. Complete days come from the
+        rollup and only the days not rolled up yet are read from PageView,
+        so the cost does not grow with the history.
+        """
+        totals = defaultdict(int)
+        tail_start = cls.tail_start()
+
+        if tail_start is not None:
+            daily = cls.objects.all()
+            if since:
+                daily = daily.filter(date__gte=since)
+            for row in daily.values(*fields).annotate(total=Sum('views')).order_by():
+                totals[tuple(row[field] for field in fields)] += row['total']
+
+        raw = PageView.objects.all()
+        if tail_start is not None:
+            raw = raw.filter(viewed_at__gte=tail_start)
+        if since:
+            raw = raw.filter(viewed_at__gte=start_of_day(since))
+        if 'date' in fields:
+            raw = raw.annotate(date=TruncDate('viewed_at'))
+        for row in raw.values(*fields).annotate(total=Count('id')).order_by():
+            totals[tuple(row[field] for field in fields)] += row['total']
+
+        return dict(totals)
+
+
+class VisitorSketch(models.Model):
+    """Sketch HyperLogLog dos visitantes únicos de um dia (por rifa, ou do site todo)
+
+    Linhas com raffle vazio contam todos os visitantes do site naquele dia.
+    Dias e rifas são combinados juntando os sketches, sem COUNT(DISTINCT)
+    sobre as visualizações brutas.
+    """
+
+    date = models.DateField('Data')
+    raffle = models.ForeignKey(
+        Raffle,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='visitor_sketches'
+    )
+    registers = models.BinaryField('Registros')
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Sketch de Visitantes'
+        verbose_name_plural = 'Sketches de Visitantes'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'raffle'],
+                condition=models.Q(raffle__isnull=False),
+                name='analytics_sketch_raffle_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['date'],
+                condition=models.Q(raffle__isnull=True),
+                name='analytics_sketch_site_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.raffle_id or 'site'}"
+
+    @staticmethod
+    def visitor_key(ip_address, user_agent):
+        """What identifies a visitor (there is no cookie): IP plus user agent"""
+        return f"{ip_address}|{user_agent}"
+
+    def sketch(self):
+        from .hll import HyperLogLog
+
+        return HyperLogLog.from_bytes(self.registers)
+
+    @classmethod
+    def record(cls, day, sketches):
+        """Merge the sketches of a batch into the stored ones
+
+        ``sketches`` maps raffle id (None for the whole site) to a
+        HyperLogLog. Each row is locked while merging, so concurrent
+        writers never lose each other's registers.
+        """
+        from .hll import HyperLogLog
+
+        for raffle_id, sketch in sketches.items():
+            with transaction.atomic():
+                row = cls.objects.select_for_update().filter(date=day, raffle_id=raffle_id).first()
+                if row is None:
+                    try:
+                        with transaction.atomic():
+                            cls.objects.create(date=day, raffle_id=raffle_id, registers=sketch.to_bytes())
+                        continue
+                    except IntegrityError:
+                        # Criada por outro processo entre a consulta e o insert
+                        row = cls.objects.select_for_update().get(date=day, raffle_id=raffle_id)
+                merged = HyperLogLog.from_bytes(row.registers).merge(sketch)
+                row.registers = merged.to_bytes()
+                row.save(update_fields=['registers', 'updated_at'])
+
+    @classmethod
+    def unique_visitors(cls, start, end, raffle_id=None):
+        """Estimated unique visitors between the days ``start`` and ``end`` (inclusive)"""
+        from .hll import HyperLogLog
+
+        total = HyperLogLog()
+        rows = cls.objects.filter(date__gte=start, date__lte=end, raffle_id=raffle_id)
+        for registers in rows.values_list('registers', flat=True):
+            total.merge(HyperLogLog.from_bytes(registers))
+        return total.count()
+
+    @classmethod
+    def unique_visitors_by_raffle(cls, start, end, raffle_ids):
+        """{raffle id: estimated unique visitors} between ``start`` and ``end``"""
+        from .hll import HyperLogLog
+
+        totals = {raffle_id: HyperLogLog() for raffle_id in raffle_ids}
+        rows = cls.objects.filter(date__gte=start, date__lte=end, raffle_id__in=raffle_ids)
+        for raffle_id, registers in rows.values_list('raffle_id', 'registers'):
+            totals[raffle_id].merge(HyperLogLog.from_bytes(registers))
+        return {raffle_id: sketch.count() for raffle_id, sketch in totals.items()}
+
+
+class ConversionFunnel(models.Model):
+    """Funil de conversão por hora, campanha e código de indicação
+
+    Updated as the events happen: the page view writer adds the public
+    page views of each batch, order creation adds ``orders`` and
+    RaffleOrder.mark_as_paid adds ``paid_orders``/``revenue``, both right
+    after their transaction commits so a purchase never holds the hour row
+    locked. Orders and payments land in the hour the order was created, so
+    a row compares the views of an hour with what the orders placed in that
+    hour became. Reading the funnel never touches
+    PageView or RaffleOrder.
+    """
+
+    hour = models.DateTimeField('Hora')
+    raffle = models.ForeignKey(
+        Raffle,
+        on_delete=models.CASCADE,
+        related_name='funnel_hours'
+    )
+    referral_code = models.CharField('Código de Indicação', max_length=10, blank=True, default='')
+    views = models.PositiveIntegerField('Visualizações', default=0)
+    orders = models.PositiveIntegerField('Pedidos', default=0)
+    paid_orders = models.PositiveIntegerField('Pedidos Pagos', default=0)
+    revenue = models.DecimalField('Arrecadado', max_digits=12, decimal_places=2, default=0)
+
+    COUNTERS = ('views', 'orders', 'paid_orders', 'revenue')
+
+    class Meta:
+        verbose_name = 'Funil de Conversão'
+        verbose_name_plural = 'Funil de Conversão'
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hour', 'raffle', 'referral_code'],
+                name='analytics_funnel_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['raffle', 'hour'], name='analytics_funnel_raffle_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}h - {self.raffle_id} {self.referral_code}".strip()
+
+    @staticmethod
+    def start_of_hour(moment):
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def add(cls, raffle_id, moment, referral_code='', **deltas):
+        """Add the deltas to the bucket of ``moment``, creating it on first use"""
+        hour = cls.start_of_hour(moment)
+        referral_code = referral_code or ''
+        bucket = cls.objects.filter(hour=hour, raffle_id=raffle_id, referral_code=referral_code)
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not changes or bucket.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(hour=hour, raffle_id=raffle_id, referral_code=referral_code, **deltas)
+        except IntegrityError:
+            # Criado por outro processo entre o update e o insert
+            bucket.update(**changes)
+
+    @classmethod
+    def add_views(cls, moment, counts):
+        """Add page views; ``counts`` maps (raffle id, referral code) to views"""
+        for (raffle_id, referral_code), views in counts.items():
+            cls.add(raffle_id, moment, referral_code, views=views)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild_orders(cls, since):
+        """Recount orders and payments from ``since`` on from RaffleOrder
+
+        Views cannot be recounted per referral code (PageView does not keep
+        it), so they are left as they are.
+        """
+        from raffles.models import RaffleOrder
+
+        since = cls.start_of_hour(since)
+        cls.objects.filter(hour__gte=since).update(orders=0, paid_orders=0, revenue=0)
+
+        paid = Q(status=RaffleOrder.Status.PAID)
+        buckets = RaffleOrder.objects.filter(created_at__gte=since).annotate(
+            hour=TruncHour('created_at')
+        ).values('hour', 'raffle_id', 'referral_code').annotate(
+            orders=Count('id'),
+            paid_orders=Count('id', filter=paid),
+            revenue=Sum('amount', filter=paid),
+        ).order_by()
+        for bucket in buckets:
+            cls.add(
+                bucket['raffle_id'],
+                bucket['hour'],
+                bucket['referral_code'],
+                orders=bucket['orders'],
+                paid_orders=bucket['paid_orders'],
+                revenue=bucket['revenue'] or 0
+            )
+        return len(buckets)
+
+    @classmethod
+    def totals(cls, since, group_by=('raffle_id',), raffle_id=None):
+        """Summed counters from ``since`` on, one dict per group, with the rates"""
+        rows = cls.objects.filter(hour__gte=since)
+        if raffle_id:
+            rows = rows.filter(raffle_id=raffle_id)
+        rows = rows.values(*group_by).annotate(
+            **{field: Sum(field) for field in cls.COUNTERS}
+        ).order_by(*group_by)
+        return [cls.with_rates(row) for row in rows]
+
+    @staticmethod
+    def with_rates(row):
+        """Add view→order, order→paid and view→paid rates (percent) to a totals row"""
+        def rate(part, whole):
+            return round(part * 100 / whole, 2) if whole else None
+
+        row['order_rate'] = rate(row['orders'], row['views'])
+        row['payment_rate'] = rate(row['paid_orders'], row['orders'])
+        row['conversion_rate'] = rate(row['paid_orders'], row['views'])
+        return row
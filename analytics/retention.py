@@ -0,0 +1,42 @@
+"""
+Retention policy for the raw page views.
+
+Raw PageView rows are only needed until their day is in PageViewDaily.
+apply_retention() rolls up the complete days, deletes the raw rows older
+than ANALYTICS_RAW_RETENTION_DAYS in batches (never a day that was not
+rolled up) and drops the user agents and referers nobody uses anymore.
+This keeps the table, and the cost of its indexes on insert, bounded.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PageView, PageViewDaily, UserAgent, Referer, start_of_day
+
+
+def apply_retention(days=None, batch_size=5000):
+    """Roll up, then prune. Returns a dict with what was done"""
+    if days is None:
+        days = settings.ANALYTICS_RAW_RETENTION_DAYS
+
+    result = {
+        'rolled_days': PageViewDaily.rollup(),
+        'deleted_views': 0,
+        'deleted_user_agents': 0,
+        'deleted_referers': 0,
+        'cutoff': None,
+    }
+
+    # Só apaga o que já está no rollup
+    tail_start = PageViewDaily.tail_start()
+    if tail_start is None:
+        return result
+    cutoff = min(start_of_day(timezone.localdate() - timedelta(days=days)), tail_start)
+    result['cutoff'] = cutoff
+
+    result['deleted_views'] = PageView.delete_before(cutoff, batch_size=batch_size)
+    if result['deleted_views']:
+        result['deleted_user_agents'] = UserAgent.prune_unused()
+        result['deleted_referers'] = Referer.prune_unused()
+    return result
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from analytics.ingest import PageViewWriter
+from analytics.models import ConversionFunnel, PageView
+from raffles.models import Raffle, RaffleOrder, Referral
+
+
+class ConversionFunnelTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=50,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.raffle.initialize_numbers()
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.since = ConversionFunnel.start_of_hour(timezone.now() - timedelta(days=1))
+
+    def test_totals_and_rates(self):
+        now = timezone.now()
+        ConversionFunnel.add(self.raffle.pk, now, views=200)
+        ConversionFunnel.add(self.raffle.pk, now, orders=10)
+        ConversionFunnel.add(self.raffle.pk, now, paid_orders=4, revenue=Decimal('40'))
+
+        [row] = ConversionFunnel.totals(self.since)
+
+        self.assertEqual(ConversionFunnel.objects.count(), 1)
+        self.assertEqual((row['views'], row['orders'], row['paid_orders'], row['revenue']), (200, 10, 4, Decimal('40')))
+        self.assertEqual((row['order_rate'], row['payment_rate'], row['conversion_rate']), (5.0, 40.0, 2.0))
+
+    def test_rates_without_views_are_empty(self):
+        ConversionFunnel.add(self.raffle.pk, timezone.now(), orders=1)
+
+        [row] = ConversionFunnel.totals(self.since)
+
+        self.assertIsNone(row['order_rate'])
+        self.assertEqual(row['payment_rate'], 0)
+
+    def test_writer_folds_unknown_referral_codes_into_the_empty_code(self):
+        referral = Referral.objects.create(raffle=self.raffle, inviter=self.user)
+        event = {'page_type': PageView.PageType.RAFFLE_PUBLIC, 'raffle_slug': 'campanha', 'ip_address': '10.0.0.1', 'user_agent': 'Mozilla', 'referer': ''}
+
+        PageViewWriter().flush([
+            dict(event, referral_code=referral.code),
+            dict(event, referral_code='INVALIDO'),
+            dict(event),
+            dict(event, page_type=PageView.PageType.HOME),
+        ])
+
+        rows = ConversionFunnel.totals(self.since, group_by=('referral_code',))
+        self.assertEqual({row['referral_code']: row['views'] for row in rows}, {'': 2, referral.code: 1})
+
+    def test_payment_is_counted_after_commit(self):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=3, amount=6)
+        order.allocate_numbers()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.mark_as_paid()
+
+        [row] = ConversionFunnel.totals(self.since)
+        self.assertEqual((row['paid_orders'], row['revenue']), (1, Decimal('6')))
+
+    def test_rebuild_recounts_orders_and_keeps_views(self):
+        for quantity, pay in ((1, True), (2, True), (3, False)):
+            order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+            order.allocate_numbers()
+            if pay:
+                order.mark_as_paid()
+        ConversionFunnel.add(self.raffle.pk, timezone.now(), views=30, orders=99)
+        out = StringIO()
+
+        call_command('rebuild_funnel', days=1, stdout=out)
+
+        [row] = ConversionFunnel.totals(self.since)
+        self.assertEqual((row['views'], row['orders'], row['paid_orders'], row['revenue']), (30, 3, 2, Decimal('6')))
+        self.assertIn('1 hora(s) com pedidos', out.getvalue())
+
+
+class FunnelApiTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.url = reverse('analytics:funnel_api')
+
+    def test_staff_only(self):
+        user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.client.force_login(user)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_groups_and_validates_the_window(self):
+        staff = User.objects.create_user(email='admin@a.com', password='x', name='Admin', whatsapp='9', is_staff=True)
+        self.client.force_login(staff)
+        ConversionFunnel.add(self.raffle.pk, timezone.now(), 'ABC', views=10, orders=2)
+        ConversionFunnel.add(self.raffle.pk, timezone.now(), views=5)
+        ConversionFunnel.add(self.raffle.pk, timezone.now() - timedelta(days=10), views=100)
+
+        data = self.client.get(self.url, {'group': 'referral', 'days': 7}).json()
+
+        self.assertEqual(
+            [(row['referral_code'], row['views'], row['orders']) for row in data['rows']],
+            [('', 5, 0), ('ABC', 10, 2)]
+        )
+        self.assertEqual(self.client.get(self.url, {'days': 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'group': 'dia'}).status_code, 400)
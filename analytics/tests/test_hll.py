@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.hll import REGISTERS, HyperLogLog
+from analytics.ingest import PageViewWriter
+from analytics.models import PageView, VisitorSketch
+from raffles.models import Raffle
+
+
+def sketch_of(values):
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+class HyperLogLogTests(TestCase):
+
+    def test_estimate_is_within_the_expected_error(self):
+        for distinct in (10, 1000, 50000):
+            estimate = sketch_of(f'visitante-{i}' for i in range(distinct)).count()
+            # Erro padrão de ~1,6%: 5% dá folga de três desvios
+            self.assertAlmostEqual(estimate, distinct, delta=max(1, distinct * 0.05))
+
+    def test_repeated_values_are_counted_once(self):
+        sketch = sketch_of(f'visitante-{i % 100}' for i in range(10000))
+
+        self.assertAlmostEqual(sketch.count(), 100, delta=5)
+
+    def test_merge_is_the_union(self):
+        first = sketch_of(f'visitante-{i}' for i in range(0, 3000))
+        second = sketch_of(f'visitante-{i}' for i in range(2000, 5000))
+        union = sketch_of(f'visitante-{i}' for i in range(0, 5000))
+
+        self.assertEqual(first.merge(second).to_bytes(), union.to_bytes())
+
+    def test_registers_round_trip_and_are_validated(self):
+        sketch = sketch_of(['a', 'b', 'c'])
+
+        self.assertEqual(HyperLogLog.from_bytes(sketch.to_bytes()).count(), 3)
+        self.assertEqual(len(sketch.to_bytes()), REGISTERS)
+        with self.assertRaises(ValueError):
+            HyperLogLog(b'\x00' * 10)
+
+
+class VisitorSketchTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.today = timezone.localdate()
+
+    def test_record_merges_into_the_stored_day(self):
+        VisitorSketch.record(self.today, {None: sketch_of(['a', 'b']), self.raffle.pk: sketch_of(['a'])})
+        VisitorSketch.record(self.today, {None: sketch_of(['b', 'c']), self.raffle.pk: sketch_of(['a'])})
+
+        self.assertEqual(VisitorSketch.objects.count(), 2)
+        self.assertEqual(VisitorSketch.unique_visitors(self.today, self.today), 3)
+        self.assertEqual(VisitorSketch.unique_visitors(self.today, self.today, raffle_id=self.raffle.pk), 1)
+
+    def test_a_visitor_on_several_days_counts_once(self):
+        yesterday = self.today - timedelta(days=1)
+        VisitorSketch.record(yesterday, {None: sketch_of(['a', 'b'])})
+        VisitorSketch.record(self.today, {None: sketch_of(['b', 'c'])})
+
+        self.assertEqual(VisitorSketch.unique_visitors(yesterday, self.today), 3)
+        self.assertEqual(VisitorSketch.unique_visitors(yesterday, yesterday), 2)
+
+    def test_writer_flush_updates_site_and_raffle_sketches(self):
+        writer = PageViewWriter()
+        events = [
+            {'page_type': PageView.PageType.RAFFLE_PUBLIC, 'raffle_slug': 'campanha', 'ip_address': f'10.0.0.{i % 4}', 'user_agent': 'Mozilla', 'referer': ''}
+            for i in range(20)
+        ] + [{'page_type': PageView.PageType.HOME, 'ip_address': '10.0.0.9', 'user_agent': 'Mozilla', 'referer': ''}]
+
+        writer.flush(events)
+
+        self.assertEqual(VisitorSketch.unique_visitors(self.today, self.today), 5)
+        self.assertEqual(
+            VisitorSketch.unique_visitors_by_raffle(self.today, self.today, [self.raffle.pk]),
+            {self.raffle.pk: 4}
+        )
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from analytics.ingest import PageViewWriter
+from analytics.models import PageView, UserAgent
+from raffles.models import Raffle
+
+
+def event(page_type=PageView.PageType.RAFFLE_PUBLIC, **extra):
+    return dict({'page_type': page_type, 'user_agent': 'Mozilla', 'ip_address': '10.0.0.1', 'referer': ''}, **extra)
+
+
+class PageViewWriterTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.writer = PageViewWriter()
+
+    def flush_queries(self, events):
+        with CaptureQueriesContext(connection) as queries:
+            self.writer.flush(events)
+        return len(queries)
+
+    def test_batch_cost_does_not_grow_with_its_size(self):
+        small = self.flush_queries([event(raffle_slug='campanha', user_agent=f'UA {i % 2}') for i in range(2)])
+        large = self.flush_queries([event(raffle_slug='campanha', user_agent=f'UA {i % 2}') for i in range(200)])
+
+        self.assertLessEqual(large, small)
+        self.assertEqual(PageView.objects.filter(raffle=self.raffle).count(), 202)
+        self.assertEqual(UserAgent.objects.count(), 2)
+
+    def test_unknown_raffles_are_saved_without_one(self):
+        self.writer.flush([event(raffle_id=9999), event(raffle_slug='nao-existe'), event(raffle_id=self.raffle.pk)])
+
+        self.assertEqual(PageView.objects.filter(raffle__isnull=True).count(), 2)
+        self.assertEqual(PageView.objects.filter(raffle=self.raffle).count(), 1)
+
+    @mock.patch.object(PageViewWriter, '_ensure_started')
+    def test_full_queue_drops_instead_of_blocking(self, ensure_started):
+        writer = PageViewWriter()
+        writer._queue.maxsize = 2
+
+        self.assertEqual([writer.add(event()) for _ in range(3)], [True, True, False])
+        self.assertEqual(writer.dropped, 1)
+
+
+@override_settings(ANALYTICS_TRACKING=True)
+class TrackingMiddlewareTests(TestCase):
+
+    @mock.patch.object(PageViewWriter, '_ensure_started')
+    def test_request_only_queues_the_event(self, ensure_started):
+        Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        writer = PageViewWriter()
+
+        with mock.patch('analytics.middleware.writer', writer):
+            self.client.get('/r/campanha/?ref=ABC123', HTTP_USER_AGENT='Mozilla')
+
+        queued = writer._queue.get_nowait()
+        self.assertEqual(queued['raffle_slug'], 'campanha')
+        self.assertEqual(queued['referral_code'], 'ABC123')
+        self.assertFalse(PageView.objects.exists())
+
+    def test_tracking_can_be_turned_off(self):
+        writer = PageViewWriter()
+
+        with override_settings(ANALYTICS_TRACKING=False), mock.patch('analytics.middleware.writer', writer):
+            self.client.get('/')
+
+        self.assertTrue(writer._queue.empty())
+        self.assertIsNone(writer._thread)
+
+    @mock.patch.object(PageViewWriter, '_ensure_started')
+    def test_customer_number_pages_are_not_views(self, ensure_started):
+        from accounts.models import User
+
+        raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.client.force_login(User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1'))
+        writer = PageViewWriter()
+
+        with mock.patch('analytics.middleware.writer', writer):
+            self.client.get('/minha-area/')
+            self.client.get(f'/minha-area/numeros/{raffle.pk}/')
+            self.client.get(f'/minha-area/numeros/{raffle.pk}/', {'after': 5})
+
+        self.assertEqual(writer._queue.qsize(), 1)
+        self.assertEqual(writer._queue.get_nowait()['page_type'], PageView.PageType.CUSTOMER_AREA)
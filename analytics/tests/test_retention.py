@@ -0,0 +1,65 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.ingest import PageViewWriter
+from analytics.models import PageView, PageViewDaily
+from analytics.retention import apply_retention
+
+
+def event(page_type=PageView.PageType.HOME, **extra):
+    return dict({'page_type': page_type, 'user_agent': 'Mozilla', 'ip_address': '10.0.0.1', 'referer': ''}, **extra)
+
+
+class PageViewWriterTests(TestCase):
+
+    @mock.patch('analytics.retention.apply_retention')
+    def test_writer_only_inserts(self, retention):
+        writer = PageViewWriter()
+        for _ in range(3):
+            writer._queue.put_nowait(event())
+
+        writer.drain()
+
+        self.assertEqual(PageView.objects.count(), 3)
+        retention.assert_not_called()
+
+
+class RetentionTests(TestCase):
+
+    def add_views(self, days_ago, count):
+        views = PageView.objects.bulk_create([PageView(page_type=PageView.PageType.HOME) for _ in range(count)])
+        moment = timezone.now() - timedelta(days=days_ago)
+        PageView.objects.filter(pk__in=[view.pk for view in views]).update(viewed_at=moment)
+
+    def test_rollup_is_idempotent_and_prunes_only_past_the_cutoff(self):
+        self.add_views(100, 2)
+        self.add_views(10, 3)
+        self.add_views(0, 4)
+
+        first = apply_retention(days=90)
+
+        self.assertGreater(first['rolled_days'], 0)
+        self.assertEqual(first['deleted_views'], 2)
+        # Os 10 dias atrás continuam brutos (dentro da retenção) e hoje não é agregado
+        self.assertEqual(PageView.objects.count(), 7)
+        self.assertEqual(PageViewDaily.objects.aggregate(total=Sum('views'))['total'], 5)
+        self.assertFalse(PageViewDaily.objects.filter(date=timezone.localdate()).exists())
+
+        second = apply_retention(days=90)
+
+        # Rodar de novo reescreve os dias sem somar duas vezes
+        self.assertEqual(second['deleted_views'], 0)
+        self.assertEqual(PageView.objects.count(), 7)
+        self.assertEqual(PageViewDaily.objects.aggregate(total=Sum('views'))['total'], 5)
+
+    def test_nothing_is_deleted_before_the_first_rollup(self):
+        with mock.patch.object(PageViewDaily, 'rollup', return_value=0):
+            self.add_views(200, 2)
+            result = apply_retention(days=90)
+
+        self.assertIsNone(result['cutoff'])
+        self.assertEqual(PageView.objects.count(), 2)
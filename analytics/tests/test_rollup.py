@@ -0,0 +1,105 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from analytics.models import PageView, PageViewDaily
+from raffles.models import Raffle
+
+
+def add_views(days_ago, count, page_type=PageView.PageType.HOME, raffle=None):
+    views = PageView.objects.bulk_create([PageView(page_type=page_type, raffle=raffle) for _ in range(count)])
+    moment = timezone.now() - timedelta(days=days_ago)
+    PageView.objects.filter(pk__in=[view.pk for view in views]).update(viewed_at=moment)
+
+
+class PageViewDailyTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+
+    def test_counts_combine_the_rollup_and_the_raw_tail(self):
+        add_views(3, 2)
+        add_views(2, 4, page_type=PageView.PageType.RAFFLE_PUBLIC, raffle=self.raffle)
+        add_views(0, 1, page_type=PageView.PageType.RAFFLE_PUBLIC, raffle=self.raffle)
+        before = PageViewDaily.count_by('page_type')
+
+        PageViewDaily.rollup()
+        # Hoje continua bruto e novas visualizações entram pela cauda
+        add_views(0, 3)
+
+        self.assertEqual(PageViewDaily.rolled_through(), timezone.localdate() - timedelta(days=2))
+        self.assertEqual(before, {('home',): 2, ('raffle_public',): 5})
+        self.assertEqual(PageViewDaily.count_by('page_type'), {('home',): 5, ('raffle_public',): 5})
+        self.assertEqual(PageViewDaily.count_by('raffle_id')[(self.raffle.pk,)], 5)
+
+    def test_rollup_does_not_count_a_day_twice(self):
+        add_views(5, 2)
+        add_views(1, 3)
+
+        self.assertEqual(PageViewDaily.rollup(), 5)
+        self.assertEqual(PageViewDaily.rollup(), 0)
+
+        self.assertEqual(PageViewDaily.count_by('date', since=timezone.localdate() - timedelta(days=1)), {
+            (timezone.localdate() - timedelta(days=1),): 3,
+        })
+        self.assertEqual(sum(PageViewDaily.count_by('page_type').values()), 5)
+
+    def test_command_reports_the_rolled_days(self):
+        add_views(2, 1)
+        out = StringIO()
+
+        call_command('rollup_page_views', stdout=out)
+
+        self.assertIn('2 dia(s) agregado(s)', out.getvalue())
+        self.assertTrue(PageViewDaily.objects.exists())
+
+
+class AnalyticsDashboardTests(TestCase):
+
+    def setUp(self):
+        staff = User.objects.create_user(email='admin@a.com', password='x', name='Admin', whatsapp='9', is_staff=True)
+        self.client.force_login(staff)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('analytics:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_totals_include_today(self):
+        add_views(10, 4)
+        add_views(3, 2)
+        PageViewDaily.rollup()
+        add_views(0, 1)
+
+        response, _ = self.dashboard_queries()
+
+        self.assertEqual(response.context['total_views'], 7)
+        self.assertEqual(response.context['views_today'], 1)
+        self.assertEqual(response.context['views_this_week'], 3)
+
+    def test_query_count_does_not_grow_with_the_history(self):
+        add_views(1, 1)
+        PageViewDaily.rollup()
+        # Primeira requisição aquece os caches (configuração do site, sessão)
+        self.dashboard_queries()
+        _, one_day = self.dashboard_queries()
+
+        for days_ago in range(2, 60):
+            add_views(days_ago, 3)
+        PageViewDaily.objects.all().delete()
+        PageViewDaily.rollup()
+        response, two_months = self.dashboard_queries()
+
+        self.assertEqual(response.context['total_views'], 175)
+        self.assertEqual(one_day, two_months)
@@ -5,4 +5,5 @@ app_name = 'analytics'
 
 urlpatterns = [
     path('dashboard/', views.analytics_dashboard, name='dashboard'),
+    path('api/funnel/', views.funnel_api, name='funnel_api'),
 ]
@@ -1,31 +1,61 @@
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta
-from .models import PageView
+from datetime import datetime, timedelta
+from .models import PageView, PageViewDaily, VisitorSketch, ConversionFunnel
 from raffles.models import Raffle
 import json
 
+# Janela máxima da API do funil, em dias
+FUNNEL_MAX_DAYS = 90
+
+# Agrupamentos aceitos pela API do funil
+FUNNEL_GROUPS = {
+    'raffle': ('raffle_id',),
+    'referral': ('raffle_id', 'referral_code'),
+    'hour': ('hour',),
+}
+
 
 @staff_member_required
 def analytics_dashboard(request):
     """Dashboard com analytics de visualizações de páginas"""
     
-    # Totais gerais
-    total_views = PageView.get_total_views()
-    views_today = PageView.get_total_views(days=1)
-    views_this_week = PageView.get_total_views(days=7)
+    # Dias completos vêm do rollup diário (PageViewDaily); só o que ainda não foi
+    # agregado, normalmente hoje, é lido do PageView
+    today = timezone.localdate()
     
-    # Views por tipo de página
-    views_by_type = PageView.get_views_by_page_type()
+    # Views por tipo de página (também dá o total geral)
+    views_by_type = sorted(
+        ({'page_type': page_type, 'count': count} for (page_type,), count in PageViewDaily.count_by('page_type').items()),
+        key=lambda item: -item['count']
+    )
+    total_views = sum(item['count'] for item in views_by_type)
     
     # Views por raffle
-    views_by_raffle = list(PageView.get_views_by_raffle())
+    views_by_raffle = sorted(
+        ({'raffle_id': raffle_id, 'count': count} for (raffle_id,), count in PageViewDaily.count_by('raffle_id').items() if raffle_id),
+        key=lambda item: -item['count']
+    )
     top_raffles = views_by_raffle[:10]  # Top 10 raffles
     
-    # Trend dos últimos 30 dias
-    daily_views = list(PageView.get_views_by_day(days=30))
+    # Trend dos últimos 30 dias (também dá hoje e a semana)
+    views_per_day = PageViewDaily.count_by('date', since=today - timedelta(days=29))
+    daily_views = [{'date': date, 'count': count} for (date,), count in sorted(views_per_day.items())]
+    views_today = views_per_day.get((today,), 0)
+    week_start = today - timedelta(days=6)
+    views_this_week = sum(item['count'] for item in daily_views if item['date'] >= week_start)
+    
+    # Visitantes únicos (estimativa HyperLogLog, sem COUNT DISTINCT nas visualizações)
+    unique_today = VisitorSketch.unique_visitors(today, today)
+    unique_this_week = VisitorSketch.unique_visitors(week_start, today)
+    unique_last_week = VisitorSketch.unique_visitors(week_start - timedelta(days=7), week_start - timedelta(days=1))
+    reach_change = None
+    if unique_last_week:
+        reach_change = round((unique_this_week - unique_last_week) * 100 / unique_last_week, 1)
     
     # Preparar dados para gráfico
     days_data = []
@@ -48,6 +78,7 @@ def analytics_dashboard(request):
     raffle_data = []
     raffle_ids = [item['raffle_id'] for item in top_raffles if item.get('raffle_id')]
     raffles_map = {r.id: r for r in Raffle.objects.filter(id__in=raffle_ids)}
+    raffle_uniques = VisitorSketch.unique_visitors_by_raffle(week_start, today, raffle_ids)
     
     for item in top_raffles:
         raffle_id = item.get('raffle_id')
@@ -56,17 +87,75 @@ def analytics_dashboard(request):
             raffle_data.append({
                 'raffle_name': raffle.name,
                 'raffle_id': raffle.id,
-                'count': item['count']
+                'count': item['count'],
+                'unique_this_week': raffle_uniques.get(raffle.id, 0),
             })
     
+    # Funil de conversão dos últimos 7 dias (lido do rollup por hora)
+    funnel_since = timezone.make_aware(datetime.combine(week_start, datetime.min.time()))
+    funnel = ConversionFunnel.totals(funnel_since)
+    funnel_raffles = Raffle.objects.in_bulk([row['raffle_id'] for row in funnel])
+    for row in funnel:
+        raffle = funnel_raffles.get(row['raffle_id'])
+        row['raffle_name'] = raffle.name if raffle else f"#{row['raffle_id']}"
+    funnel.sort(key=lambda row: (-row['paid_orders'], -row['views']))
+    referral_funnel = sorted(
+        (row for row in ConversionFunnel.totals(funnel_since, group_by=('raffle_id', 'referral_code')) if row['referral_code']),
+        key=lambda row: (-row['paid_orders'], -row['views'])
+    )[:10]
+    for row in referral_funnel:
+        raffle = funnel_raffles.get(row['raffle_id'])
+        row['raffle_name'] = raffle.name if raffle else f"#{row['raffle_id']}"
+    
     context = {
         'total_views': total_views,
         'views_today': views_today,
         'views_this_week': views_this_week,
+        'unique_today': unique_today,
+        'unique_this_week': unique_this_week,
+        'unique_last_week': unique_last_week,
+        'reach_change': reach_change,
         'views_by_type': type_data,
         'top_raffles': raffle_data,
+        'funnel': funnel,
+        'referral_funnel': referral_funnel,
         'daily_views_json': json.dumps(days_data),
         'type_views_json': json.dumps(type_data),
     }
     
     return render(request, 'analytics/dashboard.html', context)
+
+
+@login_required
+def funnel_api(request):
+    """Conversion funnel (views → orders → paid) as JSON
+
+    ?days=<1..90> (default 7), ?raffle=<id> and ?group=raffle|referral|hour.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Acesso negado.'}, status=403)
+
+    try:
+        days = int(request.GET.get('days', 7))
+        raffle_id = int(request.GET['raffle']) if request.GET.get('raffle') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetro inválido'}, status=400)
+    if not 1 <= days <= FUNNEL_MAX_DAYS:
+        return JsonResponse({'error': f'days deve estar entre 1 e {FUNNEL_MAX_DAYS}'}, status=400)
+    group = request.GET.get('group', 'raffle')
+    if group not in FUNNEL_GROUPS:
+        return JsonResponse({'error': f"group deve ser um de: {', '.join(FUNNEL_GROUPS)}"}, status=400)
+
+    since = ConversionFunnel.start_of_hour(timezone.now() - timedelta(days=days))
+    rows = ConversionFunnel.totals(since, group_by=FUNNEL_GROUPS[group], raffle_id=raffle_id)
+    for row in rows:
+        row['revenue'] = str(row['revenue'])
+        if 'hour' in row:
+            row['hour'] = timezone.localtime(row['hour']).isoformat()
+
+    return JsonResponse({
+        'since': timezone.localtime(since).isoformat(),
+        'group': group,
+        'raffle': raffle_id,
+        'rows': rows,
+    })
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
@@ -51,7 +52,6 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'config.middleware.SilentErrorMiddleware',  # Custom error handling
     'analytics.middleware.PageViewTrackingMiddleware',  # Analytics tracking
-    'config.middleware.CleanupExpiredReservationsMiddleware',  # Cleanup reservas a cada hora
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -79,7 +79,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default='sqlite:///db.sqlite3'),
-        conn_max_age=600
+        # Conexões persistentes: uma por thread do gunicorn (ver entrypoint.sh)
+        conn_max_age=config('CONN_MAX_AGE', default=60, cast=int),
+        conn_health_checks=True
     )
 }
 
@@ -149,6 +151,24 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Cache
+# Sem CACHE_URL cada worker usa um cache em memória próprio; com Redis o cache
+# é compartilhado e a invalidação (ex: SiteConfiguration) vale na hora para todos
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -205,6 +225,31 @@ ADMIN_WHATSAPP = config('ADMIN_WHATSAPP', default='5511999999999')
 ADMIN_PASSWORD = config('ADMIN_PASSWORD', default='admin123')
 ADMIN_NAME = config('ADMIN_NAME', default='Admin')
 
+# Analytics: dias que as visualizações brutas ficam guardadas (depois disso só o rollup diário)
+ANALYTICS_RAW_RETENTION_DAYS = config('ANALYTICS_RAW_RETENTION_DAYS', default=90, cast=int)
+
+# Registro das visualizações pela thread de gravação em lote. Desligado nos testes,
+# que gravam chamando PageViewWriter.flush() direto (a thread escreveria em paralelo)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+ANALYTICS_TRACKING = config('ANALYTICS_TRACKING', default=not TESTING, cast=bool)
+
+# Sorteios: beacon público (drand) e quantos segundos depois do compromisso fica a rodada usada
+DRAND_URL = config('DRAND_URL', default='https://api.drand.sh')
+DRAW_BEACON_DELAY_SECONDS = config('DRAW_BEACON_DELAY_SECONDS', default=300, cast=int)
+
+# Processos: web (gunicorn, com os workers de fundo no mesmo container quando ligados),
+# expiry (worker de expiração) ou whatsapp (worker de envio) — ver entrypoint.sh
+PROCESS_TYPE = config('PROCESS_TYPE', default='web')
+RUN_EXPIRY_WORKER = config('RUN_EXPIRY_WORKER', default=True, cast=bool)
+RUN_WHATSAPP_WORKER = config('RUN_WHATSAPP_WORKER', default=True, cast=bool)
+# Os workers marcam que estão vivos aqui; o healthcheck falha se passar desse tempo sem sinal
+WORKER_HEARTBEAT_DIR = config('WORKER_HEARTBEAT_DIR', default='/tmp/rifas-workers')
+WORKER_HEARTBEAT_MAX_AGE = config('WORKER_HEARTBEAT_MAX_AGE', default=180, cast=int)
+
+# Checkout: streams SSE de status do pedido abertos ao mesmo tempo em cada worker do
+# gunicorn. Deve ficar abaixo de GUNICORN_THREADS para sobrar threads para o resto do site
+ORDER_STREAMS_PER_WORKER = config('ORDER_STREAMS_PER_WORKER', default=12, cast=int)
+
 # Django Unfold Configuration
 UNFOLD = {
     "SITE_TITLE": "Sistema de Rifas",
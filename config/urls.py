@@ -13,8 +13,8 @@ def health_check(request):
 def home_placeholder(request):
     """Página inicial - redireciona para campanha configurada se houver"""
     try:
-        config = SiteConfiguration.objects.first()
-        if config and config.home_redirect_raffle:
+        config = SiteConfiguration.get_config()
+        if config.home_redirect_raffle_id:
             return redirect('raffle_public', slug=config.home_redirect_raffle.slug)
     except Exception:
         pass
@@ -29,16 +29,22 @@ urlpatterns = [
     path('admin-login/', account_views.admin_login, name='admin_login'),
     path('login/', account_views.customer_login, name='customer_login'),
     path('minha-area/', account_views.customer_area, name='customer_area'),
+    path('minha-area/numeros/<int:raffle_id>/', account_views.customer_numbers, name='customer_numbers'),
     path('logout/', account_views.logout_view, name='logout'),
     path('get-milestone-reward/', account_views.get_milestone_reward, name='get_milestone_reward'),
 
     # Public Raffle URLs (sem autenticação)
     path('r/<slug:slug>/', raffle_views.raffle_public_view, name='raffle_public'),
 
+    # Imagens guardadas em Base64, servidas pelo hash do conteúdo (cache de longo prazo)
+    path('media/campanha/<int:pk>/<slug:image_hash>', raffle_views.raffle_image, name='raffle_image'),
+    path('media/logo/<slug:image_hash>', raffle_views.site_logo, name='site_logo'),
+
     # Frontend URLs (Admin) - todas requerem autenticação
     path('dashboard/', raffle_views.dashboard, name='dashboard'),
     path('campanhas/', raffle_views.raffle_list, name='raffle_list'),
     path('campanha/<int:pk>/', raffle_views.campaign_details, name='campaign_details'),
+    path('campanha/<int:pk>/comprador/<int:user_id>/numeros/', raffle_views.campaign_buyer_numbers, name='campaign_buyer_numbers'),
     path('criar-campanha/', raffle_views.raffle_create, name='raffle_create'),
     path('editar-campanha/<int:pk>/', raffle_views.raffle_edit, name='raffle_edit'),
     path('excluir-campanha/<int:pk>/', raffle_views.raffle_delete, name='raffle_delete'),
@@ -45,6 +45,46 @@ else:
     sys.exit(0)
 END
 
+# Valor de um setting do Django, lido como o settings.py lê (python-decouple: variável
+# de ambiente ou .env, RUN_*_WORKER com cast=bool aceitando 1/true/yes/on). Assim o
+# entrypoint e o healthcheck sempre concordam sobre o que roda neste container.
+django_setting() {
+    DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-config.settings}" \
+        python -c "from django.conf import settings; print(settings.$1)"
+}
+
+PROCESS_TYPE="$(django_setting PROCESS_TYPE)"
+
+# Workers como serviços próprios (mesma imagem, PROCESS_TYPE=expiry/whatsapp): o
+# processo é o PID 1 do container, então a política de restart da plataforma o
+# sobe de novo quando ele cai e o HEALTHCHECK (manage.py healthcheck) pega os travados.
+# As migrações ficam só com o serviço web.
+case "${PROCESS_TYPE}" in
+    expiry)
+        echo "Starting reservation expiry worker..."
+        exec python manage.py run_reservation_expiry
+        ;;
+    whatsapp)
+        echo "Starting WhatsApp outbox worker..."
+        exec python manage.py send_whatsapp_messages
+        ;;
+    web)
+        ;;
+    *)
+        echo "Unknown PROCESS_TYPE: ${PROCESS_TYPE} (use web, expiry or whatsapp)"
+        exit 1
+        ;;
+esac
+
+# Worker no mesmo container do web: reiniciar sempre que o processo terminar
+supervise() {
+    while true; do
+        "$@" || true
+        echo "Worker '$*' exited, restarting in 5s..."
+        sleep 5
+    done
+}
+
 echo "Running migrations..."
 python manage.py migrate --noinput
 
@@ -54,10 +94,31 @@ python manage.py collectstatic --noinput --clear
 echo "Creating superuser if needed..."
 python manage.py create_admin
 
+if [ "$(django_setting RUN_EXPIRY_WORKER)" = "True" ]; then
+    # Só uma réplica libera reservas por vez (advisory lock), as demais ficam de reserva
+    echo "Starting reservation expiry worker..."
+    supervise python manage.py run_reservation_expiry &
+fi
+
+if [ "$(django_setting RUN_WHATSAPP_WORKER)" = "True" ]; then
+    # Vários workers podem rodar juntos: cada mensagem é reservada por um só (SKIP LOCKED)
+    echo "Starting WhatsApp outbox worker..."
+    supervise python manage.py send_whatsapp_messages &
+fi
+
 echo "Starting Gunicorn..."
+# Cada thread pode manter uma conexão própria com o banco (CONN_MAX_AGE), então
+# réplicas × GUNICORN_WORKERS × GUNICORN_THREADS, mais os workers de fundo
+# (expiração: 1, WhatsApp: 1 + envios simultâneos), precisa caber no
+# max_connections do Postgres (100 por padrão) com folga para o admin/migrações.
+# Cada checkout aberto ocupa uma thread com o stream SSE do pedido (sem conexão com
+# o banco enquanto espera); ORDER_STREAMS_PER_WORKER limita quantas, para sobrar
+# threads para as páginas e o webhook.
 exec gunicorn \
     --bind 0.0.0.0:8000 \
-    --workers 3 \
+    --workers "${GUNICORN_WORKERS:-3}" \
+    --worker-class gthread \
+    --threads "${GUNICORN_THREADS:-16}" \
     --access-logfile - \
     --error-logfile - \
     --log-level info \
@@ -1 +1,21 @@
+from django.contrib import admin
+from unfold.admin import ModelAdmin
+from .models import OutboundMessage
 
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(ModelAdmin):
+    """Fila de envio de WhatsApp (somente leitura; falhas podem ser reenviadas)"""
+    list_display = ('id', 'kind', 'phone', 'status', 'attempts', 'send_after', 'sent_at', 'created_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('phone', 'message', 'last_error')
+    readonly_fields = ('phone', 'message', 'kind', 'status', 'send_after', 'after', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ('retry_messages',)
+
+    @admin.action(description='Reenviar mensagens que falharam')
+    def retry_messages(self, request, queryset):
+        count = OutboundMessage.retry(queryset)
+        self.message_user(request, f'{count} mensagem(ns) de volta na fila.')
+
+    def has_add_permission(self, request):
+        return False
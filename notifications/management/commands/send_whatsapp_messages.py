@@ -0,0 +1,103 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, DatabaseError
+from django.utils import timezone
+from notifications.models import OutboundMessage
+from raffles import heartbeat
+
+# Pausa mínima entre verificações quando a próxima mensagem vence logo
+MIN_SLEEP = 0.2
+
+# Mensagens enviadas ficam na fila por este tempo (consulta no admin) antes de serem apagadas
+SENT_RETENTION_DAYS = 30
+
+
+class Command(BaseCommand):
+    help = 'Worker que envia as mensagens de WhatsApp da fila (deixar rodando)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Envios simultâneos (padrão: 4)')
+        parser.add_argument('--max-sleep', type=float, default=2, help='Tempo máximo sem procurar mensagens novas, em segundos (padrão: 2)')
+        parser.add_argument('--once', action='store_true', help='Enviar o que já venceu e sair')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        max_sleep = options['max_sleep']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f'📨 Worker de envio de WhatsApp iniciado ({workers} envio(s) simultâneo(s))')
+
+        pruned_on = None
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='whatsapp-sender') as executor:
+            while not self.stopping:
+                try:
+                    today = timezone.localdate()
+                    if pruned_on != today:
+                        self.prune()
+                        pruned_on = today
+
+                    free = workers - len(in_flight)
+                    claimed = OutboundMessage.claim(free) if free else []
+                    heartbeat.beat(heartbeat.WHATSAPP_WORKER)
+                    for message in claimed:
+                        in_flight.add(executor.submit(self.deliver, message))
+
+                    if in_flight:
+                        # Voltar a buscar assim que um envio terminar (ou no máximo em max_sleep)
+                        done, in_flight = wait(in_flight, timeout=max_sleep, return_when=FIRST_COMPLETED)
+                        continue
+
+                    if options['once']:
+                        break
+                    time.sleep(self.seconds_until_next_due(max_sleep))
+                except DatabaseError as e:
+                    # Qualquer erro de banco (conexão perdida, consulta recusada): registrar e continuar
+                    self.stderr.write(f'❌ Erro de banco no worker de WhatsApp: {e}')
+                    connection.close()
+                    time.sleep(max_sleep)
+
+            if in_flight:
+                self.stdout.write(f'⏳ Aguardando {len(in_flight)} envio(s) em andamento...')
+                wait(in_flight)
+
+        self.stdout.write('👋 Worker de envio de WhatsApp finalizado')
+
+    def stop(self, signum, frame):
+        """Stop claiming messages; the ones being sent are finished first"""
+        self.stopping = True
+
+    def deliver(self, message):
+        """Runs in a pool thread, with its own database connection"""
+        close_old_connections()
+        try:
+            if message.deliver():
+                self.stdout.write(self.style.SUCCESS(f'✅ #{message.id} {message.kind} enviada para {message.phone}'))
+            elif message.status == OutboundMessage.Status.FAILED:
+                self.stderr.write(f'❌ #{message.id} {message.kind} para {message.phone} falhou após {message.attempts} tentativa(s): {message.last_error}')
+            else:
+                self.stderr.write(f'⚠️  #{message.id} {message.kind} para {message.phone} falhou, nova tentativa às {timezone.localtime(message.send_after):%H:%M:%S}')
+        except Exception as e:
+            # Não conseguiu nem registrar o resultado: o lease vence e outro ciclo tenta de novo
+            self.stderr.write(f'❌ Erro ao processar a mensagem #{message.id}: {e}')
+            connection.close()
+
+    def prune(self):
+        deleted = OutboundMessage.prune(timezone.now() - timedelta(days=SENT_RETENTION_DAYS))
+        if deleted:
+            self.stdout.write(f'🧹 {deleted} mensagem(ns) enviada(s) antigas removida(s)')
+
+    def seconds_until_next_due(self, max_sleep):
+        """Seconds to sleep until the next message is due (at most max_sleep)"""
+        due = OutboundMessage.next_due()
+        if due is None:
+            return max_sleep
+
+        remaining = (due - timezone.now()).total_seconds()
+        return min(max(remaining, MIN_SLEEP), max_sleep)
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_alter_whatsappmessagetemplate_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(help_text='Número ou ID de grupo (@g.us)', max_length=100, verbose_name='Destinatário')),
+                ('message', models.TextField(verbose_name='Mensagem')),
+                ('kind', models.CharField(blank=True, max_length=50, verbose_name='Tipo')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('sending', 'Enviando'), ('sent', 'Enviada'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Enviar a partir de')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criada em')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviada em')),
+                ('after', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='notifications.outboundmessage', verbose_name='Enviar depois de')),
+            ],
+            options={
+                'verbose_name': 'Mensagem na Fila',
+                'verbose_name_plural': 'Fila de Mensagens',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(fields=['status', 'send_after'], name='notif_outbox_due_idx'),
+        ),
+    ]
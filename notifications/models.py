@@ -1,4 +1,8 @@
-from django.db import models
+import random
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
 
 
 class WhatsAppMessageTemplate(models.Model):
@@ -218,3 +222,170 @@ Olá *{user_name}*!
             defaults={"template": default_template}
         )
         return template.template
+
+
+class OutboundMessage(models.Model):
+    """Mensagem de WhatsApp na fila de envio (outbox)
+
+    The senders in notifications.whatsapp only insert a row here, in the
+    caller's transaction, so a rolled back payment sends nothing and a
+    restart loses nothing. The send_whatsapp_messages worker delivers due
+    messages with a thread pool, retrying with exponential backoff.
+    Delivery is at least once: a send that timed out after reaching
+    WhatsApp is sent again.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pendente'
+        SENDING = 'sending', 'Enviando'
+        SENT = 'sent', 'Enviada'
+        FAILED = 'failed', 'Falhou'
+
+    MAX_ATTEMPTS = 6
+    # Espera antes da 2ª tentativa; dobra a cada tentativa, até MAX_BACKOFF
+    BASE_BACKOFF = 30
+    MAX_BACKOFF = 60 * 60
+    # Tempo que um worker tem para concluir o envio antes de outro poder retomá-lo
+    LEASE_SECONDS = 5 * 60
+
+    phone = models.CharField('Destinatário', max_length=100, help_text='Número ou ID de grupo (@g.us)')
+    message = models.TextField('Mensagem')
+    kind = models.CharField('Tipo', max_length=50, blank=True)
+    status = models.CharField('Status', max_length=20, choices=Status.choices, default=Status.PENDING)
+    send_after = models.DateTimeField('Enviar a partir de', default=timezone.now)
+    after = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='followers',
+        verbose_name='Enviar depois de'
+    )
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    last_error = models.TextField('Último erro', blank=True)
+    created_at = models.DateTimeField('Criada em', auto_now_add=True)
+    sent_at = models.DateTimeField('Enviada em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Mensagem na Fila'
+        verbose_name_plural = 'Fila de Mensagens'
+        ordering = ['-created_at']
+        indexes = [
+            # Mensagens vencidas (worker de envio)
+            models.Index(fields=['status', 'send_after'], name='notif_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind or 'mensagem'} para {self.phone} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, phone, message, kind='', delay_seconds=0, after=None):
+        """Queue a message; with ``after`` it waits for that one and the delay counts from it"""
+        start = after.send_after if after else timezone.now()
+        return cls.objects.create(
+            phone=phone,
+            message=message,
+            kind=kind,
+            send_after=start + timedelta(seconds=delay_seconds),
+            after=after
+        )
+
+    @classmethod
+    def sendable(cls):
+        """Pending messages (or with an expired lease) whose ``after``, if any, was sent
+
+        The predecessor is checked with EXISTS instead of a join: Postgres
+        refuses FOR UPDATE on the nullable side of an outer join.
+        """
+        predecessor_sent = cls.objects.filter(pk=OuterRef('after_id'), status=cls.Status.SENT)
+        return cls.objects.filter(
+            status__in=[cls.Status.PENDING, cls.Status.SENDING]
+        ).filter(
+            Q(after__isnull=True) | Exists(predecessor_sent)
+        )
+
+    @classmethod
+    @transaction.atomic
+    def claim(cls, limit):
+        """Take up to ``limit`` due messages for this worker
+
+        A message being sent keeps its lease in send_after: if the worker
+        dies, it becomes due again once the lease expires. Messages whose
+        ``after`` was not sent yet keep waiting.
+        """
+        now = timezone.now()
+        messages = list(
+            cls.sendable().select_for_update(skip_locked=True, of=('self',))
+            .filter(send_after__lte=now)
+            .order_by('send_after')[:limit]
+        )
+        if messages:
+            cls.objects.filter(pk__in=[message.pk for message in messages]).update(
+                status=cls.Status.SENDING,
+                send_after=now + timedelta(seconds=cls.LEASE_SECONDS),
+                attempts=F('attempts') + 1
+            )
+            for message in messages:
+                message.attempts += 1
+        return messages
+
+    def deliver(self):
+        """Send through the WhatsApp API and record the outcome. Returns True when sent"""
+        from notifications.whatsapp import send_whatsapp_message
+
+        try:
+            result = send_whatsapp_message(self.phone, self.message)
+            error = '' if result else 'A API do WhatsApp não confirmou o envio'
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        if not error:
+            self.mark_sent()
+            return True
+        self.mark_failed(error)
+        return False
+
+    def mark_sent(self):
+        self.status = self.Status.SENT
+        self.sent_at = timezone.now()
+        self.last_error = ''
+        self.save(update_fields=['status', 'sent_at', 'last_error'])
+
+    def mark_failed(self, error):
+        """Schedule a retry with backoff, or give up after MAX_ATTEMPTS"""
+        self.last_error = error
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.Status.FAILED
+            self.save(update_fields=['status', 'last_error'])
+            # As mensagens que dependiam desta não fazem mais sentido
+            OutboundMessage.objects.filter(after=self, status=self.Status.PENDING).update(
+                status=self.Status.FAILED,
+                last_error='A mensagem anterior não foi enviada'
+            )
+            return
+
+        backoff = min(self.BASE_BACKOFF * 2 ** (self.attempts - 1), self.MAX_BACKOFF)
+        # Um pouco de variação para não reenviar tudo ao mesmo tempo depois de uma queda da API
+        backoff *= random.uniform(0.8, 1.2)
+        self.status = self.Status.PENDING
+        self.send_after = timezone.now() + timedelta(seconds=backoff)
+        self.save(update_fields=['status', 'send_after', 'last_error'])
+
+    @classmethod
+    def retry(cls, queryset):
+        """Put failed messages back in the queue (admin action)"""
+        return queryset.filter(status=cls.Status.FAILED).update(
+            status=cls.Status.PENDING,
+            send_after=timezone.now(),
+            attempts=0
+        )
+
+    @classmethod
+    def next_due(cls):
+        """When the next sendable message becomes due (None if there is none)"""
+        return cls.sendable().order_by('send_after').values_list('send_after', flat=True).first()
+
+    @classmethod
+    def prune(cls, older_than):
+        """Delete messages sent before ``older_than``"""
+        return cls.objects.filter(status=cls.Status.SENT, sent_at__lt=older_than).delete()[0]
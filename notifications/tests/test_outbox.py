@@ -0,0 +1,127 @@
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from notifications.models import OutboundMessage
+
+
+class OutboundMessageClaimTests(TestCase):
+
+    def test_claim_takes_due_messages_and_leases_them(self):
+        due = OutboundMessage.enqueue('5511999990000', 'oi', kind='test')
+        OutboundMessage.enqueue('5511999990001', 'depois', delay_seconds=60)
+
+        claimed = OutboundMessage.claim(10)
+
+        self.assertEqual([message.pk for message in claimed], [due.pk])
+        due.refresh_from_db()
+        self.assertEqual(due.status, OutboundMessage.Status.SENDING)
+        self.assertEqual(due.attempts, 1)
+        self.assertGreater(due.send_after, timezone.now())
+        # Com o lease valendo, ninguém mais pega a mensagem
+        self.assertEqual(OutboundMessage.claim(10), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        message = OutboundMessage.enqueue('1', 'x')
+        OutboundMessage.claim(1)
+        OutboundMessage.objects.filter(pk=message.pk).update(send_after=timezone.now() - timedelta(seconds=1))
+
+        claimed = OutboundMessage.claim(1)
+
+        self.assertEqual([m.pk for m in claimed], [message.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_follower_waits_for_its_predecessor(self):
+        first = OutboundMessage.enqueue('1', 'convite')
+        follower = OutboundMessage.enqueue('1', 'copiar e colar', after=first)
+
+        self.assertEqual([m.pk for m in OutboundMessage.claim(10)], [first.pk])
+        first.mark_sent()
+        self.assertEqual([m.pk for m in OutboundMessage.claim(10)], [follower.pk])
+
+
+class OutboundMessageDeliveryTests(TestCase):
+
+    def deliver(self, message, result=None, error=None):
+        with mock.patch('notifications.whatsapp.send_whatsapp_message', return_value=result, side_effect=error):
+            return message.deliver()
+
+    def test_success_marks_sent(self):
+        message = OutboundMessage.enqueue('1', 'x')
+        message = OutboundMessage.claim(1)[0]
+
+        self.assertTrue(self.deliver(message, result={'key': 'ok'}))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.Status.SENT)
+        self.assertIsNotNone(message.sent_at)
+
+    def test_failure_backs_off_exponentially(self):
+        OutboundMessage.enqueue('1', 'x')
+        message = OutboundMessage.claim(1)[0]
+        message.attempts = 3
+
+        with mock.patch('notifications.models.random.uniform', return_value=1):
+            self.assertFalse(self.deliver(message, error=RuntimeError('timeout')))
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.Status.PENDING)
+        self.assertEqual(message.last_error, 'timeout')
+        delay = (message.send_after - timezone.now()).total_seconds()
+        self.assertAlmostEqual(delay, OutboundMessage.BASE_BACKOFF * 4, delta=2)
+
+    def test_last_attempt_fails_message_and_followers(self):
+        first = OutboundMessage.enqueue('1', 'x')
+        follower = OutboundMessage.enqueue('1', 'y', after=first)
+        message = OutboundMessage.claim(1)[0]
+        message.attempts = OutboundMessage.MAX_ATTEMPTS
+
+        self.deliver(message, result=None)
+
+        first.refresh_from_db()
+        follower.refresh_from_db()
+        self.assertEqual(first.status, OutboundMessage.Status.FAILED)
+        self.assertEqual(follower.status, OutboundMessage.Status.FAILED)
+
+        self.assertEqual(OutboundMessage.retry(OutboundMessage.objects.all()), 2)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboundMessage.Status.PENDING, 0))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'FOR UPDATE SKIP LOCKED precisa do Postgres')
+class OutboundMessagePostgresTests(TransactionTestCase):
+    """claim() against a real Postgres: the query must be accepted and skip locked rows"""
+
+    def test_claim_with_predecessor_filter_runs_on_postgres(self):
+        first = OutboundMessage.enqueue('1', 'x')
+        follower = OutboundMessage.enqueue('1', 'y', after=first)
+        OutboundMessage.objects.filter(pk=first.pk).update(status=OutboundMessage.Status.SENT)
+
+        self.assertEqual([m.pk for m in OutboundMessage.claim(10)], [follower.pk])
+
+    def test_concurrent_workers_never_claim_the_same_message(self):
+        for index in range(20):
+            OutboundMessage.enqueue(str(index), 'x')
+
+        claimed = []
+        barrier = threading.Barrier(4)
+
+        def worker():
+            try:
+                barrier.wait()
+                claimed.extend(message.pk for message in OutboundMessage.claim(5))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claimed), 20)
+        self.assertEqual(len(set(claimed)), 20)
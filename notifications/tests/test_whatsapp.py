@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from accounts.models import User
+from notifications import whatsapp
+from notifications.models import OutboundMessage
+from raffles.models import Raffle, RaffleOrder
+
+
+class QueuedSendersTests(TestCase):
+    """The senders only write to the outbox; nothing calls the WhatsApp API"""
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.user = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='11999990000')
+        self.order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=3, amount=6)
+
+    @mock.patch('notifications.whatsapp.send_whatsapp_message')
+    def test_payment_confirmation_is_queued(self, send):
+        outbound = whatsapp.send_payment_confirmation(self.order)
+
+        send.assert_not_called()
+        self.assertEqual(outbound.kind, 'payment_confirmation')
+        self.assertEqual(outbound.phone, '11999990000')
+        self.assertIn('Campanha', outbound.message)
+
+    @mock.patch('notifications.whatsapp.send_whatsapp_message')
+    def test_referral_messages_are_chained(self, send):
+        invitation = whatsapp.send_referral_share_invitation(self.order)
+
+        send.assert_not_called()
+        copy_paste = OutboundMessage.objects.get(kind='referral_copy_paste')
+        self.assertEqual(copy_paste.after, invitation)
+        self.assertGreater(copy_paste.send_after, invitation.send_after)
+        self.assertIn('?ref=', copy_paste.message)
@@ -78,6 +78,21 @@ def send_whatsapp_message(phone, message):
     return None
 
 
+def queue_whatsapp_message(phone, message, kind='', delay_seconds=0, after=None):
+    """
+    Put a message in the outbox (OutboundMessage) instead of sending it now.
+    The send_whatsapp_messages worker delivers it, with retries.
+
+    With ``after`` the message is only sent once that one was sent, and
+    delay_seconds counts from its scheduled time.
+    """
+    from notifications.models import OutboundMessage
+
+    outbound = OutboundMessage.enqueue(phone, message, kind=kind, delay_seconds=delay_seconds, after=after)
+    logger.info(f"📥 WhatsApp queued for {phone} ({kind or 'message'}, #{outbound.id})")
+    return outbound
+
+
 def send_payment_confirmation(order):
     """Send payment confirmation with numbers using custom template"""
     from notifications.models import WhatsAppMessageTemplate
@@ -116,17 +131,15 @@ def send_payment_confirmation(order):
         # Fallback - use template as-is without formatting if there's an error
         message = template_text
 
-    return send_whatsapp_message(order.user.whatsapp, message)
+    return queue_whatsapp_message(order.user.whatsapp, message, kind='payment_confirmation')
 
 
 def send_referral_share_invitation(order):
-    """Send referral share invitation with user's referral link"""
+    """Queue the referral share invitation, followed by the ready-to-forward message"""
     from notifications.models import WhatsAppMessageTemplate
     from raffles.models import Referral, RaffleNumber
     from django.urls import reverse
     from django.conf import settings
-    import threading
-    import time
 
     # Check if user is eligible for referral
     if not order.raffle.enable_referral:
@@ -137,69 +150,55 @@ def send_referral_share_invitation(order):
 
     # Get delay from template settings
     template_obj = WhatsAppMessageTemplate.get_referral_share_template()
-    delay_seconds = template_obj.delay_seconds if hasattr(template_obj, 'delay_seconds') else 30
-
-    def send_delayed():
-        """Internal function to send message after delay"""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        try:
-            # Wait for the configured delay
-            if delay_seconds > 0:
-                logger.info(f"⏳ Waiting {delay_seconds} seconds before sending referral invitation to {order.user.whatsapp}")
-                time.sleep(delay_seconds)
-            
-            # Get or create user's referral code
-            referral, created = Referral.objects.get_or_create(
-                inviter=order.user,
-                raffle=order.raffle
-            )
-
-            # Build referral URL
-            base_url = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:8000'
-            public_path = reverse('raffle_public', kwargs={'slug': order.raffle.slug})
-            referral_url = f"{base_url}{public_path}?ref={referral.code}"
-
-            # Count successful referrals
-            successful_referrals = Referral.objects.filter(
-                inviter=order.user,
-                raffle=order.raffle,
-                status=Referral.Status.REDEEMED
-            ).count()
-
-            # Count total bonus numbers earned
-            total_bonus_earned = RaffleNumber.objects.filter(
-                raffle=order.raffle,
-                user=order.user,
-                source=RaffleNumber.Source.REFERRAL_INVITER
-            ).count()
-
-            # Build progressive bonus message
-            progressive_message = ""
-            if order.raffle.enable_progressive_bonus:
-                progressive_message = f"\n• *Bônus Progressivo:* +1 número a cada {order.raffle.progressive_bonus_every} que seu amigo comprar!"
-
-            # Get custom template text
-            template_text = template_obj.template if hasattr(template_obj, 'template') else template_obj
-
-            # Format message with template
-            try:
-                message = template_text.format(
-                    name=order.user.name,
-                    raffle_name=order.raffle.name,
-                    prize_name=order.raffle.prize_name,
-                    inviter_bonus=order.raffle.inviter_bonus,
-                    invitee_bonus=order.raffle.invitee_bonus,
-                    progressive_message=progressive_message,
-                    referral_link=referral_url,
-                    successful_referrals=successful_referrals,
-                    total_bonus_earned=total_bonus_earned
-                )
-            except Exception as e:
-                logger.error(f"Error formatting referral share template: {e}")
-                # Fallback to simple message
-                message = f"""
+    delay_seconds = template_obj.delay_seconds
+
+    # Get or create user's referral code
+    referral, created = Referral.objects.get_or_create(
+        inviter=order.user,
+        raffle=order.raffle
+    )
+
+    # Build referral URL
+    base_url = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:8000'
+    public_path = reverse('raffle_public', kwargs={'slug': order.raffle.slug})
+    referral_url = f"{base_url}{public_path}?ref={referral.code}"
+
+    # Count successful referrals
+    successful_referrals = Referral.objects.filter(
+        inviter=order.user,
+        raffle=order.raffle,
+        status=Referral.Status.REDEEMED
+    ).count()
+
+    # Count total bonus numbers earned
+    total_bonus_earned = RaffleNumber.objects.filter(
+        raffle=order.raffle,
+        user=order.user,
+        source=RaffleNumber.Source.REFERRAL_INVITER
+    ).count()
+
+    # Build progressive bonus message
+    progressive_message = ""
+    if order.raffle.enable_progressive_bonus:
+        progressive_message = f"\n• *Bônus Progressivo:* +1 número a cada {order.raffle.progressive_bonus_every} que seu amigo comprar!"
+
+    # Format message with template
+    try:
+        message = template_obj.template.format(
+            name=order.user.name,
+            raffle_name=order.raffle.name,
+            prize_name=order.raffle.prize_name,
+            inviter_bonus=order.raffle.inviter_bonus,
+            invitee_bonus=order.raffle.invitee_bonus,
+            progressive_message=progressive_message,
+            referral_link=referral_url,
+            successful_referrals=successful_referrals,
+            total_bonus_earned=total_bonus_earned
+        )
+    except Exception as e:
+        logger.error(f"Error formatting referral share template: {e}")
+        # Fallback to simple message
+        message = f"""
 🎁 *Ganhe Números Grátis Indicando Amigos!*
 
 Olá *{order.user.name}*!
@@ -212,27 +211,19 @@ Compartilhe seu link e ganhe *{order.raffle.inviter_bonus} números grátis* a c
 Seu amigo também ganha *{order.raffle.invitee_bonus} números extras*!
 
 Quanto mais você indica, mais chances de ganhar! 🍀
-                """.strip()
+        """.strip()
 
-            # Send the message
-            result = send_whatsapp_message(order.user.whatsapp, message)
-            if result:
-                logger.info(f"✅ Referral invitation sent successfully to {order.user.whatsapp} (after {delay_seconds}s delay)")
-                
-                # Now trigger the copy-paste message (will be sent 5s later)
-                logger.info(f"🚀 Scheduling copy-paste message for {order.user.whatsapp}")
-                send_referral_copy_paste(order)
-            else:
-                logger.error(f"❌ Failed to send referral invitation to {order.user.whatsapp}")
-                
-        except Exception as e:
-            logger.error(f"❌ Error in delayed referral invitation: {e}", exc_info=True)
+    invitation = queue_whatsapp_message(
+        order.user.whatsapp,
+        message,
+        kind='referral_share_invitation',
+        delay_seconds=delay_seconds
+    )
 
-    # Start background thread to send after delay
-    thread = threading.Thread(target=send_delayed, daemon=True)
-    thread.start()
-    
-    return True  # Return immediately, message will be sent in background
+    # A mensagem pronta para encaminhar só sai depois do convite ter sido enviado
+    send_referral_copy_paste(order, after=invitation, referral=referral)
+
+    return invitation
 
 
 def send_prize_won_notification(user, raffle, prize_number, prize_amount):
@@ -253,18 +244,13 @@ def send_prize_won_notification(user, raffle, prize_number, prize_amount):
         prize_name=raffle.prize_name
     ).strip()
 
-    try:
-        result = send_whatsapp_message(user.whatsapp, message)
-        if result:
-            logger.info(f"🏆 Prize notification sent to {user.name} - Prize: R$ {prize_amount}")
+    result = queue_whatsapp_message(user.whatsapp, message, kind='prize_winner_notification')
+    logger.info(f"🏆 Prize notification queued for {user.name} - Prize: R$ {prize_amount}")
 
-        # Send notifications to admins and groups
-        send_prize_admin_notifications(user, raffle, prize_number, prize_amount)
+    # Send notifications to admins and groups
+    send_prize_admin_notifications(user, raffle, prize_number, prize_amount)
 
-        return result
-    except Exception as e:
-        logger.error(f"❌ Error sending prize notification to {user.name}: {e}")
-        return None
+    return result
 
 
 def send_prize_admin_notifications(user, raffle, prize_number, prize_amount):
@@ -306,44 +292,22 @@ def send_prize_admin_notifications(user, raffle, prize_number, prize_amount):
     # Send admin message to all contacts in admin_phones field
     # (can be individual admin numbers or admin groups)
     for contact in admin_contacts:
-        if not contact:
-            continue
-        try:
-            is_group = '@g.us' in contact.lower()
-            contact_type = "admin group" if is_group else "admin number"
-            logger.info(f"📤 Sending admin notification to {contact_type}: {contact}")
-            result = send_whatsapp_message(contact, admin_message)
-            if result:
-                logger.info(f"✅ Prize admin notification sent to {contact}")
-            else:
-                logger.error(f"❌ Failed to send prize admin notification to {contact}")
-        except Exception as e:
-            logger.error(f"❌ Error sending prize admin notification to {contact}: {e}", exc_info=True)
+        if contact:
+            queue_whatsapp_message(contact, admin_message, kind='prize_admin_notification')
 
     # Send group message to all contacts in group_phones field
     # (public groups - message without admin details)
     for contact in group_contacts:
-        if not contact:
-            continue
-        try:
-            logger.info(f"📤 Sending group notification to public group: {contact}")
-            result = send_whatsapp_message(contact, group_message)
-            if result:
-                logger.info(f"✅ Prize group notification sent to {contact}")
-            else:
-                logger.error(f"❌ Failed to send prize group notification to {contact}")
-        except Exception as e:
-            logger.error(f"❌ Error sending prize group notification to {contact}: {e}", exc_info=True)
+        if contact:
+            queue_whatsapp_message(contact, group_message, kind='prize_group_notification')
 
 
-def send_referral_copy_paste(order):
-    """Send copy-paste ready referral message (3rd message)"""
+def send_referral_copy_paste(order, after=None, referral=None):
+    """Queue the copy-paste ready referral message (3rd message)"""
     from notifications.models import WhatsAppMessageTemplate
     from raffles.models import Referral
     from django.urls import reverse
     from django.conf import settings
-    import threading
-    import time
 
     # Check if user is eligible for referral
     if not order.raffle.enable_referral:
@@ -352,51 +316,38 @@ def send_referral_copy_paste(order):
     if order.quantity < order.raffle.referral_min_purchase:
         return None
 
-    # Get delay from template settings (defaults to 5 seconds)
+    # Get delay from template settings (defaults to 5 seconds after the previous message)
     template_obj = WhatsAppMessageTemplate.get_referral_copy_paste_template()
-    delay_seconds = template_obj.delay_seconds if hasattr(template_obj, 'delay_seconds') else 5
+    delay_seconds = template_obj.delay_seconds
 
-    def send_delayed():
-        """Internal function to send message after delay"""
-        import logging
-        logger = logging.getLogger(__name__)
-        
+    # Get user's referral code (should already exist from previous message)
+    if referral is None:
         try:
-            # Wait for the configured delay (5 seconds after message 2)
-            if delay_seconds > 0:
-                logger.info(f"⏳ Waiting {delay_seconds} seconds before sending copy-paste message to {order.user.whatsapp}")
-                time.sleep(delay_seconds)
-            
-            # Get user's referral code (should already exist from previous message)
-            try:
-                referral = Referral.objects.get(
-                    inviter=order.user,
-                    raffle=order.raffle
-                )
-            except Referral.DoesNotExist:
-                logger.error(f"❌ Referral not found for user {order.user.id} in raffle {order.raffle.id}")
-                return
-
-            # Build referral URL
-            base_url = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:8000'
-            public_path = reverse('raffle_public', kwargs={'slug': order.raffle.slug})
-            referral_url = f"{base_url}{public_path}?ref={referral.code}"
-
-            # Get custom template text
-            template_text = template_obj.template if hasattr(template_obj, 'template') else template_obj
-
-            # Format message with template
-            try:
-                message = template_text.format(
-                    raffle_name=order.raffle.name,
-                    prize_name=order.raffle.prize_name,
-                    invitee_bonus=order.raffle.invitee_bonus,
-                    referral_link=referral_url
-                )
-            except Exception as e:
-                logger.error(f"Error formatting copy-paste template: {e}")
-                # Fallback to simple message
-                message = f"""
+            referral = Referral.objects.get(
+                inviter=order.user,
+                raffle=order.raffle
+            )
+        except Referral.DoesNotExist:
+            logger.error(f"❌ Referral not found for user {order.user.id} in raffle {order.raffle.id}")
+            return None
+
+    # Build referral URL
+    base_url = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:8000'
+    public_path = reverse('raffle_public', kwargs={'slug': order.raffle.slug})
+    referral_url = f"{base_url}{public_path}?ref={referral.code}"
+
+    # Format message with template
+    try:
+        message = template_obj.template.format(
+            raffle_name=order.raffle.name,
+            prize_name=order.raffle.prize_name,
+            invitee_bonus=order.raffle.invitee_bonus,
+            referral_link=referral_url
+        )
+    except Exception as e:
+        logger.error(f"Error formatting copy-paste template: {e}")
+        # Fallback to simple message
+        message = f"""
 🎁 Participe e Ganhe {order.raffle.invitee_bonus} Números Grátis!
 
 Olá! Estou participando da campanha *{order.raffle.name}* e quero te convidar!
@@ -409,21 +360,12 @@ Olá! Estou participando da campanha *{order.raffle.name}* e quero te convidar!
 {referral_url}
 
 Boa sorte! 🍀✨
-                """.strip()
-
-            # Send the message
-            result = send_whatsapp_message(order.user.whatsapp, message)
-            if result:
-                logger.info(f"✅ Copy-paste message sent successfully to {order.user.whatsapp} (after {delay_seconds}s delay)")
-            else:
-                logger.error(f"❌ Failed to send copy-paste message to {order.user.whatsapp}")
-                
-        except Exception as e:
-            logger.error(f"❌ Error in delayed copy-paste message: {e}", exc_info=True)
-
-    # Start background thread to send after delay
-    thread = threading.Thread(target=send_delayed, daemon=True)
-    thread.start()
-    
-    return True  # Return immediately, message will be sent in background
-
+        """.strip()
+
+    return queue_whatsapp_message(
+        order.user.whatsapp,
+        message,
+        kind='referral_copy_paste',
+        delay_seconds=delay_seconds,
+        after=after
+    )
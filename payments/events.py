@@ -0,0 +1,126 @@
+"""
+Push channel for the checkout order status (Server-Sent Events).
+
+publish_order_status (payments.status) sends each new status to this
+module. With Redis configured (CACHE_URL) the status is published on a
+Redis channel, and every gunicorn worker keeps one subscriber thread that
+wakes only the streams waiting on that order. Without Redis the status
+only reaches the streams of the same process, and the streams also
+re-read the cached status every FALLBACK_CHECK_SECONDS.
+
+A waiting stream holds a gunicorn thread but no database connection.
+Each process accepts at most ORDER_STREAMS_PER_WORKER streams at once.
+Past that limit a stream sends the current status and closes at once,
+and the browser reconnects after the `retry` delay. Open checkouts
+therefore never take every request thread from the rest of the site.
+"""
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'rifas:order-status'
+
+
+class Waiter:
+    """A stream waiting on one order; `data` is the last status pushed to it"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.data = None
+
+
+class OrderStatusHub:
+    """Per-process fan-out of the published statuses to the waiting streams"""
+
+    RECONNECT_DELAY = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._count = 0
+        self._thread = None
+        self._client = None
+
+    @staticmethod
+    def redis_url():
+        return settings.CACHE_URL or None
+
+    def subscribe(self, order_id):
+        """Register a stream for the order; None when the process is at its limit"""
+        with self._lock:
+            if self._count >= settings.ORDER_STREAMS_PER_WORKER:
+                return None
+            waiter = Waiter()
+            self._waiters.setdefault(order_id, set()).add(waiter)
+            self._count += 1
+            if self.redis_url() and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._listen, name='order-status', daemon=True)
+                self._thread.start()
+        return waiter
+
+    def unsubscribe(self, order_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(order_id)
+            if waiters is not None and waiter in waiters:
+                waiters.discard(waiter)
+                self._count -= 1
+                if not waiters:
+                    del self._waiters[order_id]
+
+    def publish(self, order_id, data):
+        """Send the status to every stream of the order, in all processes"""
+        url = self.redis_url()
+        if not url:
+            self._wake(order_id, data)
+            return
+
+        import redis
+
+        try:
+            if self._client is None:
+                self._client = redis.Redis.from_url(url)
+            self._client.publish(CHANNEL, json.dumps({'order_id': order_id, 'data': data}))
+        except Exception as e:
+            logger.error(f"❌ Error publishing status of order {order_id}: {e}", exc_info=True)
+            self._wake(order_id, data)
+
+    def _wake(self, order_id=None, data=None):
+        """Wake the streams of one order, or every stream when order_id is None"""
+        with self._lock:
+            if order_id is None:
+                waiters = [waiter for group in self._waiters.values() for waiter in group]
+            else:
+                waiters = list(self._waiters.get(order_id, ()))
+        for waiter in waiters:
+            if data is not None:
+                waiter.data = data
+            waiter.event.set()
+
+    def _listen(self):
+        import redis
+
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self.redis_url()).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+
+                # Mensagens podem ter sido perdidas enquanto estávamos desconectados
+                self._wake()
+
+                for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message['data'])
+                        self._wake(payload['order_id'], payload['data'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            except Exception as e:
+                logger.error(f"❌ Order status subscriber failed: {e}", exc_info=True)
+            time.sleep(self.RECONNECT_DELAY)
+
+
+hub = OrderStatusHub()
@@ -0,0 +1,86 @@
+"""
+Order status for the checkout.
+
+The PIX modal follows the order over Server-Sent Events
+(payments.events): the webhook publishes the new status as soon as the
+order is paid, and the open stream of that order sends it right away.
+The stream and the checkout-status endpoint (used when the browser has
+no EventSource) are authorized by a signed token, so there is no session
+or JWT user lookup, and read the status from the cache. A pending order
+is read from the database at most once per PENDING_CACHE_SECONDS. An
+overdue order is shown as expired there; releasing it is left to the
+run_reservation_expiry worker.
+"""
+from django.core import signing
+from django.core.cache import cache
+
+from raffles.models import RaffleOrder
+
+from .events import hub
+
+# Token assinado que autoriza acompanhar o status de um pedido (EventSource não envia headers)
+TOKEN_SALT = 'payments.order-status'
+TOKEN_MAX_AGE = 2 * 60 * 60
+
+# Pedido pendente: reler do banco no máximo a cada N segundos (o webhook atualiza o cache na hora)
+PENDING_CACHE_SECONDS = 5
+# Pedido pago/expirado não muda mais
+FINAL_CACHE_SECONDS = 60 * 60
+
+
+def make_status_token(order):
+    """Signed token that lets the buyer follow the status of this order"""
+    return signing.dumps({'order': order.id, 'user': order.user_id}, salt=TOKEN_SALT)
+
+
+def read_status_token(token, order_id):
+    """Return the user id stored in the token, or None if it is invalid for this order"""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if data.get('order') != order_id:
+        return None
+    return data.get('user')
+
+
+def _cache_key(order_id):
+    return f'order-status:{order_id}'
+
+
+def _status_data(order):
+    status = order.status
+    if order.is_overdue():
+        # Só para exibição: o worker de expiração libera o pedido
+        status = RaffleOrder.Status.EXPIRED
+    data = {'status': status}
+    if order.status == RaffleOrder.Status.PAID:
+        data['won_prizes'] = (order.payment_data or {}).get('won_prizes', [])
+    return data
+
+
+def cache_order_status(order):
+    """Store the current status of the order in the cache; returns it"""
+    seconds = PENDING_CACHE_SECONDS if order.status == RaffleOrder.Status.PENDING else FINAL_CACHE_SECONDS
+    data = _status_data(order)
+    cache.set(_cache_key(order.id), data, seconds)
+    return data
+
+
+def publish_order_status(order):
+    """Store the new status of the order and push it to its open checkout streams"""
+    data = cache_order_status(order)
+    hub.publish(order.id, data)
+    return data
+
+
+def read_order_status(order_id, user_id):
+    """Status of the order for the checkout, or None if it is not this user's order"""
+    data = cache.get(_cache_key(order_id))
+    if data is not None:
+        return data
+
+    order = RaffleOrder.objects.only('status', 'payment_data', 'raffle', 'created_at').filter(id=order_id, user_id=user_id).first()
+    if order is None:
+        return None
+    return cache_order_status(order)
@@ -0,0 +1,80 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from payments.events import hub
+from payments.status import make_status_token, publish_order_status
+from raffles.models import Raffle, RaffleOrder
+
+
+def messages(chunks):
+    """Events of an SSE response as (event, data) pairs"""
+    events = []
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(': ', 1) for line in text.strip().splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(CACHE_URL='')
+class OrderEventsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.user = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='1')
+        self.order = RaffleOrder.objects.create(raffle=raffle, user=self.user, quantity=1, amount=2)
+        self.url = reverse('order_events', args=[self.order.id])
+
+    def open_stream(self, token=None):
+        return self.client.get(self.url, {'token': token or make_status_token(self.order)})
+
+    def pay(self):
+        self.order.status = RaffleOrder.Status.PAID
+        self.order.payment_data = {'won_prizes': [{'number': 7}]}
+        self.order.save()
+        publish_order_status(self.order)
+
+    def test_rejects_a_token_for_another_order(self):
+        other = RaffleOrder.objects.create(raffle=self.order.raffle, user=self.user, quantity=1, amount=2)
+
+        self.assertEqual(self.open_stream(make_status_token(other)).status_code, 403)
+        self.assertEqual(self.open_stream('forjado').status_code, 403)
+
+    def test_payment_is_pushed_to_the_open_stream(self):
+        response = self.open_stream()
+        stream = iter(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(messages([next(stream), next(stream)]), [('pending', {'status': 'pending'})])
+
+        self.pay()
+        with self.assertNumQueries(0):
+            pushed = messages(stream)
+
+        self.assertEqual(pushed, [('paid', {'status': 'paid', 'won_prizes': [{'number': 7}]})])
+        self.assertEqual(hub._count, 0)
+
+    def test_final_status_closes_the_stream_at_once(self):
+        self.pay()
+
+        response = self.open_stream()
+
+        self.assertEqual([event for event, _ in messages(response.streaming_content)], ['paid'])
+        self.assertEqual(hub._count, 0)
+
+    @override_settings(ORDER_STREAMS_PER_WORKER=0)
+    def test_streams_past_the_limit_send_the_status_and_close(self):
+        response = self.open_stream()
+        chunks = list(response.streaming_content)
+
+        self.assertEqual(chunks[0], b'retry: 3000\n\n')
+        self.assertEqual(messages(chunks), [('pending', {'status': 'pending'})])
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from payments.status import make_status_token, publish_order_status
+from raffles.models import Raffle, RaffleOrder
+
+
+class CheckoutStatusTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.user = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='1')
+        self.order = RaffleOrder.objects.create(raffle=raffle, user=self.user, quantity=1, amount=2)
+        self.url = reverse('checkout_status', args=[self.order.id])
+
+    def poll(self, token=None):
+        return self.client.get(self.url, {'token': token or make_status_token(self.order)})
+
+    def test_rejects_a_token_for_another_order(self):
+        other = RaffleOrder.objects.create(raffle=self.order.raffle, user=self.user, quantity=1, amount=2)
+        self.assertEqual(self.poll(make_status_token(other)).status_code, 403)
+        self.assertEqual(self.poll('forjado').status_code, 403)
+
+    def test_pending_order_is_read_once_then_served_from_cache(self):
+        self.assertEqual(self.poll().json(), {'status': 'pending'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.poll().json(), {'status': 'pending'})
+
+    def test_published_payment_is_seen_without_a_query(self):
+        self.poll()
+        self.order.status = RaffleOrder.Status.PAID
+        self.order.payment_data = {'won_prizes': [{'number': 7}]}
+        self.order.save()
+        publish_order_status(self.order)
+
+        with self.assertNumQueries(0):
+            response = self.poll()
+        self.assertEqual(response.json(), {'status': 'paid', 'won_prizes': [{'number': 7}]})
+
+    def test_overdue_order_is_shown_as_expired_without_writes(self):
+        # A expiração em si fica com o worker run_reservation_expiry
+        RaffleOrder.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(minutes=20))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.poll().json(), {'status': 'expired'})
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertEqual(RaffleOrder.objects.get(pk=self.order.pk).status, RaffleOrder.Status.PENDING)
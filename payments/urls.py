@@ -5,4 +5,6 @@ urlpatterns = [
     path('mercadopago/create/', views.create_mercadopago_payment, name='mercadopago_create'),
     path('mercadopago/webhook/', views.mercadopago_webhook, name='mercadopago_webhook'),
     path('status/<int:order_id>/', views.get_order_status, name='get_order_status'),
+    path('events/<int:order_id>/', views.order_events, name='order_events'),
+    path('checkout-status/<int:order_id>/', views.checkout_status, name='checkout_status'),
 ]
@@ -3,11 +3,23 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import mercadopago
 from raffles.models import RaffleOrder
+from .events import hub
+from .status import make_status_token, publish_order_status, read_order_status, read_status_token
 import json
+import time
+
+# Duração de cada stream SSE; o EventSource reconecta sozinho depois (RETRY_MILLISECONDS)
+STREAM_SECONDS = 55
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+# Sem Redis o status publicado só chega aos streams do mesmo processo: reler o cache nesse intervalo
+FALLBACK_CHECK_SECONDS = 5
 
 
 def webhook_parser(request_data, content_type):
@@ -103,10 +115,13 @@ def create_mercadopago_payment(request):
     order.save(update_fields=['payment_id'])
 
     # Extract PIX data to return to frontend
+    token = make_status_token(order)
     pix_data = {
         "payment_id": payment["id"],
         "qr_code_base64": payment["point_of_interaction"]["transaction_data"]["qr_code_base64"],
         "qr_code": payment["point_of_interaction"]["transaction_data"]["qr_code"],
+        "events_url": f"/api/payments/events/{order.id}/?token={token}",
+        "status_url": f"/api/payments/checkout-status/{order.id}/?token={token}",
     }
 
     return Response(pix_data)
@@ -137,11 +152,111 @@ def get_order_status(request, order_id):
         return Response({'error': 'Pedido não encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
 
+def _release_connection():
+    """Do not keep a database connection while the stream waits"""
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _status_message(data):
+    return f"event: {data['status']}\ndata: {json.dumps(data)}\n\n"
+
+
+def _order_status_stream(order_id, user_id, waiter, data):
+    """Yield SSE messages until the order leaves PENDING or the stream times out
+
+    `data` is the status read after `waiter` was registered, so a status
+    published in between is not lost.
+    """
+    pushed = hub.redis_url() is not None
+    deadline = time.monotonic() + STREAM_SECONDS
+
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        yield _status_message(data)
+        if waiter is None or data['status'] != RaffleOrder.Status.PENDING:
+            return
+        _release_connection()
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            woke = waiter.event.wait(min(remaining, HEARTBEAT_SECONDS if pushed else FALLBACK_CHECK_SECONDS))
+            waiter.event.clear()
+            if waiter.data is not None:
+                data, waiter.data = waiter.data, None
+            elif woke or not pushed:
+                data = read_order_status(order_id, user_id)
+                _release_connection()
+            else:
+                yield ': ping\n\n'
+                continue
+
+            if data is None:
+                return
+            if data['status'] != RaffleOrder.Status.PENDING:
+                yield _status_message(data)
+                return
+    finally:
+        if waiter is not None:
+            hub.unsubscribe(order_id, waiter)
+
+
+@require_http_methods(["GET"])
+def order_events(request, order_id):
+    """Server-Sent Events stream that pushes the order status to the PIX modal
+
+    Authorized by the signed token returned with the PIX data, since
+    EventSource cannot send the Authorization header. When this process
+    already holds ORDER_STREAMS_PER_WORKER streams, the current status is
+    sent and the stream closes; the browser reconnects after the retry delay.
+    """
+    user_id = read_status_token(request.GET.get('token', ''), order_id)
+    if user_id is None:
+        return JsonResponse({'error': 'Token inválido'}, status=403)
+
+    waiter = hub.subscribe(order_id)
+    data = read_order_status(order_id, user_id)
+    if data is None:
+        if waiter is not None:
+            hub.unsubscribe(order_id, waiter)
+        return JsonResponse({'error': 'Pedido não encontrado'}, status=404)
+
+    response = StreamingHttpResponse(
+        _order_status_stream(order_id, user_id, waiter, data),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_http_methods(["GET"])
+def checkout_status(request, order_id):
+    """Order status for browsers without EventSource
+
+    Authorized by the signed token returned with the PIX data and answered
+    from the cache, so each request is a cache read.
+    """
+    user_id = read_status_token(request.GET.get('token', ''), order_id)
+    if user_id is None:
+        return JsonResponse({'error': 'Token inválido'}, status=403)
+
+    data = read_order_status(order_id, user_id)
+    if data is None:
+        return JsonResponse({'error': 'Pedido não encontrado'}, status=404)
+
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 @require_http_methods(["POST"])
 @csrf_exempt
 def mercadopago_webhook(request):
     """MercadoPago webhook handler - Accepts both JSON and form-urlencoded"""
-    from django.http import JsonResponse
     import logging
     logger = logging.getLogger(__name__)
 
@@ -210,29 +325,21 @@ def mercadopago_webhook(request):
             # Send WhatsApp notification with numbers
             from notifications.whatsapp import send_payment_confirmation, send_referral_share_invitation
 
-            logger.info(f"📤 Attempting to send WhatsApp to {order.user.whatsapp}")
+            # As mensagens só entram na fila; o worker send_whatsapp_messages envia
+            logger.info(f"📤 Queueing WhatsApp to {order.user.whatsapp}")
             try:
-                result = send_payment_confirmation(order)
-                if result:
-                    logger.info(f"✅ WhatsApp sent successfully to {order.user.whatsapp}")
-                    logger.info(f"📋 Response: {result}")
-                else:
-                    logger.error(f"❌ WhatsApp sending failed for order {order.id} - No result returned")
+                send_payment_confirmation(order)
             except Exception as e:
-                logger.error(f"❌ Error sending WhatsApp notification: {e}", exc_info=True)
+                logger.error(f"❌ Error queueing WhatsApp notification: {e}", exc_info=True)
 
             # Send referral share invitation if eligible
             if (order.raffle.enable_referral and
                 order.quantity >= order.raffle.referral_min_purchase):
-                logger.info(f"📤 Sending referral share invitation to {order.user.whatsapp}")
+                logger.info(f"📤 Queueing referral share invitation to {order.user.whatsapp}")
                 try:
-                    result = send_referral_share_invitation(order)
-                    if result:
-                        logger.info(f"✅ Referral invitation sent successfully")
-                    else:
-                        logger.error(f"❌ Failed to send referral invitation")
+                    send_referral_share_invitation(order)
                 except Exception as e:
-                    logger.error(f"❌ Error sending referral invitation: {e}", exc_info=True)
+                    logger.error(f"❌ Error queueing referral invitation: {e}", exc_info=True)
 
         # Save the latest payment data for reference
         # Preserve any won_prizes or milestone data that mark_as_paid() may have stored
@@ -249,6 +356,9 @@ def mercadopago_webhook(request):
         order.payment_data = payment_data
         order.save(update_fields=['payment_data'])
 
+        # Atualizar o status lido pelo checkout aberto agora que won_prizes já está salvo
+        publish_order_status(order)
+
         return JsonResponse({'status': 'ok'}, status=200)
         
     except Exception as e:
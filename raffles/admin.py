@@ -1,24 +1,66 @@
+from django import forms
 from django.contrib import admin
+from django.utils.html import format_html
 from unfold.admin import ModelAdmin
-from .models import Raffle, RaffleNumber, RaffleOrder, Referral, PrizeNumber, SiteConfiguration
+from .models import (
+    Raffle, RaffleNumber, RaffleOrder, Referral, PrizeNumber, SiteConfiguration, CampaignStats, RaffleDraw,
+    ImageAsset
+)
+from .images import decode_data_uri
+
+
+class ImageUploadForm(forms.ModelForm):
+    """Model form with an optional Base64 field to replace the stored image
+
+    The image itself lives in ImageAsset; the field is only read on save.
+    """
+
+    image_base64 = forms.CharField(
+        label='Nova imagem (Base64)',
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3}),
+        help_text='Cole o código data:image/... completo para trocar a imagem. Deixe em branco para manter a atual.'
+    )
+
+    def clean_image_base64(self):
+        value = self.cleaned_data['image_base64'].strip()
+        if value and decode_data_uri(value) is None:
+            raise forms.ValidationError('Imagem inválida. Envie um data URI (data:image/...;base64,...).')
+        return value
+
+    def get_image_asset(self):
+        """Store the new image, if one was sent. Called from save_model"""
+        value = self.cleaned_data.get('image_base64')
+        return ImageAsset.from_data_uri(value) if value else None
+
+
+def image_preview(url):
+    if not url:
+        return '-'
+    return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;">', url)
 
 
 @admin.register(Raffle)
 class RaffleAdmin(ModelAdmin):
-    list_display = ('name', 'status', 'total_numbers', 'numbers_sold', 'numbers_available', 'created_at')
+    list_display = ('name', 'status', 'total_numbers', 'numbers_sold', 'numbers_available', 'revenue', 'unique_buyers', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('name', 'prize_name')
-    readonly_fields = ('numbers_sold', 'numbers_reserved', 'numbers_available', 'created_at', 'updated_at')
+    list_select_related = ('stats',)
+    form = ImageUploadForm
+    readonly_fields = (
+        'prize_image_preview', 'numbers_sold', 'numbers_reserved', 'numbers_available', 'revenue',
+        'unique_buyers', 'referrals_redeemed', 'created_at', 'updated_at'
+    )
 
     fieldsets = (
         ('Informacoes Basicas', {
             'fields': ('name', 'description', 'status')
         }),
         ('Premio', {
-            'fields': ('prize_name', 'prize_description', 'prize_image_base64')
+            'fields': ('prize_name', 'prize_description', 'prize_image_preview', 'image_base64')
         }),
         ('Configuracoes', {
-            'fields': ('total_numbers', 'price_per_number', 'fee_percentage', 'draw_date', 'admin_whatsapp')
+            'fields': ('total_numbers', 'sparse_numbers', 'price_per_number', 'fee_percentage', 'draw_date', 'admin_whatsapp')
         }),
         ('Resultado', {
             'fields': ('winner_number', 'winner')
@@ -55,12 +97,48 @@ class RaffleAdmin(ModelAdmin):
             'description': 'Configure um prêmio especial para clientes que comprarem uma quantidade mínima de números (ex: compre 50 números e ganhe um PDF exclusivo). Você pode adicionar um arquivo para download ou um link externo (Google Drive, Dropbox, etc).'
         }),
         ('Estatisticas', {
-            'fields': ('numbers_sold', 'numbers_reserved', 'numbers_available', 'created_at', 'updated_at')
+            'fields': (
+                'numbers_sold', 'numbers_reserved', 'numbers_available', 'revenue', 'unique_buyers',
+                'referrals_redeemed', 'created_at', 'updated_at'
+            )
         }),
     )
 
+    def get_queryset(self, request):
+        # Vendidos, arrecadado e compradores somam as fatias dos contadores:
+        # carregadas de uma vez para a página inteira
+        return super().get_queryset(request).prefetch_related('counter_shards')
+
+    @admin.display(description='Imagem do Premio')
+    def prize_image_preview(self, obj):
+        return image_preview(obj.prize_image_url)
+
+    @admin.display(description='Arrecadado')
+    def revenue(self, obj):
+        return f"R$ {CampaignStats.for_raffle(obj).revenue:.2f}"
+
+    @admin.display(description='Compradores')
+    def unique_buyers(self, obj):
+        return CampaignStats.for_raffle(obj).unique_buyers
+
+    @admin.display(description='Indicações')
+    def referrals_redeemed(self, obj):
+        return CampaignStats.for_raffle(obj).referrals_redeemed
+
+    def get_readonly_fields(self, request, obj=None):
+        # O modo de armazenamento só pode ser escolhido na criação
+        if obj:
+            return self.readonly_fields + ('sparse_numbers',)
+        return self.readonly_fields
+
     def save_model(self, request, obj, form, change):
+        old_image_id = obj.prize_image_id
+        new_image = form.get_image_asset()
+        if new_image:
+            obj.set_prize_image(new_image)
         super().save_model(request, obj, form, change)
+        if obj.prize_image_id != old_image_id:
+            ImageAsset.delete_if_unused(old_image_id)
         if not change:  # Se e novo
             obj.initialize_numbers()
 
@@ -96,6 +174,54 @@ class PrizeNumberAdmin(ModelAdmin):
     search_fields = ('number', 'raffle__name', 'winner__name', 'winner__whatsapp')
     readonly_fields = ('is_released', 'is_won', 'winner', 'won_at', 'created_at', 'updated_at')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Premiados bloqueados ficam fora do índice de disponibilidade: só os bits
+        # do número (e do número antigo, se foi trocado) mudam
+        numbers = {obj.number}
+        if change and 'number' in form.changed_data:
+            numbers.add(form.initial['number'])
+        obj.raffle.refresh_number_index(numbers)
+
+    def delete_model(self, request, obj):
+        raffle = obj.raffle
+        super().delete_model(request, obj)
+        raffle.refresh_next_prize_threshold()
+        raffle.refresh_number_index([obj.number])
+
+
+
+@admin.register(RaffleDraw)
+class RaffleDrawAdmin(ModelAdmin):
+    """Histórico de sorteios (somente leitura; sortear pelo Sorteador)"""
+    list_display = ('raffle', 'status', 'winner_number', 'winner', 'eligible_count', 'committed_at', 'revealed_at')
+    list_filter = ('status', 'raffle')
+    search_fields = ('raffle__name', 'winner__name', 'sold_hash')
+
+    def get_fields(self, request, obj=None):
+        return [
+            'raffle', 'status', 'beacon_round', 'eligible_count', 'sold_hash', 'randomness', 'signature',
+            'randomness_is_signature_hash', 'ordinal', 'winner_number', 'winner', 'void_reason', 'created_by',
+            'committed_at', 'revealed_at'
+        ]
+
+    @admin.display(description='Aleatoriedade = SHA-256 da assinatura')
+    def randomness_is_signature_hash(self, obj):
+        # Confere só o hash; a assinatura BLS em si não é verificada aqui
+        result = obj.randomness_is_signature_hash()
+        if result is None:
+            return '-'
+        return '✅ Sim (assinatura BLS não verificada)' if result else '❌ Não'
+
+    def get_readonly_fields(self, request, obj=None):
+        return self.get_fields(request, obj)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(SiteConfiguration)
 class SiteConfigurationAdmin(ModelAdmin):
@@ -109,9 +235,11 @@ class SiteConfigurationAdmin(ModelAdmin):
         # Don't allow deletion
         return False
 
+    form = ImageUploadForm
+
     fieldsets = (
         ('Logo e Identidade Visual', {
-            'fields': ('logo_base64', 'site_name'),
+            'fields': ('logo_preview', 'image_base64', 'site_name'),
             'description': 'Cole a logo em formato Base64 (data:image/...). Use um conversor online como base64-image.de para converter sua imagem. Recomendado: 120x120px, PNG com fundo transparente. A logo será exibida em todas as páginas do site.'
         }),
         ('Notificações de Números Premiados', {
@@ -123,4 +251,17 @@ class SiteConfigurationAdmin(ModelAdmin):
         }),
     )
 
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('logo_preview', 'created_at', 'updated_at')
+
+    @admin.display(description='Logo do Site')
+    def logo_preview(self, obj):
+        return image_preview(obj.logo_url if obj.logo_hash else '')
+
+    def save_model(self, request, obj, form, change):
+        old_logo_id = obj.logo_id
+        new_logo = form.get_image_asset()
+        if new_logo:
+            obj.set_logo(new_logo)
+        super().save_model(request, obj, form, change)
+        if obj.logo_id != old_logo_id:
+            ImageAsset.delete_if_unused(old_logo_id)
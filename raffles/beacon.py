@@ -0,0 +1,62 @@
+"""
+Public randomness beacon used by the raffle draws.
+
+The draws take their randomness from the drand network (League of Entropy)
+instead of a secret generated by the server: a commitment names a future
+round, and nobody (staff included) knows its value until the network
+publishes it. Each round is a BLS signature; its ``randomness`` is the
+SHA-256 of that signature, which is checked here. The signature itself can
+be verified against the chain public key with any drand client.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+import requests
+from django.conf import settings
+
+# Cadeia padrão (mainnet) do drand: uma rodada a cada 30 segundos
+CHAIN_HASH = '8990e7a9aaed2ffed73dbd7092123d6f289930540d7651336225dc172e51b2ce'
+GENESIS_TIME = 1595431050
+PERIOD = 30
+
+
+class BeaconError(Exception):
+    """The round could not be fetched or does not check out"""
+
+
+def round_at(moment):
+    """Latest round published at ``moment`` (an aware datetime)"""
+    return int((moment.timestamp() - GENESIS_TIME) // PERIOD) + 1
+
+
+def round_time(round_number):
+    """When ``round_number`` is published"""
+    return datetime.fromtimestamp(GENESIS_TIME + (round_number - 1) * PERIOD, tz=dt_timezone.utc)
+
+
+def round_url(round_number):
+    return f"{settings.DRAND_URL.rstrip('/')}/{CHAIN_HASH}/public/{round_number}"
+
+
+def fetch_round(round_number):
+    """Fetch a published round: {'round', 'randomness', 'signature'}"""
+    try:
+        response = requests.get(round_url(round_number), timeout=10)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise BeaconError(f'Rodada {round_number} indisponível: {e}')
+
+    try:
+        signature = bytes.fromhex(data['signature'])
+        randomness = data['randomness']
+        published_round = int(data['round'])
+    except (KeyError, TypeError, ValueError):
+        raise BeaconError(f'Resposta inválida para a rodada {round_number}')
+
+    if published_round != round_number:
+        raise BeaconError(f'O beacon respondeu a rodada {published_round} em vez da {round_number}')
+    if hashlib.sha256(signature).hexdigest() != randomness:
+        raise BeaconError(f'Aleatoriedade da rodada {round_number} não confere com a assinatura')
+
+    return {'round': published_round, 'randomness': randomness, 'signature': data['signature']}
@@ -0,0 +1,108 @@
+"""
+Low-level helpers for the availability bitmaps of raffle numbers.
+
+A bitmap is a bytearray where bit ``i`` lives in byte ``i // 8`` under
+mask ``1 << (i % 8)``. These functions only deal with positions; mapping
+positions to raffle numbers is done by RaffleNumberBlock.
+"""
+
+# Quantidade de bits ligados para cada valor de byte (0-255)
+POPCOUNT = bytes(bin(value).count('1') for value in range(256))
+
+
+def empty_bitmap(size_in_bits):
+    """Return a bitmap with every bit cleared"""
+    return bytearray((size_in_bits + 7) // 8)
+
+
+def count_bits(bitmap):
+    """Count the bits that are set"""
+    return int.from_bytes(bitmap, 'little').bit_count()
+
+
+def set_bits(bitmap, positions):
+    """Set the given positions. Returns how many bits changed from 0 to 1"""
+    changed = 0
+    for position in positions:
+        byte, mask = position >> 3, 1 << (position & 7)
+        if not bitmap[byte] & mask:
+            bitmap[byte] |= mask
+            changed += 1
+    return changed
+
+
+def clear_bits(bitmap, positions):
+    """Clear the given positions. Returns how many bits changed from 1 to 0"""
+    changed = 0
+    for position in positions:
+        byte, mask = position >> 3, 1 << (position & 7)
+        if bitmap[byte] & mask:
+            bitmap[byte] &= ~mask & 0xFF
+            changed += 1
+    return changed
+
+
+def is_set(bitmap, position):
+    """Check whether a single position is set"""
+    return bool(bitmap[position >> 3] & (1 << (position & 7)))
+
+
+def set_range(bitmap, start, stop):
+    """Set every bit in [start, stop). Returns how many bits changed from 0 to 1"""
+    if stop <= start:
+        return 0
+
+    before = count_bits(bitmap)
+
+    # Bits soltos no início até alinhar no byte
+    position = start
+    while position < stop and position & 7:
+        bitmap[position >> 3] |= 1 << (position & 7)
+        position += 1
+
+    # Bytes inteiros
+    full_bytes = (stop - position) >> 3
+    if full_bytes:
+        first = position >> 3
+        bitmap[first:first + full_bytes] = b'\xff' * full_bytes
+        position += full_bytes << 3
+
+    # Bits restantes no final
+    while position < stop:
+        bitmap[position >> 3] |= 1 << (position & 7)
+        position += 1
+
+    return count_bits(bitmap) - before
+
+
+def select_set_bits(bitmap, ranks):
+    """Return the positions of the set bits with the given ranks
+
+    ``ranks`` must be sorted and 0-based, i.e. rank 0 is the first set bit.
+    The bitmap is scanned once, so the cost is bounded by its size and not
+    by the total amount of numbers in the raffle.
+    """
+    positions = []
+    pending = iter(ranks)
+    target = next(pending, None)
+    seen = 0
+
+    for byte_index, value in enumerate(bitmap):
+        if target is None:
+            break
+        if not value:
+            continue
+
+        count = POPCOUNT[value]
+        while target is not None and target < seen + count:
+            wanted = target - seen
+            for bit in range(8):
+                if value >> bit & 1:
+                    if wanted == 0:
+                        positions.append((byte_index << 3) + bit)
+                        break
+                    wanted -= 1
+            target = next(pending, None)
+        seen += count
+
+    return positions
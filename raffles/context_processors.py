@@ -8,11 +8,12 @@ def site_config(request):
     """
     Add site configuration to all template contexts.
     This includes the logo and site name.
+    The configuration is cached (see SiteConfiguration.get_config).
     """
     config = SiteConfiguration.get_config()
 
     return {
-        'site_logo': config.get_logo_base64(),
+        'site_logo': config.logo_url,
         'site_name': config.site_name,
         'site_config': config,
     }
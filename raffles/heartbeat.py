@@ -0,0 +1,39 @@
+"""
+Liveness of the background workers.
+
+Each long-running worker (run_reservation_expiry, send_whatsapp_messages)
+touches a file in WORKER_HEARTBEAT_DIR after every loop that reached the
+database. The ``healthcheck`` command reads the file ages, so the container
+healthcheck catches a worker that died or got stuck, not only one that
+exited.
+"""
+import os
+import time
+
+from django.conf import settings
+
+EXPIRY_WORKER = 'reservation_expiry'
+WHATSAPP_WORKER = 'whatsapp'
+
+
+def _path(name):
+    return os.path.join(settings.WORKER_HEARTBEAT_DIR, f'{name}.alive')
+
+
+def beat(name):
+    """Record that the worker ``name`` is alive"""
+    path = _path(name)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(settings.WORKER_HEARTBEAT_DIR, exist_ok=True)
+        with open(path, 'a'):
+            pass
+
+
+def age(name):
+    """Seconds since the last beat of ``name``, or None if it never beat"""
+    try:
+        return time.time() - os.path.getmtime(_path(name))
+    except FileNotFoundError:
+        return None
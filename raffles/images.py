@@ -0,0 +1,87 @@
+"""
+Helpers for the stored images (prize image, site logo).
+
+The bytes live in ImageAsset and pages reference them by a content-hashed
+URL, so browsers and CDNs can keep them forever: a new image gets a new
+hash and therefore a new URL. Uploads from the forms arrive as data URIs.
+"""
+import base64
+import binascii
+import hashlib
+from urllib.parse import unquote_to_bytes
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+
+HASH_LENGTH = 16
+CACHE_SECONDS = 24 * 60 * 60
+
+# O conteúdo de uma URL nunca muda, então o navegador pode guardar para sempre
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def hash_bytes(data):
+    """Content hash used in the image URLs"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def decode_data_uri(data_uri):
+    """Split a data URI into (content_type, bytes). Returns None if it is invalid"""
+    header, separator, payload = data_uri.partition(',')
+    if not separator or not header.startswith('data:'):
+        return None
+
+    params = header[len('data:'):].split(';')
+    content_type = params[0].strip() or 'application/octet-stream'
+    if 'base64' in params[1:]:
+        try:
+            data = base64.b64decode(payload)
+        except (binascii.Error, ValueError):
+            return None
+    else:
+        data = unquote_to_bytes(payload)
+    return content_type, data
+
+
+def get_image(image_hash, load):
+    """(content_type, bytes) for the hash, calling load() on a cache miss
+
+    load() returns the same tuple, or None when the image does not exist.
+    """
+    key = f'image:{image_hash}'
+    image = cache.get(key)
+    if image is None:
+        image = load()
+        if image is None:
+            return None
+        content_type, data = image
+        image = (content_type, bytes(data))
+        cache.set(key, image, CACHE_SECONDS)
+    return image
+
+
+def image_response(request, image_hash, load):
+    """Serve the image with long-lived cache headers, ETag and conditional GET"""
+    etag = f'"{image_hash}"'
+
+    # A URL tem o hash do conteúdo: se o navegador já tem esse ETag, está atualizado
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [value.strip() for value in if_none_match.split(',')] or if_none_match.strip() == '*':
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    image = get_image(image_hash, load)
+    if image is None:
+        # Resposta direta: Http404 passaria pelo SilentErrorMiddleware e viraria redirect
+        return HttpResponseNotFound()
+
+    content_type, data = image
+    response = HttpResponse(data, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    response['Content-Length'] = len(data)
+    # Imagens SVG abertas direto no navegador não podem executar scripts
+    response['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+    return response
@@ -0,0 +1,55 @@
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from raffles import heartbeat
+
+# Porta em que o entrypoint sobe o gunicorn
+GUNICORN_PORT = 8000
+
+
+class Command(BaseCommand):
+    help = 'Healthcheck do container: gunicorn aceitando conexões (web) e workers de fundo com sinal de vida recente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None, help='Segundos sem sinal de vida até considerar o worker parado (padrão: WORKER_HEARTBEAT_MAX_AGE)')
+
+    def handle(self, *args, **options):
+        max_age = options['max_age'] or settings.WORKER_HEARTBEAT_MAX_AGE
+        problems = []
+
+        if settings.PROCESS_TYPE == 'web' and not self.gunicorn_listening():
+            problems.append(f'gunicorn não aceita conexões na porta {GUNICORN_PORT}')
+
+        for name in self.expected_workers():
+            seconds = heartbeat.age(name)
+            if seconds is None:
+                problems.append(f'worker {name} sem sinal de vida')
+            elif seconds > max_age:
+                problems.append(f'worker {name} sem sinal de vida há {int(seconds)}s')
+
+        if problems:
+            raise CommandError('; '.join(problems))
+
+        self.stdout.write(self.style.SUCCESS('✅ Tudo rodando'))
+
+    def expected_workers(self):
+        """Workers that run in this container"""
+        if settings.PROCESS_TYPE == 'expiry':
+            return [heartbeat.EXPIRY_WORKER]
+        if settings.PROCESS_TYPE == 'whatsapp':
+            return [heartbeat.WHATSAPP_WORKER]
+
+        workers = []
+        if settings.RUN_EXPIRY_WORKER:
+            workers.append(heartbeat.EXPIRY_WORKER)
+        if settings.RUN_WHATSAPP_WORKER:
+            workers.append(heartbeat.WHATSAPP_WORKER)
+        return workers
+
+    def gunicorn_listening(self):
+        try:
+            socket.create_connection(('127.0.0.1', GUNICORN_PORT), timeout=5).close()
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from raffles.models import GridChange
+
+
+class Command(BaseCommand):
+    help = 'Remove o histórico antigo do feed de mudanças do grid de números'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Manter as mudanças das últimas N horas (padrão: 24)')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(hours=options['hours'])
+        deleted = GridChange.prune(older_than)
+        self.stdout.write(self.style.SUCCESS(f'✅ {deleted} registro(s) de mudanças removido(s)'))
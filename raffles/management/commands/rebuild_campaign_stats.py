@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from raffles.models import Raffle, CampaignStats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as estatísticas materializadas das campanhas (backfill/correção)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raffle', type=int, help='ID da campanha (padrão: todas)')
+
+    def handle(self, *args, **options):
+        raffles = Raffle.objects.all()
+        if options.get('raffle'):
+            raffles = raffles.filter(id=options['raffle'])
+
+        for raffle in raffles:
+            stats = CampaignStats.rebuild(raffle)
+            self.stdout.write(
+                f'✓ {raffle.name}: R$ {stats.revenue} em {stats.paid_orders} pedido(s), '
+                f'{stats.unique_buyers} comprador(es), {stats.prizes_won}/{stats.prize_numbers} prêmio(s), '
+                f'{stats.referrals_redeemed} indicação(ões)'
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from raffles.models import Raffle
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de disponibilidade (bitmap) dos números das campanhas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raffle', type=int, help='ID da campanha (padrão: todas)')
+
+    def handle(self, *args, **options):
+        raffles = Raffle.objects.all()
+        if options.get('raffle'):
+            raffles = raffles.filter(id=options['raffle'])
+
+        for raffle in raffles:
+            raffle.build_number_index()
+            free = sum(raffle.number_blocks.values_list('free_count', flat=True))
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ {raffle.name}: índice reconstruído ({free} número(s) livre(s))')
+            )
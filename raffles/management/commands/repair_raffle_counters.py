@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from raffles.models import Raffle
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de números vendidos/reservados das campanhas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raffle', type=int, help='ID da campanha (padrão: todas)')
+
+    def handle(self, *args, **options):
+        raffles = Raffle.objects.all()
+        if options.get('raffle'):
+            raffles = raffles.filter(id=options['raffle'])
+
+        for raffle in raffles:
+            old_sold, old_reserved = raffle.numbers_sold, raffle.numbers_reserved
+            raffle.recalculate_counters()
+
+            if (old_sold, old_reserved) == (raffle.numbers_sold, raffle.numbers_reserved):
+                self.stdout.write(f'✓ {raffle.name}: contadores corretos')
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'🔧 {raffle.name}: vendidos {old_sold} → {raffle.numbers_sold}, '
+                    f'reservados {old_reserved} → {raffle.numbers_reserved}'
+                ))
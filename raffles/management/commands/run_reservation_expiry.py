@@ -0,0 +1,98 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, InterfaceError, OperationalError
+from django.utils import timezone
+from raffles import heartbeat
+from raffles.models import RaffleNumber
+
+# Chave do advisory lock do Postgres que garante um único worker ativo entre as réplicas
+ADVISORY_LOCK_KEY = 73457001
+
+# Pausa mínima quando há vencidos que não puderam ser liberados agora (ex.: pagamento em andamento)
+MIN_SLEEP = 0.5
+
+
+class Command(BaseCommand):
+    help = 'Worker que libera as reservas expiradas no momento em que expiram (deixar rodando)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Números liberados por transação (padrão: 1000)')
+        parser.add_argument('--max-sleep', type=float, default=60, help='Tempo máximo dormindo sem verificar novas reservas, em segundos (padrão: 60)')
+        parser.add_argument('--once', action='store_true', help='Liberar o que já expirou e sair')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_sleep = options['max_sleep']
+        waiting_lock = False
+
+        self.stdout.write('⏱️  Worker de expiração de reservas iniciado')
+
+        while True:
+            try:
+                locked = self.acquire_lock()
+                # Conseguiu falar com o banco: vivo, ativo ou de reserva (healthcheck)
+                heartbeat.beat(heartbeat.EXPIRY_WORKER)
+
+                if not locked:
+                    # Outra réplica já está liberando as reservas: ficar de reserva
+                    if not waiting_lock:
+                        self.stdout.write('💤 Outro worker está ativo, aguardando...')
+                        waiting_lock = True
+                    time.sleep(max_sleep)
+                    continue
+                waiting_lock = False
+
+                released = self.release_due(batch_size)
+                if released:
+                    self.stdout.write(self.style.SUCCESS(f'✅ {released} número(s) reservado(s) liberado(s)'))
+
+                if options['once']:
+                    return
+
+                time.sleep(self.seconds_until_next_deadline(max_sleep))
+            except (OperationalError, InterfaceError) as e:
+                # Conexão perdida: o lock cai junto, tentar de novo com uma conexão nova
+                self.stderr.write(f'❌ Erro de banco no worker de expiração: {e}')
+                connection.close()
+                time.sleep(max_sleep)
+
+    def acquire_lock(self):
+        """Take (or confirm we still hold) the session advisory lock"""
+        if connection.vendor != 'postgresql':
+            return True
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid()
+                      AND classid = 0 AND objid = %s AND granted
+                )
+                """,
+                [ADVISORY_LOCK_KEY]
+            )
+            if cursor.fetchone()[0]:
+                return True
+
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_KEY])
+            return cursor.fetchone()[0]
+
+    def release_due(self, batch_size):
+        """Release everything that is due, one batch per transaction"""
+        total = 0
+        while True:
+            released = RaffleNumber.release_expired(limit=batch_size)
+            total += released
+            if released < batch_size:
+                return total
+
+    def seconds_until_next_deadline(self, max_sleep):
+        """Seconds to sleep until the next reservation expires (at most max_sleep)"""
+        deadline = RaffleNumber.next_expiry()
+        if deadline is None:
+            return max_sleep
+
+        remaining = (deadline - timezone.now()).total_seconds()
+        return min(max(remaining, MIN_SLEEP), max_sleep)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from raffles import beacon
+from raffles.models import RaffleDraw
+
+
+class Command(BaseCommand):
+    help = 'Confere um sorteio: hash da assinatura do beacon, posição sorteada e número vencedor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('draw_id', type=int, help='ID do sorteio')
+
+    def handle(self, *args, **options):
+        try:
+            draw = RaffleDraw.objects.select_related('raffle').get(pk=options['draw_id'])
+        except RaffleDraw.DoesNotExist:
+            raise CommandError('Sorteio não encontrado')
+
+        checks = draw.verify()
+        if not checks['revealed']:
+            if draw.status == RaffleDraw.Status.VOID:
+                self.stdout.write(self.style.WARNING(f'🚫 Sorteio anulado: {draw.void_reason}'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'⏳ Sorteio ainda não realizado (rodada {draw.beacon_round}, hash dos vendidos {draw.sold_hash})'
+                ))
+            return
+
+        self.stdout.write(f'🎲 {draw.raffle.name}: número {draw.winner_number} na posição {draw.ordinal} de {draw.eligible_count}')
+        self.stdout.write(f'   Rodada do beacon: {draw.beacon_round or "-"}')
+        self.stdout.write(f'   Aleatoriedade:    {draw.randomness}')
+        self.stdout.write(f'   Hash dos vendidos: {draw.sold_hash or "-"}')
+
+        labels = {
+            'randomness_is_signature_hash': 'Aleatoriedade é o SHA-256 da assinatura do beacon',
+            'ordinal_matches': 'Posição confere com a aleatoriedade',
+            'winner_matches': 'Número vencedor confere com a lista de vendidos',
+        }
+        for key, label in labels.items():
+            if checks[key] is None:
+                if key == 'winner_matches':
+                    self.stdout.write(self.style.WARNING(f'➖ {label}: vendas mudaram depois do sorteio, não dá para conferir'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'➖ {label}: sorteio anterior ao beacon'))
+            elif checks[key]:
+                self.stdout.write(self.style.SUCCESS(f'✅ {label}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ {label}'))
+
+        # Só o hash é conferido aqui; a assinatura BLS em si exige um cliente drand
+        if draw.signature:
+            self.stdout.write(
+                f'ℹ️  A assinatura BLS não é verificada por este comando: confira a rodada '
+                f'{draw.beacon_round} com um cliente drand e a chave pública da cadeia {beacon.CHAIN_HASH[:16]}...'
+            )
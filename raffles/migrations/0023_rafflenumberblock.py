@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0022_update_admin_group_help_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaffleNumberBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Indice do Bloco')),
+                ('bitmap', models.BinaryField(verbose_name='Bitmap de Disponibilidade')),
+                ('free_count', models.PositiveIntegerField(default=0, verbose_name='Numeros Livres')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_blocks', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Bloco de Disponibilidade',
+                'verbose_name_plural': 'Blocos de Disponibilidade',
+                'ordering': ['raffle', 'index'],
+                'unique_together': {('raffle', 'index')},
+            },
+        ),
+    ]
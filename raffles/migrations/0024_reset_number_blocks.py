@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def reset_number_blocks(apps, schema_editor):
+    """Drop the availability blocks built with the old block size
+
+    The blocks are rebuilt on demand (Raffle.ensure_number_index) with the new
+    RaffleNumberBlock.BLOCK_SIZE the next time a raffle allocates numbers.
+    """
+    RaffleNumberBlock = apps.get_model('raffles', 'RaffleNumberBlock')
+    RaffleNumberBlock.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0023_rafflenumberblock'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_number_blocks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0024_reset_number_blocks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='sparse_numbers',
+            field=models.BooleanField(default=False, help_text='Só guarda registros dos números reservados/vendidos; a disponibilidade vem do índice. Recomendado para rifas muito grandes.', verbose_name='Armazenamento Esparso'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    """Compute the initial sold/reserved counters from the existing numbers"""
+    Raffle = apps.get_model('raffles', 'Raffle')
+    RaffleNumber = apps.get_model('raffles', 'RaffleNumber')
+
+    counts = (
+        RaffleNumber.objects.filter(status__in=['vendido', 'reserved'])
+        .order_by()
+        .values_list('raffle_id', 'status')
+        .annotate(total=Count('id'))
+    )
+
+    by_raffle = {}
+    for raffle_id, status, total in counts:
+        by_raffle.setdefault(raffle_id, {})[status] = total
+
+    for raffle_id, totals in by_raffle.items():
+        Raffle.objects.filter(pk=raffle_id).update(
+            sold_count=totals.get('vendido', 0),
+            reserved_count=totals.get('reserved', 0)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0025_raffle_sparse_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='sold_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Numeros Vendidos'),
+        ),
+        migrations.AddField(
+            model_name='raffle',
+            name='reserved_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Numeros Reservados'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
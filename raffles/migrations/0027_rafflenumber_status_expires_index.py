@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0026_raffle_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rafflenumber',
+            index=models.Index(fields=['status', 'reserved_expires_at'], name='raffles_num_status_exp_idx'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0027_rafflenumber_status_expires_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='raffleorder',
+            index=models.Index(fields=['status', 'created_at'], name='raffles_order_status_crt_idx'),
+        ),
+    ]
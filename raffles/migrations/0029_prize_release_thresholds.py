@@ -0,0 +1,42 @@
+import math
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_thresholds(apps, schema_editor):
+    """Convert release_percentage_min into absolute sold-count thresholds"""
+    Raffle = apps.get_model('raffles', 'Raffle')
+    PrizeNumber = apps.get_model('raffles', 'PrizeNumber')
+
+    for raffle in Raffle.objects.all():
+        prizes = list(PrizeNumber.objects.filter(raffle=raffle))
+        for prize in prizes:
+            prize.release_threshold = math.ceil(
+                raffle.total_numbers * Decimal(str(prize.release_percentage_min)) / 100
+            )
+        PrizeNumber.objects.bulk_update(prizes, ['release_threshold'])
+
+        pending = [prize.release_threshold for prize in prizes if not prize.is_released]
+        Raffle.objects.filter(pk=raffle.pk).update(next_prize_threshold=min(pending) if pending else None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0028_raffleorder_status_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prizenumber',
+            name='release_threshold',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Vendas para Liberar'),
+        ),
+        migrations.AddField(
+            model_name='raffle',
+            name='next_prize_threshold',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Próxima Liberação de Premiado'),
+        ),
+        migrations.RunPython(fill_thresholds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0029_prize_release_thresholds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='grid_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versão do Grid'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0030_raffle_grid_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GridChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(verbose_name='Versão')),
+                ('status', models.CharField(choices=[('available', 'Disponivel'), ('reserved', 'Reservado'), ('vendido', 'Vendido')], max_length=20, verbose_name='Status')),
+                ('numbers', models.JSONField(default=list, verbose_name='Números')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grid_changes', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Mudança no Grid',
+                'verbose_name_plural': 'Mudanças no Grid',
+                'ordering': ['raffle', 'version'],
+                'indexes': [models.Index(fields=['raffle', 'version'], name='raffles_gridchange_ver_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0031_gridchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignStats',
+            fields=[
+                ('raffle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='raffles.raffle')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Arrecadado')),
+                ('paid_orders', models.PositiveIntegerField(default=0, verbose_name='Pedidos Pagos')),
+                ('unique_buyers', models.PositiveIntegerField(default=0, verbose_name='Compradores')),
+                ('prize_numbers', models.PositiveIntegerField(default=0, verbose_name='Números Premiados')),
+                ('prizes_won', models.PositiveIntegerField(default=0, verbose_name='Prêmios Ganhos')),
+                ('referrals_redeemed', models.PositiveIntegerField(default=0, verbose_name='Indicações')),
+                ('referral_bonus_numbers', models.PositiveIntegerField(default=0, verbose_name='Números Bônus de Indicação')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Estatísticas da Campanha',
+                'verbose_name_plural': 'Estatísticas das Campanhas',
+            },
+        ),
+    ]
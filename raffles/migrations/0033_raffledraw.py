@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('raffles', '0032_campaignstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rafflenumber',
+            index=models.Index(fields=['raffle', 'status', 'number'], name='raffles_num_status_num_idx'),
+        ),
+        migrations.CreateModel(
+            name='RaffleDraw',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('committed', 'Compromisso publicado'), ('revealed', 'Sorteado')], default='committed', max_length=20, verbose_name='Status')),
+                ('seed_hash', models.CharField(max_length=64, verbose_name='Hash da Semente (SHA-256)')),
+                ('seed', models.CharField(max_length=64, verbose_name='Semente')),
+                ('eligible_count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Números Concorrendo')),
+                ('ordinal', models.PositiveIntegerField(blank=True, null=True, verbose_name='Posição Sorteada')),
+                ('winner_number', models.PositiveIntegerField(blank=True, null=True, verbose_name='Número Sorteado')),
+                ('committed_at', models.DateTimeField(auto_now_add=True, verbose_name='Compromisso em')),
+                ('revealed_at', models.DateTimeField(blank=True, null=True, verbose_name='Sorteado em')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='draws', to='raffles.raffle')),
+                ('winner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='draws_won', to=settings.AUTH_USER_MODEL, verbose_name='Ganhador')),
+            ],
+            options={
+                'verbose_name': 'Sorteio',
+                'verbose_name_plural': 'Sorteios',
+                'ordering': ['-committed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_data_uri(data_uri):
+    # Cópia de raffles.images.hash_data_uri (migrações não devem importar o código do app)
+    if not data_uri:
+        return ''
+    return hashlib.sha256(data_uri.encode('utf-8')).hexdigest()[:16]
+
+
+def fill_image_hashes(apps, schema_editor):
+    """Compute the hashes of the images that already exist"""
+    Raffle = apps.get_model('raffles', 'Raffle')
+    SiteConfiguration = apps.get_model('raffles', 'SiteConfiguration')
+
+    # Uma imagem por vez para não carregar todas na memória
+    raffle_ids = Raffle.objects.exclude(prize_image_base64='').values_list('id', flat=True)
+    for raffle_id in list(raffle_ids):
+        image = Raffle.objects.filter(id=raffle_id).values_list('prize_image_base64', flat=True).first()
+        Raffle.objects.filter(id=raffle_id).update(prize_image_hash=hash_data_uri(image))
+
+    for config in SiteConfiguration.objects.exclude(logo_base64=''):
+        SiteConfiguration.objects.filter(pk=config.pk).update(logo_hash=hash_data_uri(config.logo_base64))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0033_raffledraw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='prize_image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Hash da Imagem'),
+        ),
+        migrations.AddField(
+            model_name='siteconfiguration',
+            name='logo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Hash da Logo'),
+        ),
+        migrations.RunPython(fill_image_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0034_image_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=16, unique=True, verbose_name='Hash')),
+                ('content_type', models.CharField(max_length=100, verbose_name='Tipo')),
+                ('data', models.BinaryField(verbose_name='Conteúdo')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Tamanho (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Imagem',
+                'verbose_name_plural': 'Imagens',
+            },
+        ),
+        migrations.AddField(
+            model_name='raffle',
+            name='prize_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='raffles', to='raffles.imageasset', verbose_name='Imagem do Premio'),
+        ),
+        migrations.AddField(
+            model_name='siteconfiguration',
+            name='logo',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='site_configurations', to='raffles.imageasset', verbose_name='Logo do Site'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import hashlib
+from urllib.parse import unquote_to_bytes
+
+from django.db import migrations, transaction
+
+# Imagens por lote: cada lote é uma transação curta, sem carregar tudo na memória
+BATCH_SIZE = 20
+
+
+def decode_data_uri(data_uri):
+    # Cópia de raffles.images.decode_data_uri (migrações não devem importar o código do app)
+    header, separator, payload = data_uri.partition(',')
+    if not separator or not header.startswith('data:'):
+        return None
+    params = header[len('data:'):].split(';')
+    content_type = params[0].strip() or 'application/octet-stream'
+    if 'base64' in params[1:]:
+        try:
+            data = base64.b64decode(payload)
+        except (binascii.Error, ValueError):
+            return None
+    else:
+        data = unquote_to_bytes(payload)
+    return content_type, data
+
+
+def store_asset(ImageAsset, data_uri):
+    image = decode_data_uri(data_uri)
+    if image is None:
+        return None
+    content_type, data = image
+    asset, created = ImageAsset.objects.get_or_create(
+        hash=hashlib.sha256(data).hexdigest()[:16],
+        defaults={'content_type': content_type, 'data': data, 'size': len(data)}
+    )
+    return asset
+
+
+def move_in_batches(model, source_field, asset_field, hash_field, ImageAsset, using):
+    last_id = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                model.objects.using(using)
+                .filter(pk__gt=last_id)
+                .exclude(**{source_field: ''})
+                .order_by('pk')
+                .values_list('pk', source_field)[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            for pk, data_uri in batch:
+                asset = store_asset(ImageAsset, data_uri)
+                model.objects.using(using).filter(pk=pk).update(**{
+                    asset_field: asset,
+                    hash_field: asset.hash if asset else '',
+                })
+        last_id = batch[-1][0]
+
+
+def move_images_to_assets(apps, schema_editor):
+    """Copy the Base64 images into ImageAsset, in short batches"""
+    ImageAsset = apps.get_model('raffles', 'ImageAsset')
+    using = schema_editor.connection.alias
+    move_in_batches(
+        apps.get_model('raffles', 'Raffle'), 'prize_image_base64', 'prize_image', 'prize_image_hash',
+        ImageAsset, using
+    )
+    move_in_batches(
+        apps.get_model('raffles', 'SiteConfiguration'), 'logo_base64', 'logo', 'logo_hash',
+        ImageAsset, using
+    )
+
+
+def restore_in_batches(model, target_field, asset_field, using):
+    last_id = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                model.objects.using(using)
+                .filter(pk__gt=last_id, **{f'{asset_field}__isnull': False})
+                .order_by('pk')
+                .values_list('pk', f'{asset_field}__content_type', f'{asset_field}__data')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            for pk, content_type, data in batch:
+                encoded = base64.b64encode(bytes(data)).decode('ascii')
+                model.objects.using(using).filter(pk=pk).update(**{
+                    target_field: f'data:{content_type};base64,{encoded}',
+                })
+        last_id = batch[-1][0]
+
+
+def restore_base64_images(apps, schema_editor):
+    """Write the images back into the Base64 fields"""
+    using = schema_editor.connection.alias
+    restore_in_batches(apps.get_model('raffles', 'Raffle'), 'prize_image_base64', 'prize_image', using)
+    restore_in_batches(apps.get_model('raffles', 'SiteConfiguration'), 'logo_base64', 'logo', using)
+
+
+class Migration(migrations.Migration):
+
+    # Cada lote faz commit próprio
+    atomic = False
+
+    dependencies = [
+        ('raffles', '0035_imageasset'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_images_to_assets, restore_base64_images),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0036_move_images_to_assets'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='raffle',
+            name='prize_image_base64',
+        ),
+        migrations.RemoveField(
+            model_name='siteconfiguration',
+            name='logo_base64',
+        ),
+    ]
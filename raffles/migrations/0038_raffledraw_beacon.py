@@ -0,0 +1,64 @@
+from django.db import migrations, models
+
+
+def void_open_commitments(apps, schema_editor):
+    """Open commitments of the old scheme have their seed stored in the database"""
+    RaffleDraw = apps.get_model('raffles', 'RaffleDraw')
+    RaffleDraw.objects.filter(status='committed').update(
+        status='void',
+        void_reason='Compromisso com semente guardada no servidor, substituído pelo beacon público.'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0037_remove_base64_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='raffledraw',
+            name='status',
+            field=models.CharField(choices=[('committed', 'Compromisso publicado'), ('revealed', 'Sorteado'), ('void', 'Anulado')], default='committed', max_length=20, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='raffledraw',
+            name='void_reason',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Motivo da Anulação'),
+        ),
+        migrations.RunPython(void_open_commitments, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='raffledraw',
+            name='seed_hash',
+        ),
+        migrations.RenameField(
+            model_name='raffledraw',
+            old_name='seed',
+            new_name='randomness',
+        ),
+        migrations.AlterField(
+            model_name='raffledraw',
+            name='randomness',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Aleatoriedade'),
+        ),
+        migrations.AddField(
+            model_name='raffledraw',
+            name='beacon_round',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Rodada do Beacon'),
+        ),
+        migrations.AddField(
+            model_name='raffledraw',
+            name='sold_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Hash dos Números Vendidos (SHA-256)'),
+        ),
+        migrations.AddField(
+            model_name='raffledraw',
+            name='signature',
+            field=models.TextField(blank=True, verbose_name='Assinatura do Beacon'),
+        ),
+        migrations.AddConstraint(
+            model_name='raffledraw',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'committed')), fields=('raffle',), name='raffles_draw_one_open_uniq'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+SHARDS = 16
+
+
+def create_shards(apps, schema_editor):
+    Raffle = apps.get_model('raffles', 'Raffle')
+    RaffleCounterShard = apps.get_model('raffles', 'RaffleCounterShard')
+    for raffle_id in Raffle.objects.values_list('id', flat=True).iterator():
+        RaffleCounterShard.objects.bulk_create([
+            RaffleCounterShard(raffle_id=raffle_id, shard=shard) for shard in range(SHARDS)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0038_raffledraw_beacon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaffleCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Fatia')),
+                ('sold', models.IntegerField(default=0, verbose_name='Vendidos')),
+                ('reserved', models.IntegerField(default=0, verbose_name='Reservados')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Arrecadado')),
+                ('paid_orders', models.IntegerField(default=0, verbose_name='Pedidos Pagos')),
+                ('unique_buyers', models.IntegerField(default=0, verbose_name='Compradores')),
+                ('referrals_redeemed', models.IntegerField(default=0, verbose_name='Indicações')),
+                ('referral_bonus_numbers', models.IntegerField(default=0, verbose_name='Números Bônus de Indicação')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='raffles.raffle')),
+            ],
+            options={
+                'verbose_name': 'Fatia dos Contadores',
+                'verbose_name_plural': 'Fatias dos Contadores',
+                'constraints': [models.UniqueConstraint(fields=('raffle', 'shard'), name='raffles_countershard_uniq')],
+            },
+        ),
+        migrations.RunPython(create_shards, migrations.RunPython.noop),
+    ]
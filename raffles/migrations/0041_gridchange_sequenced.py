@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0040_rafflecountershard'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='gridchange',
+            options={'ordering': ['raffle', 'version', 'id'], 'verbose_name': 'Mudança no Grid', 'verbose_name_plural': 'Mudanças no Grid'},
+        ),
+        migrations.AlterField(
+            model_name='gridchange',
+            name='version',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Versão'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffles', '0041_gridchange_sequenced'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffledraw',
+            name='sold_counts',
+            field=models.JSONField(blank=True, default=list, verbose_name='Vendidos por Faixa'),
+        ),
+        migrations.AddField(
+            model_name='raffledraw',
+            name='grid_version',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Versão do Grid no Compromisso'),
+        ),
+    ]
@@ -1,11 +1,29 @@
+import bisect
+import copy
+import hashlib
+import itertools
+import logging
+import math
 import random
 import string
-from django.db import models, transaction
+import threading
+from collections import defaultdict
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
 from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from accounts.models import User
+from .images import hash_bytes, decode_data_uri
+from . import beacon
+from .bitmap import (
+    empty_bitmap, count_bits, set_bits, clear_bits, is_set, set_range, select_set_bits
+)
+
+logger = logging.getLogger(__name__)
 
 
 def generate_referral_code():
@@ -13,18 +31,71 @@ def generate_referral_code():
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
 
 
+class ImageAsset(models.Model):
+    """Image bytes stored apart from the models that display them
+
+    Raffle and SiteConfiguration keep only a reference and the content hash,
+    so listing or joining them never pulls the image over the wire.
+    Identical images share the same row.
+    """
+
+    hash = models.CharField('Hash', max_length=16, unique=True)
+    content_type = models.CharField('Tipo', max_length=100)
+    data = models.BinaryField('Conteúdo')
+    size = models.PositiveIntegerField('Tamanho (bytes)', default=0)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Imagem'
+        verbose_name_plural = 'Imagens'
+
+    def __str__(self):
+        return f"{self.hash} ({self.content_type}, {self.size} bytes)"
+
+    @classmethod
+    def store(cls, data, content_type):
+        """Return the asset with these bytes, creating it if needed"""
+        data = bytes(data)
+        asset, created = cls.objects.get_or_create(
+            hash=hash_bytes(data),
+            defaults={'content_type': content_type, 'data': data, 'size': len(data)}
+        )
+        return asset
+
+    @classmethod
+    def from_data_uri(cls, data_uri):
+        """Store an image sent as data:image/...;base64,..."""
+        image = decode_data_uri(data_uri)
+        if image is None:
+            raise ValidationError('Imagem inválida. Envie um data URI (data:image/...;base64,...).')
+        content_type, data = image
+        return cls.store(data, content_type)
+
+    @classmethod
+    def delete_if_unused(cls, asset_id):
+        """Delete the asset when no raffle nor the site configuration points to it"""
+        if asset_id is None:
+            return
+        cls.objects.filter(id=asset_id, raffles__isnull=True, site_configurations__isnull=True).delete()
+
+
 class SiteConfiguration(models.Model):
     """
     Singleton model to store site-wide configuration.
     Only one instance should exist.
     """
 
-    # Logo settings (Base64 - same pattern as Raffle.prize_image_base64)
-    logo_base64 = models.TextField(
-        'Logo do Site (Base64)',
+    # Logo settings (a imagem fica em ImageAsset; aqui só a referência e o hash)
+    logo = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.PROTECT,
+        null=True,
         blank=True,
-        help_text='Logo em formato Base64. Cole o código data:image/... completo aqui.'
+        editable=False,
+        related_name='site_configurations',
+        verbose_name='Logo do Site'
     )
+    logo_hash = models.CharField('Hash da Logo', max_length=16, blank=True, editable=False)
 
     # Site metadata
     site_name = models.CharField(
@@ -67,6 +138,16 @@ class SiteConfiguration(models.Model):
     def __str__(self):
         return f"Configurações do Site - {self.site_name}"
 
+    # Logo padrão (o mesmo que existia nos templates)
+    DEFAULT_LOGO_BASE64 = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIwIiBoZWlnaHQ9IjEyMCIgdmlld0JveD0iMCAwIDEyMCAxMjAiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PGNpcmNsZSBjeD0iNjAiIGN5PSI2MCIgcj0iNjAiIGZpbGw9IiMzMzUyNjgiLz48cGF0aCBkPSJNMzUgNDVDMzUgNDMgNDAgNDAgNDUgNDBDNTAgNDAgNTUgNDMgNTUgNDVMNjAgODBINTVMNDUgNTBMMzUgNTBMMzUgNDVaIiBmaWxsPSIjRkJCRjI0Ii8+PHBhdGggZD0iTTc1IDQ1Qzc1IDQzIDgwIDQwIDg1IDQwQzkwIDQwIDk1IDQzIDk1IDQ1TDkwIDgwSDg1TDc1IDUwTDc1IDQ1WiIgZmlsbD0iI0ZCQkYyNCIvPjxwYXRoIGQ9Ik00MCA3MEM0MCA2OCA0NSA2NSA1MCA2NUM1NSA2NSA2MCA2OCA2MCA3MEw1NSA5NUg1MEw0MCA3NUw0MCA3MFoiIGZpbGw9IiNGQkJGMjQiLz48cGF0aCBkPSJNNDUgMzVMNzUgMzVMNjAgNjBMNDUgMzVaIiBmaWxsPSIjQ0NENkUwIi8+PHBhdGggZD0iTTUwIDY1TDcwIDY1TDYwIDg1TDUwIDY1WiIgZmlsbD0iI0NDRDZFMCI+PGFuaW1hdGVUcmFuc2Zvcm0gYXR0cmlidXRlTmFtZT0idHJhbnNmb3JtIiB0eXBlPSJzY2FsZSIgZnJvbT0iMSIgdG89IjEuMSIgZHVyPSIwLjVzIiByZXBlYXRDb3VudD0iaW5maW5pdGUiLz48L3BhdGg+PC9zdmc+'
+
+    # Cache da configuração: uma cópia por processo e uma compartilhada (cache do Django),
+    # ambas marcadas com a versão atual. A versão muda a cada save/delete.
+    CACHE_VERSION_KEY = 'site-config:version'
+    CACHE_KEY = 'site-config:{version}'
+    CACHE_SECONDS = 60
+    _cached = None
+
     def save(self, *args, **kwargs):
         """Override save to ensure only one instance exists"""
         # Ensure singleton
@@ -75,22 +156,95 @@ class SiteConfiguration(models.Model):
 
         super().save(*args, **kwargs)
 
+        # Só publica a nova versão depois do commit, para ninguém cachear dados antigos
+        version = self.cache_version
+        transaction.on_commit(lambda: SiteConfiguration.bump_cache_version(version))
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: SiteConfiguration.bump_cache_version(None))
+        return result
+
+    @property
+    def cache_version(self):
+        """Version of this row, changes on every save (updated_at is auto_now)"""
+        return f"{self.pk}:{self.updated_at.isoformat()}"
+
+    @staticmethod
+    def split_contacts(value):
+        """Split a one-contact-per-line field, dropping empty lines"""
+        if not value:
+            return []
+        contacts = [contact.strip() for contact in value.split('\n')]
+        return [contact for contact in contacts if contact]
+
     @classmethod
-    def get_config(cls):
-        """Get or create the site configuration singleton"""
+    def bump_cache_version(cls, version):
+        """Publish a new version, making every process drop its cached copy"""
+        from django.core.cache import cache
+
+        cls._cached = None
+        if version is None:
+            cache.delete(cls.CACHE_VERSION_KEY)
+        else:
+            cache.set(cls.CACHE_VERSION_KEY, version, cls.CACHE_SECONDS)
+
+    @classmethod
+    def _load(cls):
+        """Read the singleton from the database and parse the contact lists"""
         config, created = cls.objects.get_or_create(pk=1)
+        config.admin_contact_list = cls.split_contacts(config.admin_phones)
+        config.group_contact_list = cls.split_contacts(config.group_phones)
         return config
 
     @classmethod
-    def get_logo_base64(cls):
-        """Get logo as base64 string, or return default SVG logo"""
-        config = cls.get_config()
+    def get_config(cls):
+        """Get the site configuration singleton (cached)
+
+        The copy kept in this process is reused while the shared version key
+        does not change, so rendering a page costs one cache lookup and no
+        queries. On a miss the parsed configuration is loaded from the shared
+        cache, or from the database as a last resort. Without a shared cache
+        (no CACHE_URL) the other workers see changes after CACHE_SECONDS.
+
+        A copy is returned so callers can edit and save it, or follow
+        home_redirect_raffle, without touching the cached instance.
+        """
+        from django.core.cache import cache
+
+        version = cache.get(cls.CACHE_VERSION_KEY)
+        cached = cls._cached
+        if cached is not None and version is not None and cached[0] == version:
+            return copy.copy(cached[1])
 
-        if config.logo_base64:
-            return config.logo_base64
+        config = None
+        if version is not None:
+            config = cache.get(cls.CACHE_KEY.format(version=version))
 
-        # Default logo (the existing one from templates)
-        return 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIwIiBoZWlnaHQ9IjEyMCIgdmlld0JveD0iMCAwIDEyMCAxMjAiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PGNpcmNsZSBjeD0iNjAiIGN5PSI2MCIgcj0iNjAiIGZpbGw9IiMzMzUyNjgiLz48cGF0aCBkPSJNMzUgNDVDMzUgNDMgNDAgNDAgNDUgNDBDNTAgNDAgNTUgNDMgNTUgNDVMNjAgODBINTVMNDUgNTBMMzUgNTBMMzUgNDVaIiBmaWxsPSIjRkJCRjI0Ii8+PHBhdGggZD0iTTc1IDQ1Qzc1IDQzIDgwIDQwIDg1IDQwQzkwIDQwIDk1IDQzIDk1IDQ1TDkwIDgwSDg1TDc1IDUwTDc1IDQ1WiIgZmlsbD0iI0ZCQkYyNCIvPjxwYXRoIGQ9Ik00MCA3MEM0MCA2OCA0NSA2NSA1MCA2NUM1NSA2NSA2MCA2OCA2MCA3MEw1NSA5NUg1MEw0MCA3NUw0MCA3MFoiIGZpbGw9IiNGQkJGMjQiLz48cGF0aCBkPSJNNDUgMzVMNzUgMzVMNjAgNjBMNDUgMzVaIiBmaWxsPSIjQ0NENkUwIi8+PHBhdGggZD0iTTUwIDY1TDcwIDY1TDYwIDg1TDUwIDY1WiIgZmlsbD0iI0NDRDZFMCI+PGFuaW1hdGVUcmFuc2Zvcm0gYXR0cmlidXRlTmFtZT0idHJhbnNmb3JtIiB0eXBlPSJzY2FsZSIgZnJvbT0iMSIgdG89IjEuMSIgZHVyPSIwLjVzIiByZXBlYXRDb3VudD0iaW5maW5pdGUiLz48L3BhdGg+PC9zdmc+'
+        if config is None:
+            config = cls._load()
+            loaded_version = config.cache_version
+            cache.set(cls.CACHE_KEY.format(version=loaded_version), config, cls.CACHE_SECONDS)
+            # add() não sobrescreve uma versão mais nova publicada por um save concorrente
+            if version is None:
+                cache.add(cls.CACHE_VERSION_KEY, loaded_version, cls.CACHE_SECONDS)
+            version = loaded_version
+
+        cls._cached = (version, config)
+        return copy.copy(config)
+
+    @property
+    def logo_url(self):
+        """URL of the logo image (content-hashed), or the default logo"""
+        if not self.logo_hash:
+            return self.DEFAULT_LOGO_BASE64
+        from django.urls import reverse
+        return reverse('site_logo', kwargs={'image_hash': self.logo_hash})
+
+    def set_logo(self, asset):
+        """Point the logo at the asset (None removes it)"""
+        self.logo = asset
+        self.logo_hash = asset.hash if asset else ''
 
     @classmethod
     def get_admin_phones(cls):
@@ -100,12 +254,7 @@ class SiteConfiguration(models.Model):
         Can include both individual numbers (e.g., 5511999999999) and admin groups (e.g., 120363xxx@g.us).
         These will receive the admin notification with full details.
         """
-        config = cls.get_config()
-        if not config.admin_phones:
-            return []
-        # Split by newlines and filter empty lines
-        contacts = [contact.strip() for contact in config.admin_phones.split('\n')]
-        return [contact for contact in contacts if contact]
+        return list(cls.get_config().admin_contact_list)
 
     @classmethod
     def get_group_phones(cls):
@@ -114,12 +263,7 @@ class SiteConfiguration(models.Model):
         Returns contacts from the 'WhatsApp dos Grupos' field.
         These are public groups that will receive the group notification (without admin details).
         """
-        config = cls.get_config()
-        if not config.group_phones:
-            return []
-        # Split by newlines and filter empty lines
-        groups = [group.strip() for group in config.group_phones.split('\n')]
-        return [group for group in groups if group]
+        return list(cls.get_config().group_contact_list)
 
 
 class Raffle(models.Model):
@@ -131,14 +275,35 @@ class Raffle(models.Model):
         FINISHED = 'finished', 'Finalizada'
         CANCELLED = 'cancelled', 'Cancelada'
 
+    # Tentativas de sortear novamente números que outro comprador pegou ao mesmo tempo
+    CLAIM_ATTEMPTS = 3
+
+    # Campos mantidos pelo próprio modelo (update_counters / refresh_next_prize_threshold),
+    # nunca gravados por um save() comum
+    DERIVED_FIELDS = ('sold_count', 'reserved_count', 'next_prize_threshold', 'grid_version')
+
     name = models.CharField('Nome', max_length=200)
     slug = models.SlugField('Slug', max_length=250, unique=True, blank=True)
     description = models.TextField('Descricao', blank=True)
     prize_name = models.CharField('Nome do Premio', max_length=200)
     prize_description = models.TextField('Descricao do Premio', blank=True)
-    prize_image_base64 = models.TextField('Imagem do Premio (Base64)', blank=True)
+    prize_image = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='raffles',
+        verbose_name='Imagem do Premio'
+    )
+    prize_image_hash = models.CharField('Hash da Imagem', max_length=16, blank=True, editable=False)
 
     total_numbers = models.PositiveIntegerField('Total de Numeros')
+    sparse_numbers = models.BooleanField(
+        'Armazenamento Esparso',
+        default=False,
+        help_text='Só guarda registros dos números reservados/vendidos; a disponibilidade vem do índice. Recomendado para rifas muito grandes.'
+    )
     price_per_number = models.DecimalField('Preco por Numero', max_digits=10, decimal_places=2)
     
     # Fee/Tax settings
@@ -187,6 +352,18 @@ class Raffle(models.Model):
     # Admin WhatsApp for this raffle
     admin_whatsapp = models.CharField('WhatsApp de Suporte', max_length=20, blank=True, help_text='Número de WhatsApp para suporte (ex: 5511999999999). Se vazio, usará o padrão da configuração.')
 
+    # Contadores até a última recontagem; as mudanças de status desde então
+    # ficam nas fatias (RaffleCounterShard) e são somadas na leitura
+    sold_count = models.PositiveIntegerField('Numeros Vendidos', default=0, editable=False)
+    reserved_count = models.PositiveIntegerField('Numeros Reservados', default=0, editable=False)
+
+    # Última versão do grid público, avançada por GridChange.sequence depois de cada
+    # transição (ETag do grid e cursor do feed de mudanças)
+    grid_version = models.PositiveBigIntegerField('Versão do Grid', default=0, editable=False)
+
+    # Menor quantidade vendida que libera um número premiado (None = nenhum pendente)
+    next_prize_threshold = models.PositiveIntegerField('Próxima Liberação de Premiado', null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
     updated_at = models.DateTimeField('Atualizado em', auto_now=True)
 
@@ -208,30 +385,150 @@ class Raffle(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+
+        # Não sobrescrever os campos derivados com valores antigos carregados em memória
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
+        if adding:
+            CampaignStats.objects.create(raffle=self)
+            RaffleCounterShard.create_shards(self.pk)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.forget_counter_totals()
+        super().refresh_from_db(*args, **kwargs)
+
+    def forget_counter_totals(self):
+        """Drop the loaded shard deltas (after a recount zeroed the shards)"""
+        self.__dict__.pop('counter_totals', None)
+        getattr(self, '_prefetched_objects_cache', {}).pop('counter_shards', None)
+
     def get_public_url(self):
         """Get public URL for this raffle"""
         from django.urls import reverse
         return reverse('raffle_public', kwargs={'slug': self.slug})
 
+    def set_prize_image(self, asset):
+        """Point the prize image at the asset (None removes it)"""
+        self.prize_image = asset
+        self.prize_image_hash = asset.hash if asset else ''
+
+    @property
+    def prize_image_url(self):
+        """URL of the prize image (content-hashed), or '' when there is none"""
+        if not self.prize_image_hash:
+            return ''
+        from django.urls import reverse
+        return reverse('raffle_image', kwargs={'pk': self.pk, 'image_hash': self.prize_image_hash})
+
+    @cached_property
+    def counter_totals(self):
+        """Deltas of the counter shards since the last recount
+
+        Summed from the prefetched shards when the queryset used
+        prefetch_related('counter_shards') (lists), otherwise one query.
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('counter_shards')
+        if prefetched is not None:
+            return RaffleCounterShard.sum_shards(prefetched)
+        return RaffleCounterShard.totals(self.pk)
+
+    @classmethod
+    def prefetch_counter_totals(cls, raffles):
+        """Load counter_totals of every raffle in a list with one grouped query"""
+        totals = RaffleCounterShard.totals_by_raffle([raffle.pk for raffle in raffles])
+        for raffle in raffles:
+            raffle.counter_totals = totals[raffle.pk]
+
     @property
     def numbers_sold(self):
         """Count sold numbers"""
-        return self.numbers.filter(status=RaffleNumber.Status.SOLD).count()
+        return self.sold_count + self.counter_totals['sold']
 
     @property
     def numbers_reserved(self):
         """Count reserved numbers"""
-        return self.numbers.filter(status=RaffleNumber.Status.RESERVED).count()
+        return self.reserved_count + self.counter_totals['reserved']
 
     @property
     def numbers_available(self):
         """Count available numbers"""
         return self.total_numbers - self.numbers_sold - self.numbers_reserved
 
+    @classmethod
+    def update_counters(cls, raffle, sold=0, reserved=0, changes=None):
+        """Apply a number status transition to the sold/reserved counters
+
+        Must run in the same transaction that changed the RaffleNumber rows.
+        The deltas go to a counter shard, not to the raffle row, so concurrent
+        buyers do not wait on each other. `raffle` may be an instance or a
+        primary key.
+
+        `changes` maps the new status to the numbers that moved to it, and is
+        recorded in the grid change feed (GridChange).
+        """
+        RaffleCounterShard.add(getattr(raffle, 'pk', raffle), sold=sold, reserved=reserved)
+        if changes:
+            GridChange.record(getattr(raffle, 'pk', raffle), changes)
+
+        if isinstance(raffle, cls) and 'counter_totals' in raffle.__dict__:
+            raffle.counter_totals['sold'] += sold
+            raffle.counter_totals['reserved'] += reserved
+
+    @transaction.atomic
+    def recalculate_counters(self):
+        """Recompute the sold/reserved counters from the RaffleNumber rows"""
+        # Travar as fatias: transições em andamento aplicam seus deltas depois da recontagem
+        shards = RaffleCounterShard.lock(self.pk)
+
+        counts = dict(
+            self.numbers.order_by().values_list('status').annotate(total=Count('id'))
+        )
+        self.sold_count = counts.get(RaffleNumber.Status.SOLD, 0)
+        self.reserved_count = counts.get(RaffleNumber.Status.RESERVED, 0)
+        Raffle.objects.filter(pk=self.pk).update(
+            sold_count=self.sold_count,
+            reserved_count=self.reserved_count
+        )
+        shards.update(sold=0, reserved=0)
+        self.forget_counter_totals()
+
+    def build_number_grid(self):
+        """Return the status of every number packed in 2 bits (4 numbers per byte)
+
+        Number n lives in byte (n - 1) // 4, at bit 2 * ((n - 1) % 4):
+        0 = available, 1 = reserved, 2 = sold. Only taken numbers are read,
+        so sparse and dense raffles give the same grid.
+        """
+        grid = bytearray((self.total_numbers + 3) // 4)
+        codes = {RaffleNumber.Status.RESERVED: 1, RaffleNumber.Status.SOLD: 2}
+
+        taken = (
+            self.numbers.exclude(status=RaffleNumber.Status.AVAILABLE)
+            .order_by()
+            .values_list('number', 'status')
+        )
+        for number, status in taken.iterator(chunk_size=10000):
+            position = number - 1
+            grid[position >> 2] |= codes[status] << ((position & 3) << 1)
+
+        return bytes(grid)
+
     def initialize_numbers(self):
-        """Create all numbers for this raffle"""
+        """Create all numbers for this raffle
+
+        Sparse raffles don't get one row per number: only the availability
+        index is built, and rows are created as numbers get reserved.
+        """
+        if self.sparse_numbers:
+            self.ensure_number_index()
+            return
+
         if self.numbers.exists():
             return
 
@@ -240,90 +537,245 @@ class Raffle(models.Model):
             for i in range(1, self.total_numbers + 1)
         ]
         RaffleNumber.objects.bulk_create(numbers)
+        self.build_number_index()
+
+    @transaction.atomic
+    def build_number_index(self):
+        """(Re)build the availability bitmap from the RaffleNumber rows
+
+        Numbers that are not AVAILABLE and prize numbers that were not released
+        yet are left out of the index, so they are never picked by allocation.
+        """
+        self.number_blocks.all().delete()
+
+        unavailable = set(
+            self.numbers.exclude(status=RaffleNumber.Status.AVAILABLE).values_list('number', flat=True)
+        )
+        unavailable.update(
+            self.prize_numbers.filter(is_released=False).values_list('number', flat=True)
+        )
+
+        RaffleNumberBlock.build(self, self.total_numbers, unavailable)
+
+    def ensure_number_index(self):
+        """Build the availability bitmap for raffles created before it existed"""
+        if self.number_blocks.exists():
+            return
+
+        # Serializar construções concorrentes do índice para a mesma rifa
+        with transaction.atomic():
+            Raffle.objects.select_for_update().filter(pk=self.pk).first()
+            if not self.number_blocks.exists():
+                self.build_number_index()
+
+    def claim_numbers(self, quantity, forced=()):
+        """Take `quantity` numbers out of the index and lock their rows
+
+        Numbers in `forced` that are still free are claimed first, the rest is
+        picked at random. The RaffleNumber rows of every returned number are
+        locked by the current transaction (FOR UPDATE SKIP LOCKED) and were
+        AVAILABLE when locked, so the caller can safely update them.
+
+        A candidate whose row is not available anymore (stale index) or is
+        being changed by another transaction is dropped and replaced by a new
+        pick. Dropped candidates that are still AVAILABLE (busy, not taken) go
+        back to the index, otherwise their bit would stay cleared for good.
+        """
+        claimed = []
+
+        if forced:
+            taken = RaffleNumberBlock.take_specific_numbers(self, forced)
+            locked = self._lock_available_rows(taken)
+            claimed.extend(number for number in forced if number in locked)
+            self._restore_busy_numbers(set(taken) - locked)
+
+        for attempt in range(self.CLAIM_ATTEMPTS):
+            missing = quantity - len(claimed)
+            if missing <= 0:
+                break
+
+            candidates = RaffleNumberBlock.take_random_numbers(self, missing)
+            locked = self._lock_available_rows(candidates)
+            claimed.extend(number for number in candidates if number in locked)
+
+            if len(locked) < len(candidates):
+                logger.debug('%d número(s) já ocupado(s), sorteando novamente', len(candidates) - len(locked))
+                self._restore_busy_numbers(set(candidates) - locked)
+
+        if len(claimed) < quantity:
+            raise ValidationError('Nao ha numeros suficientes disponiveis')
+
+        return claimed
+
+    def _restore_busy_numbers(self, dropped):
+        """Put back in the index the dropped candidates that are still AVAILABLE
+
+        Their rows were locked by another transaction. If it ends up taking
+        the number, the bit is stale and the next claim drops it for good.
+        """
+        if not dropped:
+            return
+        still_available = list(
+            RaffleNumber.objects.filter(raffle=self, number__in=dropped, status=RaffleNumber.Status.AVAILABLE)
+            .values_list('number', flat=True)
+        )
+        RaffleNumberBlock.restore_numbers(self, still_available)
+
+    def refresh_number_index(self, numbers):
+        """Update only the bits of `numbers` (prize numbers added, removed or edited)
+
+        A number belongs in the index when its row is AVAILABLE (or missing,
+        in sparse raffles) and it is not a prize number still locked. The
+        blocks are locked before the rows are read, so purchases in progress
+        on those blocks commit first and their numbers are seen as taken.
+        """
+        numbers = {number for number in numbers if 1 <= number <= self.total_numbers}
+        if not numbers or not self.number_blocks.exists():
+            return
+
+        with transaction.atomic():
+            RaffleNumberBlock._locked_blocks(self, sorted({RaffleNumberBlock.locate(n)[0] for n in numbers}))
+
+            blocked = set(
+                self.prize_numbers.filter(is_released=False, number__in=numbers).values_list('number', flat=True)
+            )
+            blocked.update(
+                self.numbers.filter(number__in=numbers)
+                .exclude(status=RaffleNumber.Status.AVAILABLE)
+                .values_list('number', flat=True)
+            )
+            RaffleNumberBlock.take_specific_numbers(self, blocked)
+            RaffleNumberBlock.restore_numbers(self, numbers - blocked)
+
+    def _lock_available_rows(self, numbers):
+        """Lock the rows of `numbers` that are available, skipping busy rows"""
+        if not numbers:
+            return set()
+
+        if self.sparse_numbers:
+            # Números livres não têm linha: criar as dos candidatos (linhas que
+            # já existem, mesmo vendidas, ficam como estão e não são travadas abaixo)
+            RaffleNumber.objects.bulk_create(
+                [RaffleNumber(raffle=self, number=number) for number in numbers],
+                ignore_conflicts=True
+            )
+
+        return set(
+            RaffleNumber.objects.select_for_update(skip_locked=True)
+            .filter(raffle=self, number__in=numbers, status=RaffleNumber.Status.AVAILABLE)
+            .values_list('number', flat=True)
+        )
 
     def expand_numbers(self, new_total):
         """Expand raffle by adding more numbers"""
         if new_total <= self.total_numbers:
             raise ValidationError(f'Novo total ({new_total}) deve ser maior que o atual ({self.total_numbers})')
 
-        current_count = self.numbers.count()
+        if self.sparse_numbers:
+            # Números novos nascem disponíveis: só o índice precisa crescer
+            current_count = self.total_numbers
+        else:
+            current_count = self.numbers.count()
 
-        # Create new numbers from current_count + 1 to new_total
-        new_numbers = [
-            RaffleNumber(raffle=self, number=i)
-            for i in range(current_count + 1, new_total + 1)
-        ]
-        RaffleNumber.objects.bulk_create(new_numbers)
+            # Create new numbers from current_count + 1 to new_total
+            new_numbers = [
+                RaffleNumber(raffle=self, number=i)
+                for i in range(current_count + 1, new_total + 1)
+            ]
+            RaffleNumber.objects.bulk_create(new_numbers)
+
+        # Adicionar os novos números ao índice de disponibilidade
+        if self.number_blocks.exists():
+            blocked = self.prize_numbers.filter(
+                is_released=False,
+                number__gt=current_count
+            ).values_list('number', flat=True)
+            RaffleNumberBlock.add_range(self, current_count + 1, new_total + 1)
+            RaffleNumberBlock.take_specific_numbers(self, blocked)
 
         # Update total_numbers
         self.total_numbers = new_total
         self.save(update_fields=['total_numbers'])
 
+        # Os limites de liberação dos premiados são proporcionais ao total
+        self.recompute_prize_thresholds()
+
     def release_expired_reservations(self):
         """Release numbers from expired pending orders and reservations"""
-        from django.utils import timezone
+        return RaffleNumber.release_expired(raffle=self)
 
-        now = timezone.now()
+    def refresh_next_prize_threshold(self):
+        """Store the smallest release threshold among the unreleased prize numbers
 
-        # Liberar números com reserva expirada
-        expired_reservations = self.numbers.filter(
-            status=RaffleNumber.Status.RESERVED,
-            reserved_expires_at__isnull=False,
-            reserved_expires_at__lt=now
+        Runs after every change to the prize numbers, so it also refreshes the
+        prize totals of the campaign stats from the same aggregate.
+        """
+        prizes = self.prize_numbers.aggregate(
+            threshold=models.Min('release_threshold', filter=models.Q(is_released=False)),
+            total=Count('id'),
+            won=Count('id', filter=models.Q(is_won=True)),
         )
+        self.next_prize_threshold = prizes['threshold']
+        Raffle.objects.filter(pk=self.pk).update(next_prize_threshold=self.next_prize_threshold)
+        CampaignStats.set_prizes(self, prizes['total'], prizes['won'])
+
+    def recompute_prize_thresholds(self):
+        """Recompute the prize thresholds after total_numbers changed"""
+        prizes = list(self.prize_numbers.filter(is_released=False))
+        for prize in prizes:
+            prize.release_threshold = PrizeNumber.compute_threshold(self.total_numbers, prize.release_percentage_min)
+        PrizeNumber.objects.bulk_update(prizes, ['release_threshold'])
+        self.refresh_next_prize_threshold()
 
-        for raffle_num in expired_reservations:
-            raffle_num.status = RaffleNumber.Status.AVAILABLE
-            raffle_num.user = None
-            raffle_num.order = None
-            raffle_num.reserved_at = None
-            raffle_num.reserved_expires_at = None
-            raffle_num.save()
+    @transaction.atomic
+    def check_and_release_prize_numbers(self):
+        """Libera números premiados baseado na porcentagem de vendas atingida
 
-        # Legacy: também liberar orders pendentes expiradas
-        expiration_time = now - timedelta(minutes=15)
+        Each prize number stores its release point as an absolute sold count
+        (release_threshold) and the raffle stores the smallest pending one
+        (next_prize_threshold), so while no threshold is crossed this is a
+        single comparison with the sold counter and no queries.
 
-        expired_orders = self.orders.filter(
-            status=RaffleOrder.Status.PENDING,
-            created_at__lt=expiration_time
+        Returns:
+            list: Lista dos números (int) que foram recém-liberados nesta verificação
+        """
+        if self.next_prize_threshold is None:
+            return []
+        sold_count = self.numbers_sold
+        if sold_count < self.next_prize_threshold:
+            return []
+
+        # SKIP LOCKED: se outra compra já está liberando esses prêmios, deixa com ela
+        due = list(
+            self.prize_numbers.select_for_update(skip_locked=True)
+            .filter(is_released=False, release_threshold__lte=sold_count)
+            .order_by('release_threshold', 'number')
         )
+        newly_released = [prize_number.number for prize_number in due]
 
-        for order in expired_orders:
-            order.allocated_numbers.update(
-                status=RaffleNumber.Status.AVAILABLE,
-                user=None,
-                order=None,
-                reserved_at=None
+        if due:
+            PrizeNumber.objects.filter(pk__in=[prize_number.pk for prize_number in due]).update(
+                is_released=True,
+                updated_at=timezone.now()
             )
-            order.status = RaffleOrder.Status.EXPIRED
-            order.save(update_fields=['status'])
 
-    def check_and_release_prize_numbers(self):
-        """Libera números premiados baseado na porcentagem de vendas atingida
+            # Números premiados passam a poder ser vendidos se ainda estiverem disponíveis
+            # (sem linha = disponível em rifas esparsas)
+            taken = set(
+                self.numbers.filter(number__in=newly_released)
+                .exclude(status=RaffleNumber.Status.AVAILABLE)
+                .values_list('number', flat=True)
+            )
+            RaffleNumberBlock.release_numbers(self, [number for number in newly_released if number not in taken])
 
-        Returns:
-            list: Lista dos números (int) que foram recém-liberados nesta verificação
-        """
-        newly_released = []
-
-        if self.total_numbers == 0:
-            return newly_released
-
-        # Calcular porcentagem atual de vendas
-        current_percentage = (self.numbers_sold / self.total_numbers) * 100
-
-        # Verificar cada número premiado não liberado
-        for prize_number in self.prize_numbers.filter(is_released=False):
-            # Verifica se atingiu a porcentagem mínima configurada
-            if current_percentage >= prize_number.release_percentage_min:
-                # Liberar o número premiado para que possa ser vendido
-                prize_number.is_released = True
-                prize_number.save(update_fields=['is_released', 'updated_at'])
-                newly_released.append(prize_number.number)
+            current_percentage = (sold_count / self.total_numbers) * 100 if self.total_numbers else 0
+            for prize_number in due:
                 print(f"🔓 Número premiado {prize_number.number} LIBERADO! (Vendas em {current_percentage:.1f}%)")
                 print(f"   Valor do prêmio: R$ {prize_number.prize_amount}")
                 print(f"   Próximo comprador que receber este número ganhará o prêmio!")
 
+        self.refresh_next_prize_threshold()
+
         return newly_released
 
 
@@ -376,10 +828,708 @@ class RaffleNumber(models.Model):
         verbose_name_plural = 'Numeros da Rifa'
         unique_together = ['raffle', 'number']
         ordering = ['raffle', 'number']
+        indexes = [
+            # Busca de reservas expiradas (release_expired)
+            models.Index(fields=['status', 'reserved_expires_at'], name='raffles_num_status_exp_idx'),
+            # Contagem e posição ordinal dos vendidos no sorteio (RaffleDraw)
+            models.Index(fields=['raffle', 'status', 'number'], name='raffles_num_status_num_idx'),
+        ]
 
     def __str__(self):
         return f"Rifa {self.raffle.name} - Numero {self.number:04d}"
 
+    # Pedidos pendentes mais antigos que isso são expirados (legado: reservas sem prazo)
+    PENDING_ORDER_TIMEOUT = timedelta(minutes=15)
+
+    @classmethod
+    @transaction.atomic
+    def release_expired(cls, raffle=None, now=None, limit=None):
+        """Release expired reservations and expire abandoned pending orders
+
+        Works with a handful of set-based statements no matter how many
+        reservations expired: lock the expired rows, update them in one
+        UPDATE, expire the pending orders in another, then give the numbers
+        back to the availability index and the counters. Rows locked by a
+        payment in progress are skipped and left to that payment.
+
+        `limit` caps how many numbers are released (the earliest deadlines
+        first), so large backlogs can be worked through in short transactions.
+
+        Returns the number of released numbers.
+        """
+        now = now or timezone.now()
+        order_deadline = now - cls.PENDING_ORDER_TIMEOUT
+
+        expired = cls.objects.filter(status=cls.Status.RESERVED).filter(
+            models.Q(reserved_expires_at__lte=now) |
+            models.Q(order__status=RaffleOrder.Status.PENDING, order__created_at__lt=order_deadline)
+        )
+        expired_orders = RaffleOrder.objects.filter(
+            status=RaffleOrder.Status.PENDING,
+            created_at__lt=order_deadline
+        )
+        if raffle is not None:
+            expired = expired.filter(raffle=raffle)
+            expired_orders = expired_orders.filter(raffle=raffle)
+
+        locked = expired.select_for_update(skip_locked=True, of=('self',)).order_by('reserved_expires_at')
+        if limit:
+            locked = locked[:limit]
+        released = list(locked.values_list('id', 'raffle_id', 'number'))
+
+        if released:
+            cls.objects.filter(id__in=[row_id for row_id, _, _ in released]).update(
+                status=cls.Status.AVAILABLE,
+                user=None,
+                order=None,
+                reserved_at=None,
+                reserved_expires_at=None
+            )
+
+        # Só expirar os pedidos quando todos os números vencidos já foram liberados
+        if not limit or len(released) < limit:
+            expired_orders.update(status=RaffleOrder.Status.EXPIRED)
+
+        if released:
+            by_raffle = defaultdict(list)
+            for _, raffle_id, number in released:
+                by_raffle[raffle_id].append(number)
+
+            for raffle_id, numbers in by_raffle.items():
+                RaffleNumberBlock.release_numbers(raffle_id, numbers)
+                # Passar a instância recebida, quando houver, para atualizá-la em memória também
+                target = raffle if getattr(raffle, 'pk', None) == raffle_id else raffle_id
+                Raffle.update_counters(
+                    target,
+                    reserved=-len(numbers),
+                    changes={cls.Status.AVAILABLE: numbers}
+                )
+
+        return len(released)
+
+    @classmethod
+    def next_expiry(cls):
+        """Return when the next reservation (or pending order) expires, or None"""
+        next_reservation = cls.objects.filter(
+            status=cls.Status.RESERVED,
+            reserved_expires_at__isnull=False
+        ).aggregate(deadline=models.Min('reserved_expires_at'))['deadline']
+
+        oldest_pending = RaffleOrder.objects.filter(
+            status=RaffleOrder.Status.PENDING
+        ).aggregate(created=models.Min('created_at'))['created']
+        next_order = oldest_pending + cls.PENDING_ORDER_TIMEOUT if oldest_pending else None
+
+        deadlines = [deadline for deadline in (next_reservation, next_order) if deadline]
+        return min(deadlines) if deadlines else None
+
+
+class _BlocksBusy(Exception):
+    """Not enough free numbers outside the blocks locked by other buyers"""
+
+
+class RaffleNumberBlock(models.Model):
+    """Bloco do índice de disponibilidade (bitmap) dos números de uma rifa
+
+    Cada bloco cobre BLOCK_SIZE números consecutivos. Um bit ligado significa que
+    o número pode ser sorteado para um comprador: está AVAILABLE e não é um número
+    premiado ainda bloqueado. Permite escolher k números aleatórios sem carregar
+    todos os números disponíveis da rifa em memória.
+    """
+
+    BLOCK_SIZE = 8192
+
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name='number_blocks')
+    index = models.PositiveIntegerField('Indice do Bloco')
+    bitmap = models.BinaryField('Bitmap de Disponibilidade')
+    free_count = models.PositiveIntegerField('Numeros Livres', default=0)
+
+    class Meta:
+        verbose_name = 'Bloco de Disponibilidade'
+        verbose_name_plural = 'Blocos de Disponibilidade'
+        unique_together = ['raffle', 'index']
+        ordering = ['raffle', 'index']
+
+    def __str__(self):
+        return f"Rifa {self.raffle_id} - Bloco {self.index} ({self.free_count} livres)"
+
+    @property
+    def first_number(self):
+        """Raffle number represented by bit 0 of this block"""
+        return self.index * self.BLOCK_SIZE + 1
+
+    @classmethod
+    def locate(cls, number):
+        """Return (block index, bit position) for a raffle number"""
+        return divmod(number - 1, cls.BLOCK_SIZE)
+
+    @classmethod
+    def build(cls, raffle, total_numbers, unavailable=()):
+        """Create the blocks for numbers 1..total_numbers, leaving `unavailable` out"""
+        blocked = defaultdict(list)
+        for number in unavailable:
+            if 1 <= number <= total_numbers:
+                index, position = cls.locate(number)
+                blocked[index].append(position)
+
+        blocks = []
+        block_count = (total_numbers + cls.BLOCK_SIZE - 1) // cls.BLOCK_SIZE
+        for index in range(block_count):
+            size = min(cls.BLOCK_SIZE, total_numbers - index * cls.BLOCK_SIZE)
+            block_bitmap = empty_bitmap(cls.BLOCK_SIZE)
+            set_range(block_bitmap, 0, size)
+            clear_bits(block_bitmap, blocked.get(index, ()))
+            blocks.append(cls(
+                raffle=raffle,
+                index=index,
+                bitmap=bytes(block_bitmap),
+                free_count=count_bits(block_bitmap)
+            ))
+
+        cls.objects.bulk_create(blocks)
+
+    @classmethod
+    def _locked_blocks(cls, raffle, indexes, create_missing=False):
+        """Lock and return the blocks with the given indexes, keyed by index"""
+        raffle_id = getattr(raffle, 'pk', raffle)
+        blocks = {
+            block.index: block
+            for block in cls.objects.select_for_update().filter(raffle_id=raffle_id, index__in=indexes)
+        }
+        if create_missing:
+            for index in set(indexes) - set(blocks):
+                blocks[index], _ = cls.objects.get_or_create(
+                    raffle_id=raffle_id,
+                    index=index,
+                    defaults={'bitmap': bytes(empty_bitmap(cls.BLOCK_SIZE))}
+                )
+        return blocks
+
+    def _save_bitmap(self, block_bitmap, delta):
+        self.bitmap = bytes(block_bitmap)
+        self.free_count += delta
+        self.save(update_fields=['bitmap', 'free_count'])
+
+    @classmethod
+    def _lock_idle_blocks(cls, raffle, quantity):
+        """Lock enough blocks to serve `quantity` numbers, skipping busy ones
+
+        Blocks are tried in a random order weighted by their free count, and the
+        ones already locked by other buyers are skipped (SKIP LOCKED), so
+        concurrent purchases work on different blocks instead of queueing.
+        """
+        counts = list(
+            cls.objects.filter(raffle=raffle, free_count__gt=0).values_list('index', 'free_count')
+        )
+        if sum(free for _, free in counts) < quantity:
+            raise ValidationError('Nao ha numeros suficientes disponiveis')
+
+        counts.sort(key=lambda item: random.random() ** (1.0 / item[1]), reverse=True)
+
+        locked = []
+        locked_free = 0
+        position = 0
+        while locked_free < quantity and position < len(counts):
+            # Próximo grupo de blocos que, pela leitura sem lock, cobre o que falta
+            batch = []
+            expected = locked_free
+            while expected < quantity and position < len(counts):
+                index, free = counts[position]
+                batch.append(index)
+                expected += free
+                position += 1
+
+            for block in (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(raffle=raffle, index__in=batch, free_count__gt=0)
+                .defer('bitmap')
+            ):
+                locked.append(block)
+                locked_free += block.free_count
+
+        if locked_free < quantity:
+            raise _BlocksBusy()
+        return locked
+
+    @classmethod
+    @transaction.atomic
+    def take_random_numbers(cls, raffle, quantity):
+        """Pick `quantity` random free numbers and remove them from the index
+
+        The pick is uniform over the free numbers of the locked blocks: random
+        ranks are drawn over their free count and mapped to blocks, so only the
+        blocks that actually contain a selected number have their bitmap loaded.
+        """
+        if quantity <= 0:
+            return []
+
+        try:
+            # Savepoint: se não houver blocos livres suficientes, os locks são desfeitos
+            with transaction.atomic():
+                blocks = cls._lock_idle_blocks(raffle, quantity)
+        except _BlocksBusy:
+            # Os números restantes estão em blocos usados por outros compradores:
+            # aguardar por eles, sempre na mesma ordem para evitar deadlock
+            blocks = list(
+                cls.objects.select_for_update()
+                .filter(raffle=raffle, free_count__gt=0)
+                .defer('bitmap')
+                .order_by('index')
+            )
+
+        blocks.sort(key=lambda block: block.index)
+        total_free = sum(block.free_count for block in blocks)
+        if total_free < quantity:
+            raise ValidationError('Nao ha numeros suficientes disponiveis')
+
+        ranks = sorted(random.sample(range(total_free), quantity))
+
+        selected = []
+        offset = 0
+        rank_index = 0
+        for block in blocks:
+            block_ranks = []
+            while rank_index < len(ranks) and ranks[rank_index] < offset + block.free_count:
+                block_ranks.append(ranks[rank_index] - offset)
+                rank_index += 1
+            offset += block.free_count
+
+            if not block_ranks:
+                continue
+
+            block_bitmap = bytearray(block.bitmap)
+            positions = select_set_bits(block_bitmap, block_ranks)
+            clear_bits(block_bitmap, positions)
+            block._save_bitmap(block_bitmap, -len(positions))
+            selected.extend(block.first_number + position for position in positions)
+
+        # Manter a ordem aleatória (os primeiros números são os pagos, o resto bônus)
+        random.shuffle(selected)
+        return selected
+
+    @classmethod
+    @transaction.atomic
+    def take_specific_numbers(cls, raffle, numbers):
+        """Remove specific numbers from the index. Returns the ones that were free"""
+        by_block = defaultdict(list)
+        for number in numbers:
+            index, position = cls.locate(number)
+            by_block[index].append(position)
+
+        taken = []
+        for index, block in cls._locked_blocks(raffle, list(by_block)).items():
+            block_bitmap = bytearray(block.bitmap)
+            free_positions = [p for p in by_block[index] if is_set(block_bitmap, p)]
+            if free_positions:
+                clear_bits(block_bitmap, free_positions)
+                block._save_bitmap(block_bitmap, -len(free_positions))
+                taken.extend(block.first_number + position for position in free_positions)
+
+        return sorted(taken)
+
+    @classmethod
+    @transaction.atomic
+    def release_numbers(cls, raffle, numbers):
+        """Put numbers back in the index (they became AVAILABLE again)
+
+        Sparse raffles don't keep rows for available numbers, so the released
+        rows are deleted as well.
+        """
+        if not numbers:
+            return
+
+        RaffleNumber.objects.filter(
+            raffle_id=getattr(raffle, 'pk', raffle),
+            raffle__sparse_numbers=True,
+            number__in=numbers,
+            status=RaffleNumber.Status.AVAILABLE
+        ).delete()
+
+        cls.restore_numbers(raffle, numbers)
+
+    @classmethod
+    @transaction.atomic
+    def restore_numbers(cls, raffle, numbers):
+        """Set the bits of `numbers` again, leaving their rows untouched"""
+        by_block = defaultdict(list)
+        for number in numbers:
+            index, position = cls.locate(number)
+            by_block[index].append(position)
+
+        # Rifas sem índice ainda: será construído a partir dos RaffleNumber
+        if not by_block or not cls.objects.filter(raffle_id=getattr(raffle, 'pk', raffle)).exists():
+            return
+
+        for index, block in cls._locked_blocks(raffle, list(by_block), create_missing=True).items():
+            block_bitmap = bytearray(block.bitmap)
+            changed = set_bits(block_bitmap, by_block[index])
+            if changed:
+                block._save_bitmap(block_bitmap, changed)
+
+    @classmethod
+    @transaction.atomic
+    def add_range(cls, raffle, start, stop):
+        """Mark numbers in [start, stop) as free (used when a raffle is expanded)"""
+        if stop <= start:
+            return
+
+        first_index, _ = cls.locate(start)
+        last_index, _ = cls.locate(stop - 1)
+        blocks = cls._locked_blocks(raffle, list(range(first_index, last_index + 1)), create_missing=True)
+
+        for index, block in blocks.items():
+            block_start = max(start, block.first_number) - block.first_number
+            block_stop = min(stop, block.first_number + cls.BLOCK_SIZE) - block.first_number
+            block_bitmap = bytearray(block.bitmap)
+            changed = set_range(block_bitmap, block_start, block_stop)
+            if changed:
+                block._save_bitmap(block_bitmap, changed)
+
+
+class GridChange(models.Model):
+    """Mudanças de status dos números, por versão do grid (feed incremental)
+
+    Each row holds the numbers that moved to `status` in one transition.
+    The row is written in the transition's own transaction without a
+    version. Right after that transaction commits, sequence() gives every
+    committed row of the raffle that has no version yet the next
+    grid_version, in a short transaction of its own. A purchase therefore
+    never holds the raffle row, and a version only ever covers committed
+    changes: a client at version N cannot miss a transaction that
+    committed after a later one. Rows whose commit callback never ran (the
+    process died) get their version with the next transition of the raffle.
+    """
+
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name='grid_changes')
+    version = models.PositiveBigIntegerField('Versão', null=True, blank=True)
+    status = models.CharField('Status', max_length=20, choices=RaffleNumber.Status.choices)
+    numbers = models.JSONField('Números', default=list)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+
+    # Quantas versões um cliente pode estar atrasado antes de ter que recarregar o grid
+    MAX_VERSIONS_BEHIND = 500
+
+    class Meta:
+        verbose_name = 'Mudança no Grid'
+        verbose_name_plural = 'Mudanças no Grid'
+        ordering = ['raffle', 'version', 'id']
+        indexes = [
+            models.Index(fields=['raffle', 'version'], name='raffles_gridchange_ver_idx'),
+        ]
+
+    def __str__(self):
+        return f"Rifa {self.raffle_id} v{self.version}: {len(self.numbers)} número(s) {self.status}"
+
+    @classmethod
+    def record(cls, raffle_id, changes):
+        """Write the changes of the current transaction; versioned after it commits"""
+        rows = [
+            cls(raffle_id=raffle_id, status=status, numbers=sorted(numbers))
+            for status, numbers in changes.items() if numbers
+        ]
+        if not rows:
+            return
+        cls.objects.bulk_create(rows)
+        transaction.on_commit(lambda: cls.sequence(raffle_id))
+
+    @classmethod
+    @transaction.atomic
+    def sequence(cls, raffle_id):
+        """Give the committed changes without a version the next grid_version
+
+        Returns the current grid_version of the raffle (None if it is gone).
+        """
+        version = (
+            Raffle.objects.select_for_update()
+            .filter(pk=raffle_id)
+            .values_list('grid_version', flat=True)
+            .first()
+        )
+        if version is None:
+            return None
+        # Só enxerga linhas já confirmadas: as de transações em andamento ficam para depois
+        if not cls.objects.filter(raffle_id=raffle_id, version__isnull=True).update(version=version + 1):
+            return version
+        Raffle.objects.filter(pk=raffle_id).update(grid_version=version + 1)
+        return version + 1
+
+    @classmethod
+    def changes_since(cls, raffle, since):
+        """Return the final status of every number changed after version `since`
+
+        Returns a dict status -> sorted numbers, or None when the feed cannot
+        bring the client up to date (too far behind, pruned history or an
+        unknown version) and the full grid must be reloaded.
+        """
+        current = raffle.grid_version
+        if since > current or current - since > cls.MAX_VERSIONS_BEHIND:
+            return None
+        if since == current:
+            return {}
+
+        rows = list(
+            cls.objects.filter(raffle=raffle, version__gt=since, version__lte=current)
+            .order_by('version', 'id')
+            .values_list('version', 'status', 'numbers')
+        )
+        if len({version for version, _, _ in rows}) != current - since:
+            return None
+
+        # Mudanças posteriores prevalecem sobre as anteriores
+        latest = {}
+        for _, status, numbers in rows:
+            for number in numbers:
+                latest[number] = status
+
+        changes = defaultdict(list)
+        for number, status in sorted(latest.items()):
+            changes[status].append(number)
+        return dict(changes)
+
+    @classmethod
+    def prune(cls, older_than):
+        """Delete changes recorded before `older_than` (clients that old reload the grid)"""
+        return cls.objects.filter(created_at__lt=older_than, version__isnull=False).delete()[0]
+
+
+class RaffleCounterShard(models.Model):
+    """Fatia dos contadores de uma campanha
+
+    Every purchase, payment, expiry and referral adds its deltas to one of
+    SHARDS rows of the raffle instead of the raffle (or stats) row, so
+    concurrent buyers rarely touch the same row and never queue behind one
+    hot row until commit. A thread always writes to the same shard, so one
+    transaction never holds two shards of a raffle and cannot deadlock with
+    another. Totals are the last recount (Raffle.sold_count / reserved_count,
+    CampaignStats) plus the sum of the shards.
+    """
+
+    SHARDS = 16
+
+    # Campos que são totais de CampaignStats (os demais são de Raffle)
+    STATS_FIELDS = ('revenue', 'paid_orders', 'unique_buyers', 'referrals_redeemed', 'referral_bonus_numbers')
+    FIELDS = ('sold', 'reserved') + STATS_FIELDS
+
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField('Fatia')
+    sold = models.IntegerField('Vendidos', default=0)
+    reserved = models.IntegerField('Reservados', default=0)
+    revenue = models.DecimalField('Arrecadado', max_digits=12, decimal_places=2, default=0)
+    paid_orders = models.IntegerField('Pedidos Pagos', default=0)
+    unique_buyers = models.IntegerField('Compradores', default=0)
+    referrals_redeemed = models.IntegerField('Indicações', default=0)
+    referral_bonus_numbers = models.IntegerField('Números Bônus de Indicação', default=0)
+
+    # Fatia de cada thread: distribuídas em sequência a partir de um ponto aleatório por processo
+    _next_shard = itertools.count(random.randrange(SHARDS))
+    _local = threading.local()
+
+    class Meta:
+        verbose_name = 'Fatia dos Contadores'
+        verbose_name_plural = 'Fatias dos Contadores'
+        constraints = [
+            models.UniqueConstraint(fields=['raffle', 'shard'], name='raffles_countershard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Rifa {self.raffle_id} - Fatia {self.shard}"
+
+    @classmethod
+    def current_shard(cls):
+        shard = getattr(cls._local, 'shard', None)
+        if shard is None:
+            shard = cls._local.shard = next(cls._next_shard) % cls.SHARDS
+        return shard
+
+    @classmethod
+    def create_shards(cls, raffle_id):
+        cls.objects.bulk_create(
+            [cls(raffle_id=raffle_id, shard=shard) for shard in range(cls.SHARDS)],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def add(cls, raffle_id, **deltas):
+        """Add the deltas to the shard of the current thread"""
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not changes:
+            return
+
+        shard = cls.objects.filter(raffle_id=raffle_id, shard=cls.current_shard())
+        if not shard.update(**changes):
+            # Rifa sem fatias ainda (criada antes delas)
+            cls.create_shards(raffle_id)
+            shard.update(**changes)
+
+    @classmethod
+    def totals(cls, raffle_id):
+        """Sum of every field over the shards of the raffle"""
+        sums = cls.objects.filter(raffle_id=raffle_id).aggregate(
+            **{field: Sum(field) for field in cls.FIELDS}
+        )
+        return {field: value or 0 for field, value in sums.items()}
+
+    @classmethod
+    def sum_shards(cls, shards):
+        """Same as totals() over shard instances already loaded"""
+        totals = dict.fromkeys(cls.FIELDS, 0)
+        for shard in shards:
+            for field in cls.FIELDS:
+                totals[field] += getattr(shard, field)
+        return totals
+
+    @classmethod
+    def totals_by_raffle(cls, raffle_ids):
+        """Same as totals() for many raffles at once: {raffle_id: totals}"""
+        totals = {raffle_id: dict.fromkeys(cls.FIELDS, 0) for raffle_id in raffle_ids}
+        rows = (
+            cls.objects.filter(raffle_id__in=raffle_ids)
+            .values('raffle_id')
+            .annotate(**{field: Sum(field) for field in cls.FIELDS})
+            .order_by()
+        )
+        for row in rows:
+            totals[row.pop('raffle_id')].update(row)
+        return totals
+
+    @classmethod
+    def lock(cls, raffle_id):
+        """Lock every shard of the raffle (recounts); returns their queryset
+
+        Waits for the transitions in progress, which commit their deltas
+        before the recount reads the raw rows.
+        """
+        cls.create_shards(raffle_id)
+        shards = cls.objects.filter(raffle_id=raffle_id)
+        list(shards.select_for_update().order_by('shard').values_list('pk', flat=True))
+        return shards
+
+
+class CampaignStats(models.Model):
+    """Totais materializados de uma campanha para os painéis administrativos
+
+    The row holds the last recount (rebuild). The totals that change on
+    every payment or referral are added to the counter shards of the
+    raffle (RaffleCounterShard) and summed by for_raffle(), so payments do
+    not queue on this row; the prize totals, which change rarely, are
+    updated here. Sold and reserved numbers are counted by Raffle.
+    """
+
+    raffle = models.OneToOneField(Raffle, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    revenue = models.DecimalField('Arrecadado', max_digits=12, decimal_places=2, default=0)
+    paid_orders = models.PositiveIntegerField('Pedidos Pagos', default=0)
+    unique_buyers = models.PositiveIntegerField('Compradores', default=0)
+    prize_numbers = models.PositiveIntegerField('Números Premiados', default=0)
+    prizes_won = models.PositiveIntegerField('Prêmios Ganhos', default=0)
+    referrals_redeemed = models.PositiveIntegerField('Indicações', default=0)
+    referral_bonus_numbers = models.PositiveIntegerField('Números Bônus de Indicação', default=0)
+    updated_at = models.DateTimeField('Atualizado em', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Estatísticas da Campanha'
+        verbose_name_plural = 'Estatísticas das Campanhas'
+
+    def __str__(self):
+        return f"Estatísticas de {self.raffle}"
+
+    @property
+    def fee_amount(self):
+        return self.revenue * (self.raffle.fee_percentage / 100)
+
+    @property
+    def net_revenue(self):
+        return self.revenue - self.fee_amount
+
+    @property
+    def prize_percentage(self):
+        return round((self.prizes_won / self.prize_numbers) * 100, 1) if self.prize_numbers else 0
+
+    @classmethod
+    def apply(cls, raffle, **deltas):
+        """Add the given deltas to the stats of the campaign"""
+        sharded = {field: delta for field, delta in deltas.items() if field in RaffleCounterShard.STATS_FIELDS}
+        RaffleCounterShard.add(raffle.pk, **sharded)
+        if 'counter_totals' in raffle.__dict__:
+            for field, delta in sharded.items():
+                raffle.counter_totals[field] += delta
+
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta and field not in sharded}
+        if not changes:
+            return
+        updated = cls.objects.filter(raffle_id=raffle.pk).update(updated_at=timezone.now(), **changes)
+        if not updated:
+            # Campanha sem linha ainda: a recontagem já enxerga esta transição
+            cls.rebuild(raffle)
+
+    @classmethod
+    def set_prizes(cls, raffle, total, won):
+        """Store the prize totals (recounted whenever the prize numbers change)"""
+        updated = cls.objects.filter(raffle_id=raffle.pk).update(
+            prize_numbers=total,
+            prizes_won=won,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            cls.rebuild(raffle)
+
+    @classmethod
+    def for_raffle(cls, raffle):
+        """Stats of the campaign with the shard deltas added (read only)
+
+        Rebuilt on the spot if the row does not exist yet. The deltas come
+        from raffle.counter_totals, shared with numbers_sold/reserved.
+        """
+        try:
+            stats = copy.copy(raffle.stats)
+        except cls.DoesNotExist:
+            stats = cls.rebuild(raffle)
+
+        totals = raffle.counter_totals
+        for field in RaffleCounterShard.STATS_FIELDS:
+            setattr(stats, field, getattr(stats, field) + totals[field])
+        return stats
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, raffle):
+        """Recompute the stats of the campaign from the orders, prizes and referrals"""
+        # Travar as fatias: pagamentos em andamento aplicam seus deltas depois da recontagem
+        shards = RaffleCounterShard.lock(raffle.pk)
+
+        orders = RaffleOrder.objects.filter(
+            raffle=raffle,
+            status=RaffleOrder.Status.PAID
+        ).aggregate(
+            revenue=models.Sum('amount'),
+            paid_orders=Count('id'),
+            unique_buyers=Count('user', distinct=True),
+        )
+        prizes = PrizeNumber.objects.filter(raffle=raffle).aggregate(
+            total=Count('id'),
+            won=Count('id', filter=models.Q(is_won=True)),
+        )
+
+        stats, _ = cls.objects.update_or_create(raffle=raffle, defaults={
+            'revenue': orders['revenue'] or 0,
+            'paid_orders': orders['paid_orders'],
+            'unique_buyers': orders['unique_buyers'],
+            'prize_numbers': prizes['total'],
+            'prizes_won': prizes['won'],
+            'referrals_redeemed': Referral.objects.filter(
+                raffle=raffle,
+                status=Referral.Status.REDEEMED
+            ).count(),
+            'referral_bonus_numbers': RaffleNumber.objects.filter(
+                raffle=raffle,
+                source__in=[RaffleNumber.Source.REFERRAL_INVITER, RaffleNumber.Source.REFERRAL_INVITEE],
+                status=RaffleNumber.Status.SOLD
+            ).count(),
+            'updated_at': timezone.now(),
+        })
+        shards.update(**{field: 0 for field in RaffleCounterShard.STATS_FIELDS})
+        raffle.forget_counter_totals()
+        return stats
+
 
 class RaffleOrder(models.Model):
     """Raffle order/purchase"""
@@ -422,6 +1572,10 @@ class RaffleOrder(models.Model):
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
         ordering = ['-created_at']
+        indexes = [
+            # Pedidos pendentes mais antigos (worker de expiração)
+            models.Index(fields=['status', 'created_at'], name='raffles_order_status_crt_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.user.name} - {self.get_status_display()}"
@@ -449,6 +1603,9 @@ class RaffleOrder(models.Model):
         if self.allocated_numbers.exists():
             return list(self.allocated_numbers.values_list('number', flat=True))
 
+        # Garantir que o índice de disponibilidade exista (rifas antigas)
+        self.raffle.ensure_number_index()
+
         # Verificar e liberar números premiados baseado na porcentagem de vendas
         newly_released_prizes = self.raffle.check_and_release_prize_numbers()
 
@@ -457,61 +1614,33 @@ class RaffleOrder(models.Model):
         total_to_allocate = self.quantity + bonus_count
 
         if bonus_count > 0:
-            print(f"🎁 Bônus de compra: {bonus_count} números extras! Total: {total_to_allocate}")
+            logger.info('Bônus de compra: %d números extras (total %d) no pedido %s', bonus_count, total_to_allocate, self.pk)
 
-        # Get available numbers (excluindo números premiados que ainda não foram liberados)
-        available = list(
-            RaffleNumber.objects.filter(
-                raffle=self.raffle,
-                status=RaffleNumber.Status.AVAILABLE
-            ).values_list('id', 'number')
-        )
-
-        # Filtrar números disponíveis (excluindo premiados não liberados)
-        unreleased_prize_numbers = set(
-            self.raffle.prize_numbers.filter(is_released=False).values_list('number', flat=True)
-        )
-
-        available_filtered = [(id, num) for id, num in available if num not in unreleased_prize_numbers]
-
-        if len(available_filtered) < total_to_allocate:
-            raise ValidationError('Nao ha numeros suficientes disponiveis')
-
-        # FORÇAR inclusão de números premiados recém-liberados (se ainda estiverem disponíveis)
-        forced_prize_numbers = []
-        if newly_released_prizes:
-            for prize_num in newly_released_prizes:
-                # Encontrar o ID do RaffleNumber correspondente (usar None como default)
-                prize_raffle_number = next(((id, num) for id, num in available_filtered if num == prize_num), None)
-                if prize_raffle_number:
-                    forced_prize_numbers.append(prize_raffle_number)
-                    available_filtered.remove(prize_raffle_number)
-                    print(f"🎯 FORÇANDO número premiado {prize_num} para este comprador!")
-                else:
-                    print(f"⚠️  Número premiado {prize_num} foi liberado mas não está mais disponível (já foi vendido)")
-
-        # Calcular quantos números aleatórios ainda precisamos
-        remaining_to_allocate = total_to_allocate - len(forced_prize_numbers)
-
-        # Selecionar números aleatórios para completar
-        if remaining_to_allocate > 0:
-            random_selected = random.sample(available_filtered, remaining_to_allocate)
-        else:
-            random_selected = []
+        # Reservar os números: números premiados recém-liberados são FORÇADOS para
+        # este comprador (se ainda estiverem disponíveis), o resto é aleatório.
+        # As linhas ficam travadas (SKIP LOCKED) até o fim da transação, então
+        # compradores simultâneos nunca recebem o mesmo número.
+        selected = self.raffle.claim_numbers(total_to_allocate, forced=newly_released_prizes)
 
-        # Combinar números forçados + aleatórios
-        selected = forced_prize_numbers + random_selected
-        selected_ids = [id for id, num in selected]
+        for prize_num in newly_released_prizes:
+            if prize_num in selected:
+                logger.info('Número premiado %d forçado para o pedido %s', prize_num, self.pk)
+            else:
+                logger.info('Número premiado %d foi liberado mas não está mais disponível', prize_num)
 
         # Separar números pagos e bônus
-        paid_ids = selected_ids[:self.quantity]  # Primeiros são pagos
-        bonus_ids = selected_ids[self.quantity:]  # Restantes são bônus
+        paid_numbers = selected[:self.quantity]  # Primeiros são pagos
+        bonus_numbers = selected[self.quantity:]  # Restantes são bônus
 
         # Separa reserved numbers with expiration time (15 minutes from now)
         expiration_time = timezone.now() + timedelta(minutes=15)
         
         # Reserve paid numbers
-        RaffleNumber.objects.filter(id__in=paid_ids).update(
+        RaffleNumber.objects.filter(
+            raffle=self.raffle,
+            number__in=paid_numbers,
+            status=RaffleNumber.Status.AVAILABLE
+        ).update(
             status=RaffleNumber.Status.RESERVED,
             user=self.user,
             order=self,
@@ -521,8 +1650,12 @@ class RaffleOrder(models.Model):
         )
         
         # Reserve bonus numbers with correct source
-        if bonus_ids:
-            RaffleNumber.objects.filter(id__in=bonus_ids).update(
+        if bonus_numbers:
+            RaffleNumber.objects.filter(
+                raffle=self.raffle,
+                number__in=bonus_numbers,
+                status=RaffleNumber.Status.AVAILABLE
+            ).update(
                 status=RaffleNumber.Status.RESERVED,
                 user=self.user,
                 order=self,
@@ -538,10 +1671,31 @@ class RaffleOrder(models.Model):
             self.payment_data['purchase_bonus'] = bonus_count
             self.save(update_fields=['payment_data'])
 
-        return list(
-            RaffleNumber.objects.filter(id__in=selected_ids).values_list('number', flat=True)
+        # Todos os números selecionados estão travados e estavam disponíveis
+        Raffle.update_counters(
+            self.raffle,
+            reserved=len(selected),
+            changes={RaffleNumber.Status.RESERVED: selected}
         )
 
+        return selected
+
+    def is_overdue(self, now=None):
+        """Whether this pending order is past its deadline (read only)
+
+        The run_reservation_expiry worker releases overdue orders; the pages
+        that show a pending order use this to display it as expired in the
+        meantime, without doing any expiry work on the request path.
+        """
+        if self.status != self.Status.PENDING:
+            return False
+
+        now = now or timezone.now()
+        return self.created_at < now - RaffleNumber.PENDING_ORDER_TIMEOUT or self.allocated_numbers.filter(
+            status=RaffleNumber.Status.RESERVED,
+            reserved_expires_at__lte=now
+        ).exists()
+
     @transaction.atomic
     def mark_as_paid(self):
         """Mark order as paid and allocate numbers permanently"""
@@ -549,38 +1703,58 @@ class RaffleOrder(models.Model):
 
         print(f"🔄 DEBUG: Marking order {self.id} as paid. Referral code: {self.referral_code}")
 
+        # Travar o pedido: webhooks repetidos/simultâneos processam o pagamento uma única vez
+        current_status = RaffleOrder.objects.select_for_update().values_list(
+            'status', flat=True
+        ).get(pk=self.pk)
+        if current_status == self.Status.PAID:
+            print(f"ℹ️  DEBUG: Order {self.id} already paid, skipping")
+            self.status = current_status
+            return list(self.allocated_numbers.values_list('number', flat=True))
+
         self.status = self.Status.PAID
         self.paid_at = timezone.now()
         self.save()
 
         # Mark all reserved numbers as sold
-        self.allocated_numbers.update(
+        newly_sold = list(
+            self.allocated_numbers.select_for_update()
+            .filter(status=RaffleNumber.Status.RESERVED)
+            .values_list('number', flat=True)
+        )
+        RaffleNumber.objects.filter(raffle=self.raffle, number__in=newly_sold).update(
             status=RaffleNumber.Status.SOLD,
             sold_at=timezone.now()
         )
         print(f"✅ DEBUG: Marked {self.allocated_numbers.count()} numbers as sold")
 
-        # Verificar se algum número comprado é um número premiado
-        allocated_numbers = list(self.allocated_numbers.values_list('number', flat=True))
-        won_prizes = []
+        # Verificar se algum número comprado é um número premiado (uma consulta só,
+        # com os prêmios travados para que dois pedidos nunca ganhem o mesmo prêmio)
+        won_at = timezone.now()
+        won_prizes = list(
+            PrizeNumber.objects.select_for_update()
+            .filter(
+                raffle=self.raffle,
+                number__in=self.allocated_numbers.values('number'),
+                is_released=True,
+                is_won=False
+            )
+            .order_by('number')
+        )
 
-        for number in allocated_numbers:
-            try:
-                prize = PrizeNumber.objects.get(
-                    raffle=self.raffle,
-                    number=number,
-                    is_released=True,
-                    is_won=False
-                )
-                # Marcar como ganho
+        if won_prizes:
+            # Marcar como ganhos
+            PrizeNumber.objects.filter(pk__in=[prize.pk for prize in won_prizes]).update(
+                is_won=True,
+                winner=self.user,
+                won_at=won_at,
+                updated_at=won_at
+            )
+            for prize in won_prizes:
                 prize.is_won = True
                 prize.winner = self.user
-                prize.won_at = timezone.now()
-                prize.save()
-                won_prizes.append(prize)
-                print(f"🏆 PRÊMIO GANHO! Usuário {self.user.name} ganhou R$ {prize.prize_amount} com o número {number}!")
-            except PrizeNumber.DoesNotExist:
-                pass
+                prize.won_at = won_at
+                print(f"🏆 PRÊMIO GANHO! Usuário {self.user.name} ganhou R$ {prize.prize_amount} com o número {prize.number}!")
 
         # Armazenar prêmios ganhos no pedido para exibir depois
         if won_prizes:
@@ -655,6 +1829,40 @@ class RaffleOrder(models.Model):
                 )
                 print(f"🎁 DEBUG: Created referral code {new_referral.code} for user {self.user.name}")
 
+        Raffle.update_counters(
+            self.raffle,
+            sold=len(newly_sold),
+            reserved=-len(newly_sold),
+            changes={RaffleNumber.Status.SOLD: newly_sold}
+        )
+
+        # Travar o comprador (não a rifa): dois pedidos do mesmo comprador pagos
+        # ao mesmo tempo nunca o contam duas vezes
+        User.objects.select_for_update().filter(pk=self.user_id).first()
+        first_purchase = not RaffleOrder.objects.filter(
+            raffle=self.raffle,
+            user=self.user,
+            status=self.Status.PAID
+        ).exclude(pk=self.pk).exists()
+        CampaignStats.apply(
+            self.raffle,
+            revenue=self.amount,
+            paid_orders=1,
+            unique_buyers=1 if first_purchase else 0,
+            prizes_won=len(won_prizes)
+        )
+
+        # Funil de conversão: o pagamento conta na hora em que o pedido foi criado.
+        # Aplicado depois do commit para não travar a linha da hora durante o pagamento
+        from analytics.models import ConversionFunnel
+        transaction.on_commit(lambda: ConversionFunnel.add(
+            self.raffle_id,
+            self.created_at,
+            self.referral_code,
+            paid_orders=1,
+            revenue=self.amount
+        ))
+
         return list(self.allocated_numbers.values_list('number', flat=True))
 
 
@@ -723,6 +1931,8 @@ class Referral(models.Model):
         self.redeemed_at = timezone.now()
         self.save()
 
+        CampaignStats.apply(self.raffle, referrals_redeemed=1)
+
         return self
 
     @transaction.atomic
@@ -788,31 +1998,34 @@ class Referral(models.Model):
         """Helper to allocate numbers"""
         from django.utils import timezone
 
-        print(f"🔢 DEBUG: _allocate_numbers - user={user.name}, quantity={quantity}, source={source}")
-
-        # Get available numbers randomly to make it fair
-        available = list(
-            RaffleNumber.objects.filter(
-                raffle=self.raffle,
-                status=RaffleNumber.Status.AVAILABLE
-            ).order_by('?')  # Randomize order
-            .values_list('id', flat=True)[:quantity]
-        )
+        self.raffle.ensure_number_index()
 
-        print(f"📊 DEBUG: Found {len(available)} available numbers (requested {quantity})")
+        # Get available numbers randomly to make it fair (rows stay locked until commit)
+        try:
+            with transaction.atomic():
+                available = self.raffle.claim_numbers(quantity)
 
-        if len(available) < quantity:
-            print(f"⚠️  DEBUG: Not enough available numbers: found {len(available)}, need {quantity}")
+                sold = RaffleNumber.objects.filter(
+                    raffle=self.raffle,
+                    number__in=available,
+                    status=RaffleNumber.Status.AVAILABLE
+                ).update(
+                    status=RaffleNumber.Status.SOLD,
+                    user=user,
+                    source=source,
+                    sold_at=timezone.now()
+                )
+                Raffle.update_counters(
+                    self.raffle,
+                    sold=sold,
+                    changes={RaffleNumber.Status.SOLD: available}
+                )
+                CampaignStats.apply(self.raffle, referral_bonus_numbers=sold)
+        except ValidationError:
+            logger.info('Bônus de indicação %s: não há %d números disponíveis', self.code, quantity)
             return
 
-        RaffleNumber.objects.filter(id__in=available).update(
-            status=RaffleNumber.Status.SOLD,
-            user=user,
-            source=source,
-            sold_at=timezone.now()
-        )
-        
-        print(f"✅ DEBUG: Successfully allocated {len(available)} numbers to {user.name}")
+        logger.debug('Bônus de indicação %s: %d números para o usuário %s', self.code, len(available), user.pk)
 
     def _send_inviter_notification(self, total_bonus, invitee_purchase_quantity):
         """Send WhatsApp notification to inviter about successful referral"""
@@ -879,18 +2092,11 @@ Olá *{self.inviter.name}*!
 Cada indicação bem-sucedida te dá mais chances de ganhar! 🍀
         """.strip()
         
-        # Send via WhatsApp
-        from notifications.whatsapp import send_whatsapp_message
+        # Send via WhatsApp (queued: sent by the worker after the payment commits)
+        from notifications.whatsapp import queue_whatsapp_message
         
-        logger.info(f"📤 Sending referral bonus notification to inviter {self.inviter.whatsapp}")
-        try:
-            result = send_whatsapp_message(self.inviter.whatsapp, message)
-            if result:
-                logger.info(f"✅ Referral notification sent successfully to {self.inviter.name}")
-            else:
-                logger.error(f"❌ Failed to send referral notification to {self.inviter.name}")
-        except Exception as e:
-            logger.error(f"❌ Error sending referral notification: {e}", exc_info=True)
+        logger.info(f"📤 Queueing referral bonus notification to inviter {self.inviter.whatsapp}")
+        queue_whatsapp_message(self.inviter.whatsapp, message, kind='referral_bonus_notification')
 
 
 class PrizeNumber(models.Model):
@@ -914,6 +2120,9 @@ class PrizeNumber(models.Model):
         help_text='Ex: 22.00 para 22%'
     )
 
+    # release_percentage_min convertido em quantidade de números vendidos (calculado no save)
+    release_threshold = models.PositiveIntegerField('Vendas para Liberar', default=0, editable=False)
+
     # Controle de status
     is_released = models.BooleanField('Foi Liberado', default=False)
     is_won = models.BooleanField('Foi Ganho', default=False)
@@ -939,6 +2148,20 @@ class PrizeNumber(models.Model):
     def __str__(self):
         return f"Número {self.number} - R$ {self.prize_amount} ({self.release_percentage_min}%-{self.release_percentage_max}%)"
 
+    @staticmethod
+    def compute_threshold(total_numbers, percentage):
+        """Smallest sold count whose percentage of total_numbers reaches `percentage`"""
+        return math.ceil(total_numbers * Decimal(str(percentage)) / 100)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'release_percentage_min' in update_fields:
+            self.release_threshold = self.compute_threshold(self.raffle.total_numbers, self.release_percentage_min)
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + ['release_threshold']
+        super().save(*args, **kwargs)
+        self.raffle.refresh_next_prize_threshold()
+
     def check_and_release(self):
         """Verifica se o número deve ser liberado baseado na porcentagem de vendas"""
         if self.is_released:
@@ -954,3 +2177,300 @@ class PrizeNumber(models.Model):
             return True
 
         return False
+
+
+class RaffleDraw(models.Model):
+    """Sorteio auditável de uma campanha (commit-reveal com beacon público)
+
+    The commitment freezes the draw before anyone can know the result: sales
+    are closed, the count and a SHA-256 of the sold set (number and owner,
+    ordered by number) are recorded, and a future round of the public drand
+    beacon is chosen. When that round is published, the winner is the sold
+    number at position sha256("randomness:raffle:count:sold_hash") % count.
+    The server holds no secret, so a commitment cannot be replayed until a
+    convenient winner comes out; a raffle only has one open commitment, and
+    if the sold set changed in between the draw is voided instead.
+
+    The sold set is read once, at the commitment and outside the raffle
+    lock. Besides the hash this records the raffle's grid_version and how
+    many numbers were sold up to each range of RANGE_SIZE numbers. The
+    reveal then checks the grid_version (every status change moves it)
+    and finds the winner in one range, without reading the sold set again.
+    """
+
+    # Faixa de números do índice de posições (sold_counts)
+    RANGE_SIZE = 8192
+
+    class Status(models.TextChoices):
+        COMMITTED = 'committed', 'Compromisso publicado'
+        REVEALED = 'revealed', 'Sorteado'
+        VOID = 'void', 'Anulado'
+
+    raffle = models.ForeignKey(Raffle, on_delete=models.PROTECT, related_name='draws')
+    status = models.CharField('Status', max_length=20, choices=Status.choices, default=Status.COMMITTED)
+    beacon_round = models.PositiveBigIntegerField('Rodada do Beacon', null=True, blank=True)
+    eligible_count = models.PositiveIntegerField('Números Concorrendo', null=True, blank=True)
+    sold_hash = models.CharField('Hash dos Números Vendidos (SHA-256)', max_length=64, blank=True)
+    # Vendidos acumulados até o fim de cada faixa de RANGE_SIZE números, no compromisso
+    sold_counts = models.JSONField('Vendidos por Faixa', default=list, blank=True)
+    grid_version = models.PositiveBigIntegerField('Versão do Grid no Compromisso', null=True, blank=True)
+    # Publicadas pelo beacon na rodada escolhida (ou a semente de sorteios antigos)
+    randomness = models.CharField('Aleatoriedade', max_length=64, blank=True)
+    signature = models.TextField('Assinatura do Beacon', blank=True)
+    ordinal = models.PositiveIntegerField('Posição Sorteada', null=True, blank=True)
+    winner_number = models.PositiveIntegerField('Número Sorteado', null=True, blank=True)
+    winner = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='draws_won',
+        verbose_name='Ganhador'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Criado por'
+    )
+    void_reason = models.CharField('Motivo da Anulação', max_length=255, blank=True)
+    committed_at = models.DateTimeField('Compromisso em', auto_now_add=True)
+    revealed_at = models.DateTimeField('Sorteado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Sorteio'
+        verbose_name_plural = 'Sorteios'
+        ordering = ['-committed_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['raffle'],
+                condition=models.Q(status='committed'),
+                name='raffles_draw_one_open_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        if self.status == self.Status.REVEALED:
+            return f"Sorteio {self.raffle.name} - Número {self.winner_number}"
+        return f"Sorteio {self.raffle.name} - rodada {self.beacon_round}"
+
+    @property
+    def reveal_after(self):
+        """When the beacon round of the commitment is published"""
+        if self.beacon_round is None:
+            return None
+        return beacon.round_time(self.beacon_round)
+
+    @staticmethod
+    def compute_ordinal(randomness, raffle_id, eligible_count, sold_hash=''):
+        """Position of the winner among the sold numbers ordered by number
+
+        Draws made before the beacon have no sold_hash and keep the old
+        "seed:raffle:count" message, so they can still be replayed.
+        """
+        message = f"{randomness}:{raffle_id}:{eligible_count}"
+        if sold_hash:
+            message += f":{sold_hash}"
+        digest = hashlib.sha256(message.encode()).hexdigest()
+        return int(digest, 16) % eligible_count
+
+    @classmethod
+    def eligible_numbers(cls, raffle):
+        """Numbers taking part in the draw: every sold number of the raffle"""
+        return RaffleNumber.objects.filter(
+            raffle=raffle,
+            status=RaffleNumber.Status.SOLD
+        ).order_by('number')
+
+    @classmethod
+    def sold_set_summary(cls, raffle):
+        """(count, sha256, sold_counts) of the sold numbers, streamed in order
+
+        sold_counts[i] is how many numbers below (i + 1) * RANGE_SIZE are sold.
+        """
+        digest = hashlib.sha256()
+        count = 0
+        sold_counts = []
+        rows = cls.eligible_numbers(raffle).values_list('number', 'user_id').iterator(chunk_size=5000)
+        for number, user_id in rows:
+            digest.update(f"{number}:{user_id}\n".encode())
+            index = number // cls.RANGE_SIZE
+            if index >= len(sold_counts):
+                sold_counts.extend([count] * (index + 1 - len(sold_counts)))
+            count += 1
+            sold_counts[index] = count
+        return count, digest.hexdigest(), sold_counts
+
+    @classmethod
+    def sold_set_digest(cls, raffle):
+        """(count, sha256) of the sold numbers and their owners, streamed in order"""
+        return cls.sold_set_summary(raffle)[:2]
+
+    @classmethod
+    def commit(cls, raffle, user=None):
+        """Close the sales, freeze the sold set and pick a future beacon round"""
+        from django.conf import settings
+
+        with transaction.atomic():
+            raffle = Raffle.objects.select_for_update().get(pk=raffle.pk)
+
+            if cls.objects.filter(raffle=raffle, status=cls.Status.COMMITTED).exists():
+                raise ValidationError('Já existe um compromisso aberto para esta campanha.')
+
+            reserved = raffle.numbers.filter(status=RaffleNumber.Status.RESERVED).count()
+            if reserved:
+                raise ValidationError(
+                    f'Há {reserved} números reservados aguardando pagamento. '
+                    'Aguarde o pagamento ou a expiração antes de gerar o compromisso.'
+                )
+            if not raffle.numbers.filter(status=RaffleNumber.Status.SOLD).exists():
+                raise ValidationError('Nenhum número vendido para esta campanha.')
+
+            # Congelar as vendas: a lista de concorrentes não pode mudar até o sorteio
+            if raffle.status == Raffle.Status.ACTIVE:
+                raffle.status = Raffle.Status.FINISHED
+                raffle.save(update_fields=['status', 'updated_at'])
+
+        # Fora da trava da rifa: com as vendas fechadas, ler os vendidos uma única vez.
+        # A versão do grid antes e depois garante que nada mudou durante a leitura
+        grid_version = GridChange.sequence(raffle.pk)
+        eligible_count, sold_hash, sold_counts = cls.sold_set_summary(raffle)
+        if GridChange.sequence(raffle.pk) != grid_version:
+            raise ValidationError('Números mudaram durante o compromisso. Tente novamente.')
+        if not eligible_count:
+            raise ValidationError('Nenhum número vendido para esta campanha.')
+
+        reveal_from = timezone.now() + timedelta(seconds=settings.DRAW_BEACON_DELAY_SECONDS)
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    raffle=raffle,
+                    beacon_round=beacon.round_at(reveal_from) + 1,
+                    eligible_count=eligible_count,
+                    sold_hash=sold_hash,
+                    sold_counts=sold_counts,
+                    grid_version=grid_version,
+                    created_by=user
+                )
+        except IntegrityError:
+            raise ValidationError('Já existe um compromisso aberto para esta campanha.')
+
+    def winner_at(self, ordinal):
+        """(number, user_id) of the sold number at `ordinal`
+
+        Only the range of RANGE_SIZE numbers holding that position is read.
+        Draws without sold_counts (made before it existed) scan from the start.
+        """
+        numbers = self.eligible_numbers(self.raffle).values_list('number', 'user_id')
+        if not self.sold_counts:
+            return numbers[ordinal]
+
+        index = bisect.bisect_right(self.sold_counts, ordinal)
+        before = self.sold_counts[index - 1] if index else 0
+        first = index * self.RANGE_SIZE
+        return numbers.filter(number__gte=first, number__lt=first + self.RANGE_SIZE)[ordinal - before]
+
+    def reveal(self):
+        """Fetch the beacon round and pick the winner
+
+        Refused until the round is published. If the sold set is no longer
+        the one of the commitment, the draw is voided (a new commitment is
+        needed) and ValidationError is raised.
+        """
+        if self.status != self.Status.COMMITTED:
+            raise ValidationError('Este sorteio não está aguardando revelação.')
+
+        reveal_after = self.reveal_after
+        if timezone.now() < reveal_after:
+            local_time = timezone.localtime(reveal_after).strftime('%H:%M:%S')
+            raise ValidationError(
+                f'O sorteio usa a rodada {self.beacon_round} do beacon, publicada às {local_time}. Aguarde.'
+            )
+
+        # Antes de qualquer trava: não segurar a rifa durante a chamada HTTP
+        try:
+            pulse = beacon.fetch_round(self.beacon_round)
+        except beacon.BeaconError as e:
+            raise ValidationError(f'Beacon indisponível, tente novamente: {e}')
+
+        # Compromissos sem versão do grid (anteriores a ela): conferir o hash, também fora da trava
+        unchanged = None
+        if self.grid_version is None:
+            unchanged = self.sold_set_digest(self.raffle) == (self.eligible_count, self.sold_hash)
+
+        with transaction.atomic():
+            draw = RaffleDraw.objects.select_for_update().get(pk=self.pk)
+            if draw.status != self.Status.COMMITTED:
+                raise ValidationError('Este sorteio não está aguardando revelação.')
+
+            # Qualquer mudança de status de um número desde o compromisso avança a versão
+            if unchanged is None:
+                unchanged = GridChange.sequence(self.raffle_id) == draw.grid_version
+
+            if not unchanged:
+                self.status = self.Status.VOID
+                self.void_reason = 'Números vendidos mudaram depois do compromisso. Gere um novo compromisso.'
+                self.save(update_fields=['status', 'void_reason'])
+            else:
+                ordinal = self.compute_ordinal(pulse['randomness'], self.raffle_id, draw.eligible_count, draw.sold_hash)
+                number, winner_id = self.winner_at(ordinal)
+
+                self.status = self.Status.REVEALED
+                self.randomness = pulse['randomness']
+                self.signature = pulse['signature']
+                self.ordinal = ordinal
+                self.winner_number = number
+                self.winner_id = winner_id
+                self.revealed_at = timezone.now()
+                self.save(update_fields=[
+                    'status', 'randomness', 'signature', 'ordinal', 'winner_number', 'winner', 'revealed_at'
+                ])
+
+        if self.status == self.Status.VOID:
+            raise ValidationError(self.void_reason)
+        return self
+
+    def randomness_is_signature_hash(self):
+        """Whether the randomness is the SHA-256 of the stored beacon signature
+
+        None for draws without a signature. This is not a BLS verification of
+        the signature against the drand chain key.
+        """
+        if not self.signature:
+            return None
+        try:
+            return hashlib.sha256(bytes.fromhex(self.signature)).hexdigest() == self.randomness
+        except ValueError:
+            return False
+
+    def verify(self):
+        """Replay the draw from the published randomness
+
+        Returns a dict of checks. The winner can only be replayed while the
+        sold numbers are the same as at the commitment. This is an audit: it
+        reads the whole sold set again, but takes no lock.
+
+        `randomness_is_signature_hash` only checks that the randomness is the
+        SHA-256 of the stored signature. The BLS signature itself is not
+        verified here (that needs a drand client and the chain public key).
+        """
+        if self.status != self.Status.REVEALED:
+            return {'revealed': False}
+
+        checks = {
+            'revealed': True,
+            'randomness_is_signature_hash': None,
+            'ordinal_matches': self.compute_ordinal(
+                self.randomness, self.raffle_id, self.eligible_count, self.sold_hash
+            ) == self.ordinal,
+            'winner_matches': None,
+        }
+        checks['randomness_is_signature_hash'] = self.randomness_is_signature_hash()
+
+        eligible_count, sold_hash = self.sold_set_digest(self.raffle)
+        if eligible_count == self.eligible_count and (not self.sold_hash or sold_hash == self.sold_hash):
+            number, _ = self.winner_at(self.ordinal)
+            checks['winner_matches'] = number == self.winner_number
+        return checks
@@ -1,22 +1,36 @@
+import logging
+
 from rest_framework import serializers
 from .models import Raffle, RaffleOrder, RaffleNumber, Referral
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
 
 
 class RaffleSerializer(serializers.ModelSerializer):
     """Serializer for Raffle listing"""
+    prize_image_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Raffle
         fields = [
             'id', 'name', 'description',
-            'prize_name', 'prize_description', 'prize_image_base64',
+            'prize_name', 'prize_description', 'prize_image_url',
             'total_numbers', 'price_per_number',
             'numbers_sold', 'numbers_available',
             'status', 'draw_date', 'created_at'
         ]
         read_only_fields = fields
 
+    def get_prize_image_url(self, obj):
+        """Content-hashed image URL instead of the inline Base64 payload"""
+        url = obj.prize_image_url
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
 
 class RaffleNumberSerializer(serializers.ModelSerializer):
     """Serializer for RaffleNumber"""
@@ -59,15 +73,13 @@ class RaffleOrderSerializer(serializers.ModelSerializer):
             # Refresh from database to get updated counts
             raffle.refresh_from_db()
 
-        # Release expired reservations before checking availability
-        raffle.release_expired_reservations()
-        raffle.refresh_from_db()
+        # Expired reservations are released by the run_reservation_expiry worker
 
         # Get current availability
         available = raffle.numbers_available
         requested = data['quantity']
-        
-        print(f"DEBUG: Raffle '{raffle.name}' - Total: {raffle.total_numbers}, Sold: {raffle.numbers_sold}, Reserved: {raffle.numbers_reserved}, Available: {available}, Requested: {requested}")
+
+        logger.debug('Rifa %s: %d disponíveis, %d solicitados', raffle.pk, available, requested)
 
         # Check if there are enough numbers
         if available < requested:
@@ -85,35 +97,45 @@ class RaffleOrderSerializer(serializers.ModelSerializer):
 
         # Check if there's a referral code
         referral_code = self.context.get('referral_code')
-        print(f"🛒 DEBUG: Creating order for user {user.name}, referral_code: {referral_code}")
-
-        order = super().create(validated_data)
+        logger.debug('Criando pedido do usuário %s, código de indicação: %s', user.pk, referral_code)
 
-        # Allocate numbers (may raise Django ValidationError in race conditions)
+        # Allocate numbers (raises Django ValidationError when the raffle sold out
+        # while this request was running). Rows are claimed with row locks, so
+        # concurrent orders never get the same number; on failure the order is
+        # rolled back together with the allocation.
         try:
-            order.allocate_numbers()
+            with transaction.atomic():
+                order = super().create(validated_data)
+                order.allocate_numbers()
         except DjangoValidationError as e:
             # Convert to DRF serializer ValidationError so caller receives 400
             raise serializers.ValidationError(str(e))
 
         # Handle referral if present
         if referral_code:
-            print(f"🎁 DEBUG: Processing referral code: {referral_code}")
+            logger.debug('Processando código de indicação %s', referral_code)
             try:
                 referral = Referral.objects.get(code=referral_code, raffle=order.raffle)
-                print(f"📋 DEBUG: Referral found - status={referral.status}, inviter={referral.inviter.name}")
+                logger.debug('Indicação %s encontrada, status %s', referral_code, referral.status)
                 
                 if referral.status == Referral.Status.PENDING:
-                    print(f"🎯 DEBUG: Redeeming referral for user {user.name}")
+                    logger.debug('Resgatando indicação %s para o usuário %s', referral_code, user.pk)
                     referral.redeem(user)
                     # Store referral in order for later bonus allocation
                     order.referral_code = referral_code
                     order.save(update_fields=['referral_code'])
-                    print(f"✅ DEBUG: Referral redeemed and stored in order")
+                    logger.debug('Indicação %s resgatada no pedido %s', referral_code, order.pk)
                 else:
-                    print(f"⚠️  DEBUG: Referral status is {referral.status}, not PENDING")
+                    logger.info('Indicação %s com status %s, não está pendente', referral_code, referral.status)
             except Referral.DoesNotExist:
-                print(f"❌ DEBUG: Referral code {referral_code} not found")
+                logger.info('Código de indicação %s não encontrado', referral_code)
+
+        # Funil de conversão: pedido criado, com o código de indicação resgatado
+        # (depois do commit, fora da transação da compra)
+        from analytics.models import ConversionFunnel
+        transaction.on_commit(
+            lambda: ConversionFunnel.add(order.raffle_id, order.created_at, order.referral_code, orders=1)
+        )
 
         return order
 
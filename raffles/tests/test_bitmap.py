@@ -0,0 +1,85 @@
+import random
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+
+from raffles.bitmap import (
+    clear_bits, count_bits, empty_bitmap, is_set, select_set_bits, set_bits, set_range
+)
+from raffles.models import Raffle, RaffleNumberBlock
+
+
+class BitmapHelpersTests(SimpleTestCase):
+
+    def test_set_range_handles_unaligned_edges(self):
+        bitmap = empty_bitmap(40)
+        self.assertEqual(set_range(bitmap, 3, 29), 26)
+        self.assertEqual([p for p in range(40) if is_set(bitmap, p)], list(range(3, 29)))
+        # Reaplicar não liga nada novo
+        self.assertEqual(set_range(bitmap, 0, 10), 3)
+
+    def test_set_and_clear_report_only_changed_bits(self):
+        bitmap = empty_bitmap(16)
+        self.assertEqual(set_bits(bitmap, [1, 5, 5, 9]), 3)
+        self.assertEqual(clear_bits(bitmap, [5, 6]), 1)
+        self.assertEqual(count_bits(bitmap), 2)
+
+    def test_select_matches_a_linear_scan(self):
+        rng = random.Random(7)
+        bitmap = empty_bitmap(1000)
+        set_bits(bitmap, rng.sample(range(1000), 300))
+        positions = [p for p in range(1000) if is_set(bitmap, p)]
+
+        ranks = sorted(rng.sample(range(300), 40))
+        self.assertEqual(select_set_bits(bitmap, ranks), [positions[rank] for rank in ranks])
+        self.assertEqual(select_set_bits(bitmap, [0, 299]), [positions[0], positions[-1]])
+
+
+@mock.patch.object(RaffleNumberBlock, 'BLOCK_SIZE', 16)
+class NumberBlockTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=50,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+
+    def free_numbers(self):
+        numbers = []
+        for block in RaffleNumberBlock.objects.filter(raffle=self.raffle):
+            bitmap = bytes(block.bitmap)
+            numbers += [block.first_number + p for p in range(16) if is_set(bitmap, p)]
+        return sorted(numbers)
+
+    def test_build_splits_the_raffle_into_blocks(self):
+        RaffleNumberBlock.build(self.raffle, 50, unavailable=[1, 17, 50])
+
+        counts = list(RaffleNumberBlock.objects.filter(raffle=self.raffle).values_list('index', 'free_count'))
+        self.assertEqual(counts, [(0, 15), (1, 15), (2, 16), (3, 1)])
+        self.assertEqual(self.free_numbers(), [n for n in range(1, 50) if n not in (1, 17)])
+
+    def test_random_take_spans_blocks_without_repeating(self):
+        RaffleNumberBlock.build(self.raffle, 50)
+
+        taken = RaffleNumberBlock.take_random_numbers(self.raffle, 45)
+        self.assertEqual(len(set(taken)), 45)
+        self.assertTrue(all(1 <= n <= 50 for n in taken))
+        self.assertEqual(sorted(taken + self.free_numbers()), list(range(1, 51)))
+
+        with self.assertRaises(ValidationError):
+            RaffleNumberBlock.take_random_numbers(self.raffle, 6)
+
+    def test_specific_take_and_release_round_trip(self):
+        RaffleNumberBlock.build(self.raffle, 50, unavailable=[3])
+
+        self.assertEqual(RaffleNumberBlock.take_specific_numbers(self.raffle, [3, 4, 40]), [4, 40])
+        RaffleNumberBlock.release_numbers(self.raffle, [3, 4, 40])
+        self.assertEqual(self.free_numbers(), list(range(1, 51)))
+
+    def test_add_range_frees_the_new_numbers(self):
+        RaffleNumberBlock.build(self.raffle, 50)
+        RaffleNumberBlock.add_range(self.raffle, 51, 71)
+
+        self.assertEqual(self.free_numbers(), list(range(1, 71)))
+        self.assertEqual(RaffleNumberBlock.objects.filter(raffle=self.raffle).count(), 5)
@@ -0,0 +1,248 @@
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import User
+from raffles.models import CampaignStats, PrizeNumber, Raffle, RaffleCounterShard, RaffleNumber, RaffleOrder
+
+
+def make_raffle(total_numbers=100, **kwargs):
+    raffle = Raffle.objects.create(
+        name='Campanha', prize_name='Moto', total_numbers=total_numbers,
+        price_per_number=2, status=Raffle.Status.ACTIVE, **kwargs
+    )
+    raffle.initialize_numbers()
+    return raffle
+
+
+class ShardedCountersTests(TestCase):
+
+    def setUp(self):
+        self.raffle = make_raffle()
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+
+    def buy(self, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+        order.allocate_numbers()
+        return order
+
+    def test_transitions_go_to_the_shards_not_the_raffle_row(self):
+        order = self.buy(5)
+        order.mark_as_paid()
+
+        row = Raffle.objects.values('sold_count', 'reserved_count').get(pk=self.raffle.pk)
+        self.assertEqual(row, {'sold_count': 0, 'reserved_count': 0})
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual((raffle.numbers_sold, raffle.numbers_reserved, raffle.numbers_available), (5, 0, 95))
+        self.assertEqual(RaffleCounterShard.objects.filter(raffle=raffle).count(), RaffleCounterShard.SHARDS)
+
+    def test_expiry_gives_the_reservation_back(self):
+        self.buy(4)
+        RaffleNumber.objects.filter(raffle=self.raffle).update(reserved_expires_at=timezone.now() - timedelta(minutes=1))
+
+        RaffleNumber.release_expired()
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual((raffle.numbers_sold, raffle.numbers_reserved), (0, 0))
+
+    def test_stats_add_the_shard_deltas(self):
+        self.buy(3).mark_as_paid()
+        self.buy(2).mark_as_paid()
+
+        stats = CampaignStats.for_raffle(Raffle.objects.get(pk=self.raffle.pk))
+        self.assertEqual((stats.revenue, stats.paid_orders, stats.unique_buyers), (Decimal('10'), 2, 1))
+        # A linha em si só guarda a última recontagem
+        self.assertEqual(CampaignStats.objects.get(raffle=self.raffle).paid_orders, 0)
+
+    def test_recount_folds_the_shards(self):
+        self.buy(3).mark_as_paid()
+        self.buy(2)
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        raffle.recalculate_counters()
+        stats = CampaignStats.rebuild(raffle)
+
+        self.assertEqual((raffle.sold_count, raffle.reserved_count), (3, 2))
+        self.assertEqual((raffle.numbers_sold, raffle.numbers_reserved), (3, 2))
+        self.assertEqual(stats.paid_orders, 1)
+        totals = RaffleCounterShard.totals(raffle.pk)
+        self.assertTrue(all(value == 0 for value in totals.values()))
+
+    def test_prefetched_shards_are_summed_without_a_query(self):
+        self.buy(3).mark_as_paid()
+        self.buy(2)
+        make_raffle(total_numbers=10)
+
+        raffles = list(Raffle.objects.prefetch_related('counter_shards').order_by('pk'))
+        with self.assertNumQueries(0):
+            counts = [(raffle.numbers_sold, raffle.numbers_reserved) for raffle in raffles]
+        self.assertEqual(counts, [(3, 2), (0, 0)])
+
+        # Uma recontagem zera as fatias: as carregadas antes não valem mais
+        raffles[0].recalculate_counters()
+        self.assertEqual((raffles[0].numbers_sold, raffles[0].numbers_reserved), (3, 2))
+
+    def test_funnel_is_updated_after_commit(self):
+        from analytics.models import ConversionFunnel
+
+        order = self.buy(2)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order.mark_as_paid()
+            self.assertFalse(ConversionFunnel.objects.filter(paid_orders__gt=0).exists())
+
+        # Funil e versão do grid
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(ConversionFunnel.objects.get(raffle=self.raffle).paid_orders, 1)
+
+
+class RaffleCountersTests(TestCase):
+    """The counters follow every transition without counting the number rows"""
+
+    def setUp(self):
+        self.raffle = make_raffle(total_numbers=30)
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+
+    def buy(self, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+        order.allocate_numbers()
+        return order
+
+    def row_counts(self):
+        numbers = RaffleNumber.objects.filter(raffle=self.raffle)
+        return (
+            numbers.filter(status=RaffleNumber.Status.SOLD).count(),
+            numbers.filter(status=RaffleNumber.Status.RESERVED).count(),
+        )
+
+    def test_counters_match_the_rows_after_mixed_transitions(self):
+        self.buy(4).mark_as_paid()
+        self.buy(3)
+        expired = self.buy(5)
+        expired.allocated_numbers.update(reserved_expires_at=timezone.now() - timedelta(minutes=1))
+        RaffleNumber.release_expired()
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        with self.assertNumQueries(1):
+            counters = (raffle.numbers_sold, raffle.numbers_reserved, raffle.numbers_available)
+        self.assertEqual(counters, (4, 3, 23))
+        self.assertEqual(self.row_counts(), (4, 3))
+
+    def test_repair_command_fixes_drift(self):
+        self.buy(2).mark_as_paid()
+        Raffle.objects.filter(pk=self.raffle.pk).update(sold_count=10, reserved_count=7)
+
+        out = StringIO()
+        call_command('repair_raffle_counters', '--raffle', str(self.raffle.pk), stdout=out)
+
+        self.assertIn('vendidos 12 → 2', out.getvalue())
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual((raffle.numbers_sold, raffle.numbers_reserved), (2, 0))
+
+
+class CampaignStatsTests(TestCase):
+    """Incremental totals always agree with a recount from the orders"""
+
+    FIELDS = ('revenue', 'paid_orders', 'unique_buyers', 'prize_numbers', 'prizes_won', 'referrals_redeemed', 'referral_bonus_numbers')
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=40,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        PrizeNumber.objects.create(
+            raffle=self.raffle, number=7, prize_amount=Decimal('50'),
+            release_percentage_min=Decimal('0'), release_percentage_max=Decimal('100')
+        )
+        self.raffle.initialize_numbers()
+        self.ana = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.bia = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='2')
+
+    def buy(self, user, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=user, quantity=quantity, amount=2 * quantity)
+        order.raffle = Raffle.objects.get(pk=self.raffle.pk)
+        order.allocate_numbers()
+        return order
+
+    def snapshot(self, stats):
+        return {field: getattr(stats, field) for field in self.FIELDS}
+
+    def test_incremental_totals_match_a_rebuild(self):
+        self.buy(self.ana, 3).mark_as_paid()
+        self.buy(self.ana, 2).mark_as_paid()
+        self.buy(self.bia, 4).mark_as_paid()
+        self.buy(self.bia, 6)
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        incremental = self.snapshot(CampaignStats.for_raffle(raffle))
+        self.assertEqual(
+            (incremental['revenue'], incremental['paid_orders'], incremental['unique_buyers'], incremental['prizes_won']),
+            (Decimal('18'), 3, 2, 1)
+        )
+        self.assertEqual(self.snapshot(CampaignStats.rebuild(raffle)), incremental)
+        self.assertEqual(self.snapshot(CampaignStats.for_raffle(Raffle.objects.get(pk=raffle.pk))), incremental)
+
+    def test_rebuild_command_creates_missing_rows(self):
+        self.buy(self.ana, 2).mark_as_paid()
+        CampaignStats.objects.all().delete()
+
+        call_command('rebuild_campaign_stats', stdout=StringIO())
+
+        self.assertEqual(CampaignStats.objects.get(raffle=self.raffle).paid_orders, 1)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'locks de linha exigem PostgreSQL')
+class ConcurrentBuyersTests(TransactionTestCase):
+
+    def test_two_buyers_do_not_wait_on_each_other(self):
+        # Vários blocos no índice: cada comprador trava o seu
+        raffle = make_raffle(total_numbers=3 * 8192, sparse_numbers=True)
+        users = [
+            User.objects.create_user(email=f'{name}@a.com', password='x', name=name, whatsapp=str(i))
+            for i, name in enumerate(['ana', 'bia'])
+        ]
+        orders = [
+            RaffleOrder.objects.create(raffle=raffle, user=user, quantity=10, amount=20)
+            for user in users
+        ]
+
+        first_allocated = threading.Event()
+        second_done = threading.Event()
+        errors = []
+
+        def first_buyer():
+            try:
+                with transaction.atomic():
+                    orders[0].allocate_numbers()
+                    first_allocated.set()
+                    # Segura a transação aberta até o segundo comprador terminar
+                    second_done.wait(10)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                first_allocated.set()
+                connection.close()
+
+        thread = threading.Thread(target=first_buyer)
+        thread.start()
+        self.assertTrue(first_allocated.wait(10))
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = '2s'")
+                orders[1].allocate_numbers()
+        finally:
+            second_done.set()
+            thread.join()
+
+        self.assertEqual(errors, [])
+        raffle = Raffle.objects.get(pk=raffle.pk)
+        self.assertEqual(raffle.numbers_reserved, 20)
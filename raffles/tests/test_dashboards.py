@@ -0,0 +1,167 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from raffles.models import Raffle, RaffleOrder
+from raffles.views import _buyer_ranking, _decode_buyer_cursor
+
+
+def make_raffle(name, total_numbers=50):
+    raffle = Raffle.objects.create(
+        name=name, prize_name='Moto', total_numbers=total_numbers,
+        price_per_number=2, status=Raffle.Status.ACTIVE
+    )
+    raffle.initialize_numbers()
+    return raffle
+
+
+def buy(raffle, user, quantity, pay=True):
+    order = RaffleOrder.objects.create(raffle=raffle, user=user, quantity=quantity, amount=2 * quantity)
+    order.allocate_numbers()
+    if pay:
+        order.mark_as_paid()
+    return order
+
+
+class AdminDashboardTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(email='admin@a.com', password='x', name='Admin', whatsapp='9', is_staff=True)
+        self.buyers = [
+            User.objects.create_user(email=f'{n}@a.com', password='x', name=n, whatsapp=str(i))
+            for i, n in enumerate(['Ana', 'Bia', 'Caio'])
+        ]
+        self.client.force_login(self.staff)
+
+    def add_campaign(self, name):
+        raffle = make_raffle(name)
+        buy(raffle, self.buyers[0], 3)
+        buy(raffle, self.buyers[1], 2)
+        buy(raffle, self.buyers[2], 1, pay=False)
+        return raffle
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_totals_per_campaign(self):
+        self.add_campaign('Campanha')
+
+        response, _ = self.dashboard_queries()
+
+        [item] = response.context['campaigns_stats']
+        self.assertEqual((item['numbers_sold'], item['numbers_reserved'], item['numbers_available']), (5, 1, 44))
+        self.assertEqual((item['total_revenue'], item['unique_buyers']), (10, 2))
+        self.assertEqual(response.context['total_buyers'], 2)
+
+    def test_query_count_does_not_grow_with_the_campaigns(self):
+        self.add_campaign('Primeira')
+        # Primeira requisição aquece os caches (configuração do site, sessão)
+        self.dashboard_queries()
+        _, one_campaign = self.dashboard_queries()
+
+        for name in ('Segunda', 'Terceira', 'Quarta'):
+            self.add_campaign(name)
+        response, four_campaigns = self.dashboard_queries()
+
+        self.assertEqual(len(response.context['campaigns_stats']), 4)
+        self.assertEqual(one_campaign, four_campaigns)
+
+
+class BuyerRankingTests(TestCase):
+
+    def setUp(self):
+        self.raffle = make_raffle('Campanha')
+        self.ana, self.bia, self.caio = [
+            User.objects.create_user(email=f'{n}@a.com', password='x', name=n, whatsapp=str(i))
+            for i, n in enumerate(['Ana', 'Bia', 'Caio'])
+        ]
+        buy(self.raffle, self.ana, 2)
+        buy(self.raffle, self.bia, 5)
+        buy(self.raffle, self.caio, 1)
+        buy(self.raffle, self.caio, 3)
+        buy(self.raffle, self.ana, 10, pay=False)
+
+    def ranking(self, filter_by, after=None):
+        rows, cursor = _buyer_ranking(self.raffle, filter_by, after=after, limit=2)
+        return [(row['user'].name, row['total_quantity']) for row in rows], cursor
+
+    def test_pages_follow_the_cursor_without_repeats(self):
+        first, cursor = self.ranking('total_amount')
+        self.assertEqual(first, [('Bia', 5), ('Caio', 4)])
+
+        second, cursor = self.ranking('total_amount', after=_decode_buyer_cursor(cursor))
+        self.assertEqual(second, [('Ana', 2)])
+        self.assertIsNone(cursor)
+
+    def test_a_page_costs_two_queries(self):
+        # Ranking agregado + usuários da página, qualquer que seja o número de compradores
+        with self.assertNumQueries(2):
+            _buyer_ranking(self.raffle, 'successful_referrals')
+
+    def test_name_order_is_ascending(self):
+        names, _ = self.ranking('name')
+        self.assertEqual(names, [('Ana', 2), ('Bia', 5)])
+
+    def test_view_lists_the_paid_buyers(self):
+        staff = User.objects.create_user(email='admin@a.com', password='x', name='Admin', whatsapp='9', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('campaign_details', args=[self.raffle.pk])
+
+        response = self.client.get(url)
+        self.assertEqual([row['user'].name for row in response.context['buyers_list']], ['Bia', 'Caio', 'Ana'])
+        self.assertEqual(response.context['total_buyers'], 3)
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class RaffleListsTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_superuser(email='admin@a.com', password='x', name='Admin', whatsapp='9')
+        self.buyer = User.objects.create_user(email='ana@a.com', password='x', name='Ana', whatsapp='1')
+
+    def add_campaign(self, name):
+        raffle = make_raffle(name)
+        buy(raffle, self.buyer, 3)
+        buy(raffle, self.buyer, 2, pay=False)
+        return raffle
+
+    def count_queries(self, get):
+        get()
+        with CaptureQueriesContext(connection) as queries:
+            response = get()
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_admin_changelist_does_not_query_per_row(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:raffles_raffle_changelist')
+        self.add_campaign('Primeira')
+        _, one_campaign = self.count_queries(lambda: self.client.get(url))
+
+        for name in ('Segunda', 'Terceira', 'Quarta'):
+            self.add_campaign(name)
+        response, four_campaigns = self.count_queries(lambda: self.client.get(url))
+
+        self.assertContains(response, 'R$ 6.00', count=4)
+        self.assertEqual(one_campaign, four_campaigns)
+
+    def test_api_list_does_not_query_per_raffle(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        self.add_campaign('Primeira')
+        _, one_campaign = self.count_queries(lambda: client.get('/api/raffles/'))
+
+        for name in ('Segunda', 'Terceira', 'Quarta'):
+            self.add_campaign(name)
+        response, four_campaigns = self.count_queries(lambda: client.get('/api/raffles/'))
+
+        self.assertEqual([item['numbers_sold'] for item in response.json()['results']], [3] * 4)
+        self.assertEqual([item['numbers_available'] for item in response.json()['results']], [45] * 4)
+        self.assertEqual(one_campaign, four_campaigns)
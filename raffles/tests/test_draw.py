@@ -0,0 +1,235 @@
+import hashlib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from raffles import beacon
+from raffles.models import GridChange, Raffle, RaffleDraw, RaffleNumber
+
+
+def fake_round(round_number):
+    signature = hashlib.sha256(f'assinatura-{round_number}'.encode()).hexdigest() * 3
+    return {
+        'round': round_number,
+        'randomness': hashlib.sha256(bytes.fromhex(signature)).hexdigest(),
+        'signature': signature,
+    }
+
+
+@override_settings(DRAW_BEACON_DELAY_SECONDS=300)
+class RaffleDrawTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.ana = User.objects.create_user(email='ana@a.com', password='x', name='Ana', whatsapp='1')
+        self.bia = User.objects.create_user(email='bia@a.com', password='x', name='Bia', whatsapp='2')
+        for number in range(10):
+            RaffleNumber.objects.create(
+                raffle=self.raffle, number=number, status=RaffleNumber.Status.SOLD,
+                user=self.ana if number % 2 else self.bia
+            )
+
+    def reveal_later(self, draw, **fetch):
+        later = draw.reveal_after + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later), \
+                mock.patch('raffles.beacon.fetch_round', side_effect=fake_round, **fetch):
+            return draw.reveal()
+
+    def test_commit_freezes_sales_and_picks_a_future_round(self):
+        before = timezone.now()
+        draw = RaffleDraw.commit(self.raffle)
+
+        self.raffle.refresh_from_db()
+        self.assertEqual(self.raffle.status, Raffle.Status.FINISHED)
+        self.assertEqual(draw.eligible_count, 10)
+        self.assertEqual((10, draw.sold_hash), RaffleDraw.sold_set_digest(self.raffle))
+        self.assertEqual((draw.sold_counts, draw.grid_version), ([10], 0))
+        self.assertGreater(draw.beacon_round, beacon.round_at(before + timedelta(seconds=300)))
+        self.assertEqual(draw.randomness, '')
+
+    def test_only_one_open_commitment(self):
+        RaffleDraw.commit(self.raffle)
+        with self.assertRaises(ValidationError):
+            RaffleDraw.commit(self.raffle)
+        with self.assertRaises(IntegrityError):
+            RaffleDraw.objects.create(raffle=self.raffle, status=RaffleDraw.Status.COMMITTED)
+
+    def test_commit_refused_with_pending_reservations(self):
+        RaffleNumber.objects.create(raffle=self.raffle, number=50, status=RaffleNumber.Status.RESERVED, user=self.ana)
+        with self.assertRaises(ValidationError):
+            RaffleDraw.commit(self.raffle)
+        self.raffle.refresh_from_db()
+        self.assertEqual(self.raffle.status, Raffle.Status.ACTIVE)
+
+    @mock.patch('raffles.beacon.fetch_round')
+    def test_reveal_refused_before_the_round(self, fetch):
+        draw = RaffleDraw.commit(self.raffle)
+        with self.assertRaises(ValidationError):
+            draw.reveal()
+        fetch.assert_not_called()
+        draw.refresh_from_db()
+        self.assertEqual(draw.status, RaffleDraw.Status.COMMITTED)
+
+    def test_reveal_picks_the_replayable_winner(self):
+        draw = self.reveal_later(RaffleDraw.commit(self.raffle))
+
+        self.assertEqual(draw.status, RaffleDraw.Status.REVEALED)
+        pulse = fake_round(draw.beacon_round)
+        ordinal = RaffleDraw.compute_ordinal(pulse['randomness'], self.raffle.id, 10, draw.sold_hash)
+        self.assertEqual(draw.ordinal, ordinal)
+        self.assertEqual(draw.winner_number, ordinal)
+        self.assertEqual(draw.winner, self.ana if ordinal % 2 else self.bia)
+        self.assertEqual(draw.verify(), {
+            'revealed': True,
+            'randomness_is_signature_hash': True,
+            'ordinal_matches': True,
+            'winner_matches': True,
+        })
+
+    def test_changed_sold_set_voids_the_draw(self):
+        draw = RaffleDraw.commit(self.raffle)
+        # Mesma quantidade, outro dono: toda transição passa por update_counters e avança a versão do grid
+        with self.captureOnCommitCallbacks(execute=True):
+            RaffleNumber.objects.filter(raffle=self.raffle, number=0).update(user=self.ana)
+            Raffle.update_counters(self.raffle, changes={RaffleNumber.Status.SOLD: [0]})
+
+        with self.assertRaises(ValidationError):
+            self.reveal_later(draw)
+
+        draw.refresh_from_db()
+        self.assertEqual(draw.status, RaffleDraw.Status.VOID)
+        self.assertIsNone(draw.winner_number)
+        # Um novo compromisso pode ser publicado
+        RaffleDraw.commit(self.raffle)
+
+    def test_reveal_does_not_read_the_sold_set_again(self):
+        draw = RaffleDraw.commit(self.raffle)
+
+        with mock.patch.object(RaffleDraw, 'sold_set_summary', side_effect=AssertionError('leu os vendidos')):
+            draw = self.reveal_later(draw)
+
+        self.assertEqual(draw.status, RaffleDraw.Status.REVEALED)
+
+    def test_beacon_is_fetched_before_any_lock(self):
+        draw = RaffleDraw.commit(self.raffle)
+        calls = []
+        select_for_update = QuerySet.select_for_update
+
+        def fetch(round_number):
+            calls.append('beacon')
+            return fake_round(round_number)
+
+        def lock(queryset, *args, **kwargs):
+            calls.append('trava')
+            return select_for_update(queryset, *args, **kwargs)
+
+        later = draw.reveal_after + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later), \
+                mock.patch('raffles.beacon.fetch_round', side_effect=fetch), \
+                mock.patch.object(QuerySet, 'select_for_update', lock):
+            draw.reveal()
+
+        self.assertEqual(calls[0], 'beacon')
+        self.assertIn('trava', calls)
+
+    def test_verify_command_says_what_it_checks(self):
+        draw = self.reveal_later(RaffleDraw.commit(self.raffle))
+        out = StringIO()
+
+        call_command('verify_raffle_draw', str(draw.pk), stdout=out)
+
+        self.assertIn('✅ Aleatoriedade é o SHA-256 da assinatura do beacon', out.getvalue())
+        self.assertIn('A assinatura BLS não é verificada', out.getvalue())
+
+    def test_winner_is_found_in_its_range(self):
+        RaffleNumber.objects.filter(raffle=self.raffle, number__in=[2, 3, 5]).delete()
+        RaffleNumber.objects.create(raffle=self.raffle, number=17, status=RaffleNumber.Status.SOLD, user=self.ana)
+        sold = list(RaffleDraw.eligible_numbers(self.raffle).values_list('number', 'user_id'))
+
+        with mock.patch.object(RaffleDraw, 'RANGE_SIZE', 4):
+            draw = RaffleDraw.commit(self.raffle)
+            winners = [draw.winner_at(ordinal) for ordinal in range(len(sold))]
+
+        # Faixas 0-3, 4-7, 8-11, 12-15 (vazia) e 16-19
+        self.assertEqual(draw.sold_counts, [2, 5, 7, 7, 8])
+        self.assertEqual(winners, sold)
+
+    def test_commit_retries_when_numbers_change_while_reading(self):
+        summary = RaffleDraw.sold_set_summary
+
+        def sale_during_read(raffle):
+            GridChange.record(raffle.pk, {RaffleNumber.Status.SOLD: [42]})
+            return summary(raffle)
+
+        with mock.patch.object(RaffleDraw, 'sold_set_summary', side_effect=sale_during_read):
+            with self.assertRaises(ValidationError):
+                RaffleDraw.commit(self.raffle)
+        self.assertFalse(RaffleDraw.objects.exists())
+
+        # Vendas já fechadas: a segunda tentativa lê um conjunto estável
+        self.assertEqual(RaffleDraw.commit(self.raffle).eligible_count, 10)
+
+    def test_beacon_failure_keeps_the_commitment(self):
+        draw = RaffleDraw.commit(self.raffle)
+        later = draw.reveal_after + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later), \
+                mock.patch('raffles.beacon.fetch_round', side_effect=beacon.BeaconError('fora do ar')):
+            with self.assertRaises(ValidationError):
+                draw.reveal()
+        draw.refresh_from_db()
+        self.assertEqual(draw.status, RaffleDraw.Status.COMMITTED)
+
+
+class RaffleDrawViewTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', slug='campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        staff = User.objects.create_user(email='s@a.com', password='x', name='Staff', whatsapp='3', is_staff=True)
+        RaffleNumber.objects.create(raffle=self.raffle, number=1, status=RaffleNumber.Status.SOLD, user=staff)
+        self.client.force_login(staff)
+        self.url = f'/sorteador/?raffle_id={self.raffle.id}'
+
+    @mock.patch('raffles.beacon.fetch_round', side_effect=fake_round)
+    def test_draw_without_commitment_is_refused(self, fetch):
+        self.client.post(self.url)
+        self.assertFalse(RaffleDraw.objects.exists())
+        fetch.assert_not_called()
+
+    @mock.patch('raffles.beacon.fetch_round', side_effect=fake_round)
+    def test_commit_and_draw_are_separate_requests(self, fetch):
+        self.client.post(self.url, {'action': 'commit'})
+        self.client.post(self.url)
+
+        draw = RaffleDraw.objects.get()
+        self.assertEqual(draw.status, RaffleDraw.Status.COMMITTED)
+        fetch.assert_not_called()
+
+
+class BeaconTests(TestCase):
+
+    def test_round_time_matches_round_at(self):
+        self.assertEqual(beacon.round_at(beacon.round_time(1000)), 1000)
+
+    @mock.patch('raffles.beacon.requests.get')
+    def test_fetch_rejects_randomness_not_derived_from_signature(self, get):
+        pulse = fake_round(7)
+        get.return_value.json.return_value = dict(pulse, randomness='0' * 64)
+        with self.assertRaises(beacon.BeaconError):
+            beacon.fetch_round(7)
+
+        get.return_value.json.return_value = pulse
+        self.assertEqual(beacon.fetch_round(7), pulse)
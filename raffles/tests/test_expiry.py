@@ -0,0 +1,193 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from raffles import heartbeat
+from raffles.models import Raffle, RaffleNumber, RaffleOrder
+
+
+def make_raffle(total_numbers=20):
+    raffle = Raffle.objects.create(
+        name='Campanha', prize_name='Moto', total_numbers=total_numbers,
+        price_per_number=2, status=Raffle.Status.ACTIVE
+    )
+    raffle.initialize_numbers()
+    return raffle
+
+
+class ReleaseExpiredTests(TestCase):
+
+    def setUp(self):
+        self.raffle = make_raffle()
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+
+    def buy(self, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+        order.allocate_numbers()
+        return order
+
+    def make_overdue(self, order):
+        past = timezone.now() - timedelta(minutes=20)
+        RaffleOrder.objects.filter(pk=order.pk).update(created_at=past)
+        order.allocated_numbers.update(reserved_expires_at=past)
+        order.refresh_from_db()
+
+    def status_of(self, order):
+        return RaffleOrder.objects.get(pk=order.pk).status
+
+    def test_releases_only_the_overdue_reservations(self):
+        late = self.buy(3)
+        on_time = self.buy(2)
+        self.make_overdue(late)
+
+        self.assertEqual(RaffleNumber.release_expired(), 3)
+
+        self.assertEqual(self.status_of(late), RaffleOrder.Status.EXPIRED)
+        self.assertEqual(self.status_of(on_time), RaffleOrder.Status.PENDING)
+        self.assertEqual(late.allocated_numbers.count(), 0)
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual((raffle.numbers_reserved, raffle.numbers_available), (2, 18))
+
+    def test_query_count_does_not_grow_with_the_reservations(self):
+        def release_queries(quantity):
+            order = self.buy(quantity)
+            self.make_overdue(order)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(RaffleNumber.release_expired(), quantity)
+            return len(queries)
+
+        self.assertEqual(release_queries(2), release_queries(15))
+
+    def test_each_raffle_gets_its_own_numbers_back(self):
+        other_raffle = make_raffle()
+        other = RaffleOrder.objects.create(raffle=other_raffle, user=self.user, quantity=4, amount=8)
+        other.allocate_numbers()
+        late = self.buy(2)
+        self.make_overdue(late)
+        self.make_overdue(other)
+
+        self.assertEqual(RaffleNumber.release_expired(), 6)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).numbers_available, 20)
+        self.assertEqual(Raffle.objects.get(pk=other_raffle.pk).numbers_available, 20)
+
+    def test_limit_keeps_the_order_pending_until_all_numbers_are_back(self):
+        late = self.buy(3)
+        self.make_overdue(late)
+
+        self.assertEqual(RaffleNumber.release_expired(limit=2), 2)
+        self.assertEqual(self.status_of(late), RaffleOrder.Status.PENDING)
+        self.assertEqual(RaffleNumber.release_expired(limit=2), 1)
+        self.assertEqual(self.status_of(late), RaffleOrder.Status.EXPIRED)
+
+    def test_overdue_is_read_only(self):
+        late = self.buy(2)
+        on_time = self.buy(2)
+        self.make_overdue(late)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(late.is_overdue())
+            self.assertFalse(on_time.is_overdue())
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.assertEqual(self.status_of(late), RaffleOrder.Status.PENDING)
+        self.assertEqual(late.allocated_numbers.count(), 2)
+
+    def test_next_expiry_is_the_earliest_deadline(self):
+        self.assertIsNone(RaffleNumber.next_expiry())
+        order = self.buy(1)
+        self.assertEqual(RaffleNumber.next_expiry(), order.created_at + RaffleNumber.PENDING_ORDER_TIMEOUT)
+
+        deadline = timezone.now() + timedelta(minutes=1)
+        order.allocated_numbers.update(reserved_expires_at=deadline)
+        self.assertEqual(RaffleNumber.next_expiry(), deadline)
+
+
+class RequestPathTests(TestCase):
+    """Requests only report an overdue reservation; the worker releases it"""
+
+    def setUp(self):
+        self.raffle = make_raffle(total_numbers=5)
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=5, amount=10)
+        self.order.allocate_numbers()
+        past = timezone.now() - timedelta(minutes=20)
+        RaffleOrder.objects.filter(pk=self.order.pk).update(created_at=past)
+        self.order.allocated_numbers.update(reserved_expires_at=past)
+
+    def assert_left_to_the_worker(self):
+        self.assertEqual(RaffleOrder.objects.get(pk=self.order.pk).status, RaffleOrder.Status.PENDING)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).numbers_reserved, 5)
+
+    def test_check_reservation_reports_the_expiry(self):
+        response = self.client.get(f'/api/raffles/{self.raffle.pk}/check-reservation/')
+
+        self.assertFalse(response.json()['has_reservation'])
+        self.assert_left_to_the_worker()
+
+    def test_reservation_status_reports_the_expiry(self):
+        response = self.client.get(f'/api/raffles/{self.raffle.pk}/reservation-status/', {'order_id': self.order.pk})
+
+        self.assertFalse(response.json()['has_active_reservation'])
+        self.assert_left_to_the_worker()
+
+    def test_purchase_does_not_release_overdue_reservations(self):
+        buyer = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='2')
+        self.client.force_authenticate(buyer)
+
+        response = self.client.post(f'/api/raffles/{self.raffle.pk}/buy/', {'quantity': 3}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assert_left_to_the_worker()
+
+        call_command('run_reservation_expiry', '--once', stdout=StringIO())
+        response = self.client.post(f'/api/raffles/{self.raffle.pk}/buy/', {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class WorkerHealthTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(WORKER_HEARTBEAT_DIR=directory.name, PROCESS_TYPE='expiry')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def healthcheck(self, **options):
+        call_command('healthcheck', stdout=StringIO(), **options)
+
+    def test_worker_that_never_ran_is_unhealthy(self):
+        self.assertIsNone(heartbeat.age(heartbeat.EXPIRY_WORKER))
+        with self.assertRaises(CommandError):
+            self.healthcheck()
+
+    def test_expiry_worker_beats_on_each_loop(self):
+        call_command('run_reservation_expiry', '--once', stdout=StringIO())
+
+        self.assertLess(heartbeat.age(heartbeat.EXPIRY_WORKER), 5)
+        self.healthcheck()
+
+    def test_stale_heartbeat_is_unhealthy(self):
+        heartbeat.beat(heartbeat.EXPIRY_WORKER)
+
+        with self.assertRaisesMessage(CommandError, heartbeat.EXPIRY_WORKER):
+            self.healthcheck(max_age=-1)
+
+    @override_settings(PROCESS_TYPE='whatsapp')
+    def test_each_process_type_checks_its_own_worker(self):
+        heartbeat.beat(heartbeat.EXPIRY_WORKER)
+
+        with self.assertRaisesMessage(CommandError, heartbeat.WHATSAPP_WORKER):
+            self.healthcheck()
+        heartbeat.beat(heartbeat.WHATSAPP_WORKER)
+        self.healthcheck()
@@ -0,0 +1,178 @@
+import base64
+import zlib
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from raffles.models import GridChange, Raffle, RaffleNumber, RaffleOrder
+
+
+class GridTestCase(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=20,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.raffle.initialize_numbers()
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.api = APIClient()
+        cache.clear()
+
+    def buy(self, quantity, pay=False):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.allocate_numbers()
+        if pay:
+            with self.captureOnCommitCallbacks(execute=True):
+                order.mark_as_paid()
+        return order
+
+    def numbers_of(self, order):
+        return sorted(order.allocated_numbers.values_list('number', flat=True))
+
+    def current_version(self):
+        return Raffle.objects.values_list('grid_version', flat=True).get(pk=self.raffle.pk)
+
+
+class GridChangeFeedTests(GridTestCase):
+
+    def changes(self, since):
+        response = self.api.get(f'/api/raffles/{self.raffle.pk}/grid-changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_versions_are_assigned_after_commit(self):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=3, amount=6)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            order.allocate_numbers()
+        self.assertEqual(self.current_version(), 0)
+        self.assertEqual(GridChange.objects.get(raffle=self.raffle).version, None)
+        # A reserva não trava a linha da rifa
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).reserved_count, 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.current_version(), 1)
+        self.assertEqual(GridChange.objects.get(raffle=self.raffle).version, 1)
+
+    def test_changes_since_return_the_final_status(self):
+        paid = self.buy(3, pay=True)
+        reserved = self.buy(2)
+
+        data = self.changes(0)
+
+        self.assertEqual(data['version'], 3)
+        self.assertFalse(data['full_reload'])
+        self.assertEqual(data['changes'], {
+            RaffleNumber.Status.SOLD: self.numbers_of(paid),
+            RaffleNumber.Status.RESERVED: self.numbers_of(reserved),
+        })
+        self.assertEqual(self.changes(2)['changes'], {RaffleNumber.Status.RESERVED: self.numbers_of(reserved)})
+        self.assertEqual(self.changes(3)['changes'], {})
+
+    def test_expired_numbers_come_back_as_available(self):
+        order = self.buy(4)
+        numbers = self.numbers_of(order)
+        RaffleNumber.objects.filter(raffle=self.raffle).update(reserved_expires_at=timezone.now() - timedelta(minutes=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RaffleNumber.release_expired()
+
+        self.assertEqual(self.changes(0)['changes'], {RaffleNumber.Status.AVAILABLE: numbers})
+
+    def test_gaps_and_unknown_versions_ask_for_a_reload(self):
+        self.buy(1)
+        self.buy(1)
+
+        self.assertTrue(self.changes(5)['full_reload'])
+        GridChange.objects.filter(version=1).delete()
+        self.assertTrue(self.changes(0)['full_reload'])
+        self.assertFalse(self.changes(1)['full_reload'])
+
+        Raffle.objects.filter(pk=self.raffle.pk).update(grid_version=GridChange.MAX_VERSIONS_BEHIND + 10)
+        self.assertTrue(self.changes(2)['full_reload'])
+
+    def test_leftover_changes_are_sequenced_by_the_next_transition(self):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=2, amount=4)
+        # O processo morreu antes do callback de commit
+        order.allocate_numbers()
+        self.assertEqual(self.current_version(), 0)
+
+        self.buy(1)
+
+        self.assertEqual(self.current_version(), 1)
+        self.assertFalse(GridChange.objects.filter(version__isnull=True).exists())
+
+    def test_invalid_since_is_rejected(self):
+        response = self.api.get(f'/api/raffles/{self.raffle.pk}/grid-changes/', {'since': 'abc'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_command_keeps_recent_changes(self):
+        self.buy(1)
+        self.buy(1)
+        GridChange.objects.filter(version=1).update(created_at=timezone.now() - timedelta(days=2))
+        out = StringIO()
+
+        call_command('prune_grid_changes', stdout=out)
+
+        self.assertIn('1 registro(s)', out.getvalue())
+        self.assertEqual(list(GridChange.objects.values_list('version', flat=True)), [2])
+
+
+class NumberGridTests(GridTestCase):
+
+    def grid(self, **headers):
+        return self.api.get(f'/api/raffles/{self.raffle.pk}/grid/', **headers)
+
+    def decode(self, payload):
+        packed = zlib.decompress(base64.b64decode(payload['grid']))
+        return [(packed[(n - 1) // 4] >> (2 * ((n - 1) % 4))) & 3 for n in range(1, payload['total_numbers'] + 1)]
+
+    def test_grid_packs_two_bits_per_number(self):
+        sold = self.numbers_of(self.buy(3, pay=True))
+        reserved = self.numbers_of(self.buy(2))
+
+        payload = self.grid().json()
+
+        self.assertEqual((payload['version'], payload['encoding']), (3, '2bit-zlib-base64'))
+        statuses = self.decode(payload)
+        self.assertEqual([n for n, code in enumerate(statuses, 1) if code == 2], sold)
+        self.assertEqual([n for n, code in enumerate(statuses, 1) if code == 1], reserved)
+        self.assertEqual(statuses.count(0), 15)
+
+    def test_unchanged_grid_is_not_sent_again(self):
+        etag = self.grid()['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.grid(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.buy(1)
+        response = self.grid(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_grid_of_a_version_is_built_once(self):
+        self.grid()
+
+        # Só a versão é lida: o grid vem do cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.grid().status_code, 200)
+
+    def test_public_page_loads_the_grid_from_the_api(self):
+        self.raffle.slug = 'campanha'
+        self.raffle.save()
+
+        response = self.client.get('/r/campanha/')
+
+        self.assertContains(response, f'data-number-grid="{self.raffle.pk}"')
+        self.assertContains(response, 'js/number-grid.js')
@@ -0,0 +1,96 @@
+import base64
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from raffles.models import ImageAsset, Raffle
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+DATA_URI = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+class ImageEndpointTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.raffle.set_prize_image(ImageAsset.from_data_uri(DATA_URI))
+        self.raffle.save()
+        self.url = self.raffle.prize_image_url
+
+    def test_serves_the_bytes_with_immutable_caching(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, PNG)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], f'"{self.raffle.prize_image_hash}"')
+
+    def test_repeat_requests_do_not_touch_the_database(self):
+        self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, PNG)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.raffle.prize_image_hash}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_hash_of_another_raffle_is_not_found(self):
+        other = Raffle.objects.create(
+            name='Outra', prize_name='Carro', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        url = self.url.replace(f'/{self.raffle.pk}/', f'/{other.pk}/')
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ImageAssetTests(TestCase):
+
+    def test_identical_images_share_one_row(self):
+        first = ImageAsset.from_data_uri(DATA_URI)
+        second = ImageAsset.store(PNG, 'image/png')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(first.size, len(PNG))
+
+    def test_invalid_upload_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ImageAsset.from_data_uri('não é uma imagem')
+
+    def test_raffle_queries_do_not_select_image_bytes(self):
+        raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        raffle.set_prize_image(ImageAsset.from_data_uri(DATA_URI))
+        raffle.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            listed = list(Raffle.objects.select_related('stats'))
+            url = listed[0].prize_image_url
+        self.assertTrue(url.endswith(raffle.prize_image_hash))
+        self.assertNotIn('"data"', ' '.join(query['sql'] for query in queries))
+
+    def test_asset_is_deleted_only_when_unused(self):
+        asset = ImageAsset.from_data_uri(DATA_URI)
+        raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=10,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        raffle.set_prize_image(asset)
+        raffle.save()
+
+        ImageAsset.delete_if_unused(asset.pk)
+        self.assertTrue(ImageAsset.objects.filter(pk=asset.pk).exists())
+
+        raffle.set_prize_image(None)
+        raffle.save()
+        ImageAsset.delete_if_unused(asset.pk)
+        self.assertFalse(ImageAsset.objects.filter(pk=asset.pk).exists())
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from raffles.bitmap import is_set
+from raffles.models import PrizeNumber, Raffle, RaffleNumber, RaffleNumberBlock
+
+
+class NumberIndexTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.raffle.initialize_numbers()
+
+    def in_index(self, number):
+        index, position = RaffleNumberBlock.locate(number)
+        block = RaffleNumberBlock.objects.get(raffle=self.raffle, index=index)
+        return is_set(bytearray(block.bitmap), position)
+
+    def free_count(self):
+        return sum(RaffleNumberBlock.objects.filter(raffle=self.raffle).values_list('free_count', flat=True))
+
+    def test_claim_takes_numbers_out_of_the_index(self):
+        claimed = self.raffle.claim_numbers(10)
+
+        self.assertEqual(len(set(claimed)), 10)
+        self.assertTrue(all(1 <= number <= 100 for number in claimed))
+        self.assertFalse(any(self.in_index(number) for number in claimed))
+        self.assertEqual(self.free_count(), 90)
+
+    def test_prize_numbers_only_change_their_own_bits(self):
+        with mock.patch.object(Raffle, 'build_number_index') as rebuild:
+            PrizeNumber.objects.create(
+                raffle=self.raffle, number=7, prize_amount=50,
+                release_percentage_min=50, release_percentage_max=60
+            )
+            self.raffle.refresh_number_index([7])
+        rebuild.assert_not_called()
+        self.assertFalse(self.in_index(7))
+        self.assertEqual(self.free_count(), 99)
+
+        PrizeNumber.objects.filter(raffle=self.raffle, number=7).delete()
+        self.raffle.refresh_number_index([7])
+        self.assertTrue(self.in_index(7))
+        self.assertEqual(self.free_count(), 100)
+
+    def test_refresh_keeps_taken_numbers_out(self):
+        RaffleNumberBlock.take_specific_numbers(self.raffle, [3])
+        RaffleNumber.objects.filter(raffle=self.raffle, number=3).update(status=RaffleNumber.Status.RESERVED)
+
+        self.raffle.refresh_number_index([3])
+
+        self.assertFalse(self.in_index(3))
+
+    def test_busy_candidates_go_back_to_the_index(self):
+        RaffleNumberBlock.take_specific_numbers(self.raffle, [4, 5])
+        RaffleNumber.objects.filter(raffle=self.raffle, number=5).update(status=RaffleNumber.Status.SOLD)
+
+        # 4 foi descartado por estar travado por outra transação, 5 porque já foi vendido
+        self.raffle._restore_busy_numbers({4, 5})
+
+        self.assertTrue(self.in_index(4))
+        self.assertFalse(self.in_index(5))
+
+    def test_claim_restores_candidates_it_could_not_lock(self):
+        real_lock = Raffle._lock_available_rows
+        skipped = []
+
+        def lock_skipping_busy(raffle, numbers):
+            locked = real_lock(raffle, numbers)
+            if not skipped and numbers:
+                skipped.append(sorted(numbers)[0])
+            # Simula SKIP LOCKED: outro comprador segura essa linha durante toda a
+            # compra, então ela é pulada de novo se for sorteada outra vez
+            if skipped:
+                locked.discard(skipped[0])
+            return locked
+
+        with mock.patch.object(Raffle, '_lock_available_rows', autospec=True, side_effect=lock_skipping_busy):
+            claimed = self.raffle.claim_numbers(5)
+
+        self.assertEqual(len(claimed), 5)
+        self.assertNotIn(skipped[0], claimed)
+        self.assertTrue(self.in_index(skipped[0]))
+        self.assertEqual(self.free_count(), 95)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User
+from raffles.models import PrizeNumber, Raffle, RaffleOrder
+
+
+class PrizeReleaseTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=100,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.prize = self.add_prize(50, '10.00')
+        self.add_prize(60, '25.50')
+        # O índice é montado depois: premiados ainda bloqueados ficam fora
+        self.raffle.initialize_numbers()
+        self.ana = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+        self.bia = User.objects.create_user(email='b@a.com', password='x', name='Bia', whatsapp='2')
+
+    def add_prize(self, number, percentage):
+        return PrizeNumber.objects.create(
+            raffle=self.raffle, number=number, prize_amount=Decimal('100'),
+            release_percentage_min=Decimal(percentage), release_percentage_max=Decimal('90')
+        )
+
+    def buy(self, user, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=user, quantity=quantity, amount=2 * quantity)
+        order.allocate_numbers()
+        return order
+
+    def test_thresholds_are_absolute_sold_counts(self):
+        self.assertEqual(self.prize.release_threshold, 10)
+        self.assertEqual(PrizeNumber.objects.get(number=60).release_threshold, 26)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).next_prize_threshold, 10)
+
+        self.raffle.expand_numbers(200)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).next_prize_threshold, 20)
+
+    def test_below_the_threshold_the_check_is_free(self):
+        order = self.buy(self.ana, 9)
+        order.mark_as_paid()
+        self.assertNotIn(50, order.allocated_numbers.values_list('number', flat=True))
+
+        raffle = Raffle.objects.get(pk=self.raffle.pk)
+        raffle.numbers_sold
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(raffle.check_and_release_prize_numbers(), [])
+        # Só o savepoint do @transaction.atomic, nenhuma leitura
+        self.assertEqual([q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']], [])
+
+    def test_crossing_the_threshold_releases_the_prize_to_the_next_buyer(self):
+        self.buy(self.ana, 10).mark_as_paid()
+
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.bia, quantity=1, amount=2)
+        order.raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual(order.allocate_numbers(), [50])
+        order.mark_as_paid()
+
+        self.prize.refresh_from_db()
+        self.assertTrue(self.prize.is_released and self.prize.is_won)
+        self.assertEqual(self.prize.winner, self.bia)
+        self.assertEqual(order.payment_data['won_prizes'][0]['number'], 50)
+        # O próximo limite pendente passa a ser o do outro prêmio
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).next_prize_threshold, 26)
+
+    def test_a_released_prize_is_won_only_once(self):
+        self.buy(self.ana, 10).mark_as_paid()
+        first = self.buy(self.bia, 1)
+        first.mark_as_paid()
+
+        second = self.buy(self.ana, 3)
+        second.mark_as_paid()
+
+        self.assertNotIn('won_prizes', second.payment_data)
+        self.assertEqual(PrizeNumber.objects.filter(is_won=True).count(), 1)
+
+    def test_every_released_prize_in_the_order_is_won(self):
+        PrizeNumber.objects.filter(raffle=self.raffle).update(release_threshold=0)
+        self.raffle.refresh_next_prize_threshold()
+
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.bia, quantity=3, amount=6)
+        order.raffle = Raffle.objects.get(pk=self.raffle.pk)
+        self.assertEqual(set(order.allocate_numbers()) & {50, 60}, {50, 60})
+        order.mark_as_paid()
+
+        self.assertEqual([prize['number'] for prize in order.payment_data['won_prizes']], [50, 60])
+        self.assertEqual(set(PrizeNumber.objects.filter(is_won=True).values_list('winner', flat=True)), {self.bia.pk})
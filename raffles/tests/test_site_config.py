@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from raffles.models import SiteConfiguration
+
+
+class SiteConfigurationCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        SiteConfiguration._cached = None
+        self.addCleanup(setattr, SiteConfiguration, '_cached', None)
+
+    def edit(self, **fields):
+        config = SiteConfiguration.objects.get(pk=1)
+        for name, value in fields.items():
+            setattr(config, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+
+    def test_repeated_reads_cost_no_queries(self):
+        SiteConfiguration.get_config()
+        with self.assertNumQueries(0):
+            config = SiteConfiguration.get_config()
+        self.assertEqual(config.pk, 1)
+
+    def test_save_publishes_a_new_version(self):
+        SiteConfiguration.get_config()
+        self.edit(site_name='Nova Rifa', admin_phones='5511\n\n5522\n')
+
+        config = SiteConfiguration.get_config()
+        self.assertEqual(config.site_name, 'Nova Rifa')
+        self.assertEqual(config.admin_contact_list, ['5511', '5522'])
+
+    def test_other_processes_drop_their_copy_when_the_version_changes(self):
+        SiteConfiguration.get_config()
+        stale = SiteConfiguration._cached
+
+        self.edit(site_name='Outra')
+        # Outro processo: ainda guarda a cópia antiga em memória
+        SiteConfiguration._cached = stale
+
+        self.assertEqual(SiteConfiguration.get_config().site_name, 'Outra')
+
+    def test_callers_get_a_copy(self):
+        config = SiteConfiguration.get_config()
+        config.site_name = 'Alterado sem salvar'
+
+        self.assertNotEqual(SiteConfiguration.get_config().site_name, 'Alterado sem salvar')
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from raffles.models import Raffle, RaffleNumber, RaffleOrder
+
+
+class SparseRaffleTests(TestCase):
+
+    def setUp(self):
+        self.raffle = Raffle.objects.create(
+            name='Campanha', prize_name='Moto', total_numbers=1_000_000, sparse_numbers=True,
+            price_per_number=2, status=Raffle.Status.ACTIVE
+        )
+        self.raffle.initialize_numbers()
+        self.user = User.objects.create_user(email='a@a.com', password='x', name='Ana', whatsapp='1')
+
+    def buy(self, quantity):
+        order = RaffleOrder.objects.create(raffle=self.raffle, user=self.user, quantity=quantity, amount=2 * quantity)
+        order.allocate_numbers()
+        return order
+
+    def test_only_the_index_is_created(self):
+        self.assertFalse(self.raffle.numbers.exists())
+        self.assertEqual(self.raffle.number_blocks.count(), 123)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).numbers_available, 1_000_000)
+
+    def test_rows_exist_only_for_taken_numbers(self):
+        self.buy(4).mark_as_paid()
+
+        self.assertEqual(self.raffle.numbers.filter(status=RaffleNumber.Status.SOLD).count(), 4)
+        self.assertEqual(self.raffle.numbers.count(), 4)
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).numbers_available, 999_996)
+
+    def test_expired_rows_are_deleted_and_the_numbers_freed(self):
+        order = self.buy(3)
+        order.allocated_numbers.update(reserved_expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(RaffleNumber.release_expired(), 3)
+        self.assertFalse(self.raffle.numbers.exists())
+        self.assertEqual(Raffle.objects.get(pk=self.raffle.pk).numbers_available, 1_000_000)
+
+    def test_expanding_only_grows_the_index(self):
+        self.raffle.expand_numbers(1_010_000)
+
+        self.assertFalse(self.raffle.numbers.exists())
+        self.assertEqual(sum(self.raffle.number_blocks.values_list('free_count', flat=True)), 1_010_000)
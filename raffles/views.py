@@ -2,17 +2,29 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from .models import Raffle, RaffleOrder, Referral, RaffleNumber, PrizeNumber, SiteConfiguration
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from accounts.models import User
+from .models import (
+    Raffle, RaffleOrder, Referral, RaffleNumber, PrizeNumber, SiteConfiguration, GridChange, CampaignStats,
+    ImageAsset
+)
 from .serializers import RaffleSerializer, RaffleOrderSerializer, ReferralSerializer
 from django.utils import timezone
 from datetime import timedelta
+import base64
+import json
 import re
+import zlib
+
+# Tempo que o grid de uma versão fica no cache (a versão muda a cada venda/reserva)
+GRID_CACHE_SECONDS = 300
 
 
 class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Raffles - read only"""
     serializer_class = RaffleSerializer
-    queryset = Raffle.objects.filter(status=Raffle.Status.ACTIVE)
+    queryset = Raffle.objects.filter(status=Raffle.Status.ACTIVE).prefetch_related('counter_shards')
 
     @action(detail=True, methods=['post'])
     def buy(self, request, pk=None):
@@ -37,6 +49,64 @@ class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def grid(self, request, pk=None):
+        """Status de todos os números, compactado (2 bits por número)
+
+        `grid` is base64(zlib(...)) of Raffle.build_number_grid(). The ETag
+        follows the raffle's grid_version, so clients revalidate with
+        If-None-Match and only download the grid again after it changed.
+        """
+        raffle = get_object_or_404(
+            self.get_queryset().prefetch_related(None).only('id', 'status', 'total_numbers', 'grid_version'),
+            pk=pk
+        )
+
+        etag = f'"grid-{raffle.pk}-{raffle.total_numbers}-{raffle.grid_version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache_key = f'raffle-grid:{raffle.pk}:{raffle.total_numbers}:{raffle.grid_version}'
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = {
+                'total_numbers': raffle.total_numbers,
+                'version': raffle.grid_version,
+                'encoding': '2bit-zlib-base64',
+                'grid': base64.b64encode(zlib.compress(raffle.build_number_grid())).decode('ascii'),
+            }
+            cache.set(cache_key, payload, GRID_CACHE_SECONDS)
+
+        return Response(payload, headers=headers)
+
+    @action(detail=True, methods=['get'], url_path='grid-changes', permission_classes=[AllowAny])
+    def grid_changes(self, request, pk=None):
+        """Números que mudaram de status desde uma versão do grid (?since=<versão>)
+
+        Returns the changed numbers grouped by their current status. When the
+        client is too far behind, `full_reload` is true and it should fetch
+        the grid endpoint again.
+        """
+        raffle = get_object_or_404(
+            self.get_queryset().prefetch_related(None).only('id', 'status', 'total_numbers', 'grid_version'),
+            pk=pk
+        )
+
+        try:
+            since = int(request.query_params.get('since', ''))
+        except ValueError:
+            return Response({'error': 'Parâmetro since inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = GridChange.changes_since(raffle, since)
+
+        return Response({
+            'version': raffle.grid_version,
+            'total_numbers': raffle.total_numbers,
+            'full_reload': changes is None,
+            'changes': changes or {},
+        }, headers={'Cache-Control': 'no-cache'})
+
     @action(detail=True, methods=['get'], url_path='check-reservation')
     def check_reservation(self, request, pk=None):
         """Verificar se ainda há uma reserva ativa e quanto tempo resta"""
@@ -44,9 +114,6 @@ class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
         
         raffle = self.get_object()
         
-        # Release expired reservations first
-        raffle.release_expired_reservations()
-        
         # Pegar reservas ativas do usuário
         user_reservations = RaffleNumber.objects.filter(
             raffle=raffle,
@@ -66,14 +133,7 @@ class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
         now = timezone.now()
         
         if reservation.reserved_expires_at <= now:
-            # Liberou enquanto checava
-            reservation.status = RaffleNumber.Status.AVAILABLE
-            reservation.user = None
-            reservation.order = None
-            reservation.reserved_at = None
-            reservation.reserved_expires_at = None
-            reservation.save()
-            
+            # Expirou: os números são liberados pelo worker run_reservation_expiry
             return Response({
                 'has_reservation': False,
                 'message': 'Sua reserva expirou',
@@ -98,7 +158,8 @@ class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
     def reservation_status(self, request, pk=None):
         """API simples para verificar tempo de reserva (usado pelo frontend)"""
         raffle = self.get_object()
-        
+        now = timezone.now()
+
         # Se passou order_id, usar ele. Senão, usar request.user
         order_id = request.query_params.get('order_id')
         
@@ -119,23 +180,6 @@ class RaffleViewSet(viewsets.ReadOnlyModelViewSet):
                 reserved_expires_at__isnull=False
             ).order_by('reserved_expires_at').last()
         
-        # Release expired reservations first
-        now = timezone.now()
-        expired = RaffleNumber.objects.filter(
-            raffle=raffle,
-            status=RaffleNumber.Status.RESERVED,
-            reserved_expires_at__lt=now
-        )
-        
-        # Liberar expiradas
-        for num in expired:
-            num.status = RaffleNumber.Status.AVAILABLE
-            num.user = None
-            num.order = None
-            num.reserved_at = None
-            num.reserved_expires_at = None
-            num.save()
-        
         if not user_reservation:
             return Response({'has_active_reservation': False})
         
@@ -268,36 +312,19 @@ def dashboard(request):
     """Dashboard principal - Admin vê estatísticas completas de todas as campanhas"""
     if request.user.is_staff:
         # Admin Dashboard - Estatísticas de todas as campanhas
-        from django.db.models import Sum, Count, Q
-
-        raffles = Raffle.objects.all().order_by('-created_at')
+        raffles = list(Raffle.objects.select_related('stats').order_by('-created_at'))
+        Raffle.prefetch_counter_totals(raffles)
 
-        # Calcular estatísticas para cada campanha
+        # Calcular estatísticas para cada campanha (uma linha materializada por campanha;
+        # vendidos/reservados vêm dos contadores da própria rifa)
         campaigns_stats = []
         for raffle in raffles:
-            # Contar números vendidos e reservados
-            numbers_sold = raffle.numbers.filter(status=RaffleNumber.Status.SOLD).count()
-            numbers_reserved = raffle.numbers.filter(status=RaffleNumber.Status.RESERVED).count()
-            numbers_available = raffle.total_numbers - numbers_sold - numbers_reserved
+            stats = CampaignStats.for_raffle(raffle)
 
-            # Calcular valor arrecadado (apenas pagos)
-            paid_orders = RaffleOrder.objects.filter(
-                raffle=raffle,
-                status=RaffleOrder.Status.PAID
-            )
-            total_revenue = paid_orders.aggregate(total=Sum('amount'))['total'] or 0
-
-            # Contar compradores únicos (apenas pagos)
-            unique_buyers = paid_orders.values('user').distinct().count()
-
-            # Estatísticas de números premiados
-            from .models import PrizeNumber
-            total_prize_numbers = PrizeNumber.objects.filter(raffle=raffle).count()
-            won_prize_numbers = PrizeNumber.objects.filter(raffle=raffle, is_won=True).count()
-
-            # Calcular taxa total arrecadada
-            fee_amount = total_revenue * (raffle.fee_percentage / 100)
-            net_revenue = total_revenue - fee_amount
+            # Contar números vendidos e reservados
+            numbers_sold = raffle.numbers_sold
+            numbers_reserved = raffle.numbers_reserved
+            numbers_available = raffle.numbers_available
 
             campaigns_stats.append({
                 'raffle': raffle,
@@ -305,21 +332,24 @@ def dashboard(request):
                 'numbers_reserved': numbers_reserved,
                 'numbers_available': numbers_available,
                 'available_value': numbers_available * raffle.price_per_number,
-                'total_revenue': total_revenue,
-                'fee_amount': fee_amount,
-                'net_revenue': net_revenue,
-                'unique_buyers': unique_buyers,
+                'total_revenue': stats.revenue,
+                'fee_amount': stats.fee_amount,
+                'net_revenue': stats.net_revenue,
+                'unique_buyers': stats.unique_buyers,
                 'percentage_sold': round((numbers_sold / raffle.total_numbers) * 100, 1) if raffle.total_numbers > 0 else 0,
-                'total_prize_numbers': total_prize_numbers,
-                'won_prize_numbers': won_prize_numbers,
-                'prize_percentage': round((won_prize_numbers / total_prize_numbers) * 100, 1) if total_prize_numbers > 0 else 0,
+                'total_prize_numbers': stats.prize_numbers,
+                'won_prize_numbers': stats.prizes_won,
+                'prize_percentage': stats.prize_percentage,
             })
 
         # Estatísticas gerais
-        total_campaigns = raffles.count()
-        active_campaigns = raffles.filter(status=Raffle.Status.ACTIVE).count()
-        total_buyers = RaffleOrder.objects.filter(status=RaffleOrder.Status.PAID).values('user').distinct().count()
-        total_revenue_all = RaffleOrder.objects.filter(status=RaffleOrder.Status.PAID).aggregate(total=Sum('amount'))['total'] or 0
+        total_campaigns = len(raffles)
+        active_campaigns = sum(1 for raffle in raffles if raffle.status == Raffle.Status.ACTIVE)
+        # Um mesmo comprador pode estar em várias campanhas: contar distintos nos pedidos
+        total_buyers = RaffleOrder.objects.filter(
+            status=RaffleOrder.Status.PAID
+        ).values('user').distinct().count()
+        total_revenue_all = sum((item['total_revenue'] for item in campaigns_stats), 0)
 
         context = {
             'campaigns_stats': campaigns_stats,
@@ -341,6 +371,90 @@ def dashboard(request):
         return render(request, 'raffles/dashboard.html', context)
 
 
+# Ordenações da lista de compradores: filtro -> (campo anotado, decrescente)
+BUYER_SORTS = {
+    'total_amount': ('total_amount', True),
+    'total_quantity': ('total_quantity', True),
+    'referral_bonus': ('referral_bonus_count', True),
+    'successful_referrals': ('successful_referrals', True),
+    'name': ('sort_name', False),
+}
+BUYERS_PAGE_SIZE = 50
+BONUS_SOURCES = [RaffleNumber.Source.REFERRAL_INVITER, RaffleNumber.Source.REFERRAL_INVITEE]
+
+
+def _encode_buyer_cursor(value, user_id):
+    data = json.dumps([str(value), user_id]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _decode_buyer_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, user_id = json.loads(base64.urlsafe_b64decode(padded))
+        return value, int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _buyer_ranking(raffle, filter_by, after=None, limit=BUYERS_PAGE_SIZE):
+    """One page of buyer stats, aggregated and sorted by the database
+
+    Orders are grouped by user and the referral counts come from correlated
+    subqueries, so the cost is one query per page whatever the number of
+    buyers. Pages are keyset-paginated on (sort field, user_id).
+    Returns (rows, next_cursor).
+    """
+    from django.db.models import Sum, Count, Max, Q, Subquery, OuterRef, IntegerField
+    from django.db.models.functions import Coalesce, Lower
+
+    field, descending = BUYER_SORTS[filter_by]
+
+    bonus_numbers = RaffleNumber.objects.filter(
+        raffle=raffle,
+        user=OuterRef('user_id'),
+        source__in=BONUS_SOURCES,
+        status=RaffleNumber.Status.SOLD
+    ).order_by().values('user').annotate(total=Count('id')).values('total')
+
+    redeemed_referrals = Referral.objects.filter(
+        raffle=raffle,
+        inviter=OuterRef('user_id'),
+        status=Referral.Status.REDEEMED
+    ).order_by().values('inviter').annotate(total=Count('id')).values('total')
+
+    buyers = RaffleOrder.objects.filter(
+        raffle=raffle,
+        status=RaffleOrder.Status.PAID
+    ).values('user_id').annotate(
+        total_amount=Sum('amount'),
+        total_quantity=Sum('quantity'),
+        orders_count=Count('id'),
+        sort_name=Max(Lower('user__name')),
+        referral_bonus_count=Coalesce(Subquery(bonus_numbers, output_field=IntegerField()), 0),
+        successful_referrals=Coalesce(Subquery(redeemed_referrals, output_field=IntegerField()), 0),
+    )
+
+    if after is not None:
+        value, user_id = after
+        beyond = f'{field}__lt' if descending else f'{field}__gt'
+        buyers = buyers.filter(Q(**{beyond: value}) | Q(**{field: value, 'user_id__gt': user_id}))
+
+    buyers = buyers.order_by(f'-{field}' if descending else field, 'user_id')
+    rows = list(buyers[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_buyer_cursor(rows[-1][field], rows[-1]['user_id'])
+
+    users = User.objects.in_bulk([row['user_id'] for row in rows])
+    for row in rows:
+        row['user'] = users.get(row['user_id'])
+
+    return rows, next_cursor
+
+
 @login_required
 def campaign_details(request, pk):
     """Detalhes completos de uma campanha - Admin only"""
@@ -350,122 +464,59 @@ def campaign_details(request, pk):
 
     raffle = get_object_or_404(Raffle, pk=pk)
 
-    from django.db.models import Sum, Count
-    from collections import defaultdict
+    from django.db.models import Count
 
     # Obter filtro da query string
     filter_by = request.GET.get('filter', 'total_amount')  # Padrão: maiores compradores
+    if filter_by not in BUYER_SORTS:
+        filter_by = 'total_amount'
 
     # Estatísticas da campanha
-    numbers_sold = raffle.numbers.filter(status=RaffleNumber.Status.SOLD).count()
-    numbers_reserved = raffle.numbers.filter(status=RaffleNumber.Status.RESERVED).count()
-    numbers_available = raffle.total_numbers - numbers_sold - numbers_reserved
+    numbers_sold = raffle.numbers_sold
+    numbers_reserved = raffle.numbers_reserved
+    numbers_available = raffle.numbers_available
     available_value = numbers_available * raffle.price_per_number
 
-    # Pedidos pagos
-    paid_orders = RaffleOrder.objects.filter(
-        raffle=raffle,
-        status=RaffleOrder.Status.PAID
-    ).select_related('user').order_by('-paid_at')
-
-    total_revenue = paid_orders.aggregate(total=Sum('amount'))['total'] or 0
-    fee_amount = total_revenue * (raffle.fee_percentage / 100)
-    net_revenue = total_revenue - fee_amount
-
-    # Agrupar por comprador
-    buyers_data = defaultdict(lambda: {
-        'user': None,
-        'total_amount': 0,
-        'total_quantity': 0,
-        'orders_count': 0,
-        'purchased_numbers': [],
-        'bonus_numbers': [],
-        'referral_bonus_count': 0,
-        'successful_referrals': 0,
-    })
-
-    for order in paid_orders:
-        buyer_key = order.user.id
-        buyers_data[buyer_key]['user'] = order.user
-        buyers_data[buyer_key]['total_amount'] += order.amount
-        buyers_data[buyer_key]['total_quantity'] += order.quantity
-        buyers_data[buyer_key]['orders_count'] += 1
-
-    # Adicionar números de cada comprador e estatísticas de indicações
-    for buyer_id, data in buyers_data.items():
-        # Números comprados
-        purchased = RaffleNumber.objects.filter(
-            raffle=raffle,
-            user=data['user'],
-            source=RaffleNumber.Source.PURCHASE,
-            status=RaffleNumber.Status.SOLD
-        ).values_list('number', flat=True)
-        data['purchased_numbers'] = sorted(list(purchased))
-
-        # Números ganhos por indicação
-        bonus = RaffleNumber.objects.filter(
-            raffle=raffle,
-            user=data['user'],
-            source__in=[RaffleNumber.Source.REFERRAL_INVITER, RaffleNumber.Source.REFERRAL_INVITEE],
-            status=RaffleNumber.Status.SOLD
-        ).values_list('number', flat=True)
-        data['bonus_numbers'] = sorted(list(bonus))
-        data['referral_bonus_count'] = len(data['bonus_numbers'])
+    # Totais materializados da campanha
+    stats = CampaignStats.for_raffle(raffle)
+    total_revenue = stats.revenue
+    fee_amount = stats.fee_amount
+    net_revenue = stats.net_revenue
 
-        # Contar quantas pessoas esse usuário indicou com sucesso (nesta campanha)
-        successful_referrals = Referral.objects.filter(
-            raffle=raffle,
-            inviter=data['user'],
-            status=Referral.Status.REDEEMED
-        ).count()
-        data['successful_referrals'] = successful_referrals
-
-    # Converter para lista
-    buyers_list = list(buyers_data.values())
-
-    # Aplicar ordenação baseada no filtro
-    if filter_by == 'total_amount':
-        buyers_list = sorted(buyers_list, key=lambda x: x['total_amount'], reverse=True)
-    elif filter_by == 'total_quantity':
-        buyers_list = sorted(buyers_list, key=lambda x: x['total_quantity'], reverse=True)
-    elif filter_by == 'referral_bonus':
-        buyers_list = sorted(buyers_list, key=lambda x: x['referral_bonus_count'], reverse=True)
-    elif filter_by == 'successful_referrals':
-        buyers_list = sorted(buyers_list, key=lambda x: x['successful_referrals'], reverse=True)
-    elif filter_by == 'name':
-        buyers_list = sorted(buyers_list, key=lambda x: x['user'].name.lower())
+    # Compradores: uma página por vez, já agregada e ordenada no banco.
+    # Os números de cada comprador são carregados sob demanda (campaign_buyer_numbers)
+    after = request.GET.get('after')
+    after = _decode_buyer_cursor(after) if after else None
+    buyers_list, next_cursor = _buyer_ranking(raffle, filter_by, after=after)
 
     # Estatísticas de indicações
     referrals = Referral.objects.filter(raffle=raffle, status=Referral.Status.REDEEMED)
-    total_referrals = referrals.count()
+    total_referrals = stats.referrals_redeemed
 
     # Top 5 indicadores
-    top_inviters = []
-    inviter_stats = {}
-    for referral in referrals:
-        inviter_id = referral.inviter.id
-        if inviter_id not in inviter_stats:
-            inviter_stats[inviter_id] = {
-                'user': referral.inviter,
-                'referral_count': 0,
-                'bonus_numbers': 0
-            }
-        inviter_stats[inviter_id]['referral_count'] += 1
-
-    # Adicionar contagem de números bônus
-    for inviter_id, stats in inviter_stats.items():
-        bonus_count = RaffleNumber.objects.filter(
+    top_inviters = list(
+        referrals.values('inviter_id').annotate(
+            referral_count=Count('id')
+        ).order_by('-referral_count', 'inviter_id')[:5]
+    )
+
+    # Números bônus dos indicadores em uma consulta agrupada
+    inviter_ids = [inviter['inviter_id'] for inviter in top_inviters]
+    bonus_by_inviter = dict(
+        RaffleNumber.objects.filter(
             raffle=raffle,
-            user=stats['user'],
+            user_id__in=inviter_ids,
             source=RaffleNumber.Source.REFERRAL_INVITER,
             status=RaffleNumber.Status.SOLD
-        ).count()
-        stats['bonus_numbers'] = bonus_count
-
-    top_inviters = sorted(inviter_stats.values(), key=lambda x: x['referral_count'], reverse=True)[:5]
+        ).values('user_id').annotate(total=Count('id')).order_by().values_list('user_id', 'total')
+    )
+    inviters = User.objects.in_bulk(inviter_ids)
+    for inviter in top_inviters:
+        inviter['user'] = inviters.get(inviter['inviter_id'])
+        inviter['bonus_numbers'] = bonus_by_inviter.get(inviter['inviter_id'], 0)
 
     # Números Premiados (Prize Numbers)
-    prize_numbers = PrizeNumber.objects.filter(raffle=raffle).order_by('number')
+    prize_numbers = PrizeNumber.objects.filter(raffle=raffle).select_related('winner').order_by('number')
     prize_winners = []
     for prize in prize_numbers:
         prize_winners.append({
@@ -490,7 +541,9 @@ def campaign_details(request, pk):
         'net_revenue': net_revenue,
         'percentage_sold': round((numbers_sold / raffle.total_numbers) * 100, 1) if raffle.total_numbers > 0 else 0,
         'buyers_list': buyers_list,
-        'total_buyers': len(buyers_list),
+        'total_buyers': stats.unique_buyers,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
         'total_referrals': total_referrals,
         'top_inviters': top_inviters,
         'current_filter': filter_by,
@@ -499,6 +552,31 @@ def campaign_details(request, pk):
     return render(request, 'raffles/campaign_details.html', context)
 
 
+@login_required
+def campaign_buyer_numbers(request, pk, user_id):
+    """Numbers of one buyer in a campaign (JSON), loaded when the card is expanded"""
+    from django.http import JsonResponse
+
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Acesso negado.'}, status=403)
+
+    numbers = RaffleNumber.objects.filter(
+        raffle_id=pk,
+        user_id=user_id,
+        status=RaffleNumber.Status.SOLD
+    ).order_by('number').values_list('number', 'source')
+
+    purchased = []
+    bonus = []
+    for number, source in numbers:
+        if source == RaffleNumber.Source.PURCHASE:
+            purchased.append(number)
+        elif source in BONUS_SOURCES:
+            bonus.append(number)
+
+    return JsonResponse({'purchased': purchased, 'bonus': bonus})
+
+
 @login_required
 def raffle_list(request):
     """Lista de campanhas"""
@@ -506,6 +584,8 @@ def raffle_list(request):
         raffles = Raffle.objects.all()
     else:
         raffles = Raffle.objects.filter(status=Raffle.Status.ACTIVE)
+    # Vendidos de todas as campanhas: as fatias dos contadores vêm numa só consulta
+    raffles = raffles.prefetch_related('counter_shards')
 
     context = {
         'raffles': raffles,
@@ -521,14 +601,13 @@ def raffle_create(request):
             import logging
             logger = logging.getLogger(__name__)
 
-            prize_image_base64 = ''
+            prize_image = None
             logger.info(f"FILES received: {list(request.FILES.keys())}")
 
             if 'prize_image' in request.FILES:
                 image_file = request.FILES['prize_image']
                 logger.info(f"Image file: name={image_file.name}, size={image_file.size}")
                 image_data = image_file.read()
-                encoded_data = base64.b64encode(image_data).decode('utf-8')
                 # Detect content type from file extension
                 content_type = 'image/jpeg'
                 if image_file.name.lower().endswith('.png'):
@@ -537,8 +616,8 @@ def raffle_create(request):
                     content_type = 'image/gif'
                 elif image_file.name.lower().endswith('.webp'):
                     content_type = 'image/webp'
-                prize_image_base64 = f'data:{content_type};base64,{encoded_data}'
-                logger.info(f"Image encoded: type={content_type}, base64_length={len(encoded_data)}")
+                prize_image = ImageAsset.store(image_data, content_type)
+                logger.info(f"Image stored: type={content_type}, hash={prize_image.hash}")
             else:
                 logger.warning("No 'prize_image' in request.FILES")
 
@@ -558,8 +637,10 @@ def raffle_create(request):
                 description=request.POST.get('description', ''),
                 prize_name=request.POST.get('prize_name'),
                 prize_description=request.POST.get('prize_description', ''),
-                prize_image_base64=prize_image_base64,
+                prize_image=prize_image,
+                prize_image_hash=prize_image.hash if prize_image else '',
                 total_numbers=int(total_numbers_str) if total_numbers_str else 100,
+                sparse_numbers=request.POST.get('sparse_numbers') == '1',
                 price_per_number=float(price_per_number_str) if price_per_number_str else 0.01,
                 fee_percentage=float(fee_percentage_str) if fee_percentage_str else 0,
                 status=request.POST.get('status', 'draft'),
@@ -580,8 +661,6 @@ def raffle_create(request):
                 milestone_prize_url=request.POST.get('milestone_prize_url', ''),
             )
 
-            raffle.initialize_numbers()
-
             # Processar números premiados
             prize_numbers_data = {}
             for key in request.POST.keys():
@@ -611,6 +690,10 @@ def raffle_create(request):
                             release_percentage_max=float(release_max_str)
                         )
 
+            # Criar os números depois dos premiados para que o índice de
+            # disponibilidade já nasça sem os premiados bloqueados
+            raffle.initialize_numbers()
+
             messages.success(request, 'Campanha criada com sucesso!')
             return redirect('raffle_list')
 
@@ -636,6 +719,7 @@ def raffle_edit(request, pk):
                 messages.warning(request, 'Nao e possivel reduzir a quantidade de titulos. Apenas aumentar.')
 
             # Update basic fields
+            old_prize_image_id = raffle.prize_image_id
             raffle.name = request.POST.get('name')
             raffle.description = request.POST.get('description', '')
             raffle.prize_name = request.POST.get('prize_name')
@@ -688,7 +772,6 @@ def raffle_edit(request, pk):
             if 'prize_image' in request.FILES:
                 image_file = request.FILES['prize_image']
                 image_data = image_file.read()
-                encoded_data = base64.b64encode(image_data).decode('utf-8')
                 # Detect content type from file extension
                 content_type = 'image/jpeg'
                 if image_file.name.lower().endswith('.png'):
@@ -697,13 +780,18 @@ def raffle_edit(request, pk):
                     content_type = 'image/gif'
                 elif image_file.name.lower().endswith('.webp'):
                     content_type = 'image/webp'
-                raffle.prize_image_base64 = f'data:{content_type};base64,{encoded_data}'
+                raffle.set_prize_image(ImageAsset.store(image_data, content_type))
 
             raffle.save()
+            if raffle.prize_image_id != old_prize_image_id:
+                ImageAsset.delete_if_unused(old_prize_image_id)
 
             # Processar números premiados
             # NÃO deletar números que já foram liberados ou ganhos para preservar histórico
             # Apenas deletar números que ainda não foram liberados
+            previous_prize_numbers = set(
+                raffle.prize_numbers.filter(is_released=False, is_won=False).values_list('number', flat=True)
+            )
             raffle.prize_numbers.filter(is_released=False, is_won=False).delete()
 
             prize_numbers_data = {}
@@ -755,6 +843,14 @@ def raffle_edit(request, pk):
                                 release_percentage_max=float(release_max_str)
                             )
 
+            # Premiados removidos não passam pelo save(): atualizar limite e totais
+            raffle.refresh_next_prize_threshold()
+
+            # Números premiados bloqueados mudaram: atualizar só os bits deles no índice
+            raffle.refresh_number_index(
+                previous_prize_numbers | set(raffle.prize_numbers.values_list('number', flat=True))
+            )
+
             messages.success(request, 'Campanha atualizada com sucesso!')
             return redirect('raffle_list')
 
@@ -788,7 +884,9 @@ def raffle_delete(request, pk):
             raffle_name = raffle.name
             logger.info(f"Deleting raffle: {raffle_name} (id={pk})")
             # Django will cascade delete related objects (numbers, orders, etc.)
+            prize_image_id = raffle.prize_image_id
             raffle.delete()
+            ImageAsset.delete_if_unused(prize_image_id)
             logger.info(f"Raffle deleted successfully: {raffle_name}")
             messages.success(request, f'Campanha "{raffle_name}" excluída com sucesso!')
             return redirect('raffle_list')
@@ -844,9 +942,9 @@ def raffle_public_view(request, slug):
     
     raffle = get_object_or_404(Raffle, slug=slug, status=Raffle.Status.ACTIVE)
     
-    # Get all numbers with their status
-    numbers = RaffleNumber.objects.filter(raffle=raffle).order_by('number')
-    
+    # O status dos números não é renderizado aqui: o grid vem da API
+    # (/api/raffles/<id>/grid/), compactado e com ETag
+
     # Get prize numbers (todos - para mostrar como disponíveis e gerar interesse)
     prize_numbers = raffle.prize_numbers.all().order_by('release_percentage_min', 'number')
 
@@ -866,8 +964,6 @@ def raffle_public_view(request, slug):
 
     context = {
         'raffle': raffle,
-        'numbers': numbers,
-        'numbers_list': list(numbers.values('number', 'status')),
         'admin_whatsapp': settings.ADMIN_WHATSAPP,
         'user_numbers': user_numbers,
         'prize_numbers': prize_numbers,
@@ -876,11 +972,36 @@ def raffle_public_view(request, slug):
     return render(request, 'raffles/public_view.html', context)
 
 
+def raffle_image(request, pk, image_hash):
+    """Imagem do prêmio, servida pelo hash do conteúdo (ETag + cache longo)"""
+    from .images import image_response
+
+    def load():
+        return ImageAsset.objects.filter(hash=image_hash, raffles=pk).values_list(
+            'content_type', 'data'
+        ).first()
+
+    return image_response(request, image_hash, load)
+
+
+def site_logo(request, image_hash):
+    """Logo do site, servida pelo hash do conteúdo (ETag + cache longo)"""
+    from .images import image_response
+
+    def load():
+        return ImageAsset.objects.filter(hash=image_hash, site_configurations__isnull=False).values_list(
+            'content_type', 'data'
+        ).first()
+
+    return image_response(request, image_hash, load)
+
+
 @login_required
 def site_config_view(request):
     """View para configurar logo e identidade visual do site"""
     from .models import SiteConfiguration
     from django.contrib import messages
+    from django.core.exceptions import ValidationError
     import logging
 
     logger = logging.getLogger(__name__)
@@ -892,10 +1013,15 @@ def site_config_view(request):
         if site_name:
             config.site_name = site_name
 
-        # Update logo if provided
+        # Update logo if provided (os bytes vão para ImageAsset)
+        old_logo_id = config.logo_id
         logo_base64 = request.POST.get('logo_base64', '').strip()
         if logo_base64:
-            config.logo_base64 = logo_base64
+            try:
+                config.set_logo(ImageAsset.from_data_uri(logo_base64))
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+                return redirect('site_config')
 
         # Update notification contacts
         admin_phones = request.POST.get('admin_phones', '').strip()
@@ -926,11 +1052,6 @@ def site_config_view(request):
         if site_name:
             config.site_name = site_name
 
-        # Update logo if provided
-        logo_base64 = request.POST.get('logo_base64', '').strip()
-        if logo_base64:
-            config.logo_base64 = logo_base64
-
         # Update notification contacts
         admin_phones = request.POST.get('admin_phones', '').strip()
         config.admin_phones = admin_phones
@@ -939,6 +1060,8 @@ def site_config_view(request):
         config.group_phones = group_phones
 
         config.save()
+        if config.logo_id != old_logo_id:
+            ImageAsset.delete_if_unused(old_logo_id)
         logger.info(f"DEBUG: SiteConfiguration salva completa. home_redirect_raffle = {config.home_redirect_raffle} (ID: {config.home_redirect_raffle_id})")
         
         messages.success(request, 'Configurações salvas com sucesso!')
@@ -992,107 +1115,152 @@ def admin_dashboard(request):
     """View para dashboard administrativo"""
     raffles = Raffle.objects.all().order_by('-created_at')
     return render(request, 'raffles/admin_dashboard.html', {'raffles': raffles})
+
+
+@login_required
 def raffle_draw(request):
-    """View para sortear ganhador de uma campanha"""
+    """View para sortear ganhador de uma campanha
+
+    Draws are commit-reveal (RaffleDraw): the commitment closes the sales and
+    names a future round of the public beacon; the draw is only revealed
+    after that round is published, in a later request.
+    """
     from django.contrib import messages
+    from django.core.exceptions import ValidationError
+    from .models import RaffleDraw
     import json
 
+    if not request.user.is_staff:
+        messages.error(request, 'Acesso negado.')
+        return redirect('dashboard')
+
     # Buscar apenas campanhas ativas ou finalizadas
     raffles = Raffle.objects.filter(
         status__in=[Raffle.Status.ACTIVE, Raffle.Status.FINISHED]
-    ).order_by('-created_at')
+    ).prefetch_related('counter_shards').order_by('-created_at')
 
     winner_data = None
     raffle_id = request.GET.get('raffle_id')
+    pending_draw = None
+    past_draws = []
+
+    if raffle_id:
+        pending_draw = RaffleDraw.objects.filter(
+            raffle_id=raffle_id,
+            status=RaffleDraw.Status.COMMITTED
+        ).order_by('-committed_at').first()
 
     if request.method == 'POST' and raffle_id:
         try:
             raffle = Raffle.objects.get(id=raffle_id)
 
-            # Buscar todos os números vendidos (pagos)
-            sold_numbers = RaffleNumber.objects.filter(
+            # Encerrar as vendas e publicar o compromisso antes do sorteio
+            if request.POST.get('action') == 'commit':
+                draw = RaffleDraw.commit(raffle, user=request.user)
+                messages.success(
+                    request,
+                    f'Compromisso publicado: rodada {draw.beacon_round} do beacon, '
+                    f'{draw.eligible_count} números vendidos (hash {draw.sold_hash[:16]}...)'
+                )
+                return redirect(f"{request.path}?raffle_id={raffle.id}")
+
+            # Só sorteia um compromisso publicado antes, depois da rodada do beacon
+            if not pending_draw:
+                raise ValidationError('Publique o compromisso do sorteio antes de sortear.')
+            draw = pending_draw.reveal()
+            pending_draw = None
+
+            # Só os dados do número sorteado e do seu dono
+            winner_number = RaffleNumber.objects.select_related('order', 'user').get(
                 raffle=raffle,
-                order__status='paid'
-            ).select_related('order', 'order__user')
-
-            if not sold_numbers.exists():
-                messages.error(request, 'Nenhum número vendido para esta campanha.')
-            else:
-                # Sortear um número aleatório
-                import random
-                sold_numbers_list = list(sold_numbers)
-                winner_number = random.choice(sold_numbers_list)
-
-                # Preparar dados do ganhador
-                user = winner_number.order.user
-                phone = user.whatsapp or ''
-
-                # Mascarar telefone: (37) 9****-1626
-                masked_phone = ''
-                if len(phone) >= 4:
-                    # Formato: (XX) 9****-XXXX
-                    if len(phone) == 11:  # Celular com 9
-                        masked_phone = f"({phone[:2]}) {phone[2]}****-{phone[-4:]}"
-                    elif len(phone) == 10:  # Fixo
-                        masked_phone = f"({phone[:2]}) ****-{phone[-4:]}"
-                    else:
-                        masked_phone = f"****-{phone[-4:]}"
+                number=draw.winner_number
+            )
+            user = winner_number.user
+            phone = user.whatsapp or ''
+
+            # Mascarar telefone: (37) 9****-1626
+            masked_phone = ''
+            if len(phone) >= 4:
+                # Formato: (XX) 9****-XXXX
+                if len(phone) == 11:  # Celular com 9
+                    masked_phone = f"({phone[:2]}) {phone[2]}****-{phone[-4:]}"
+                elif len(phone) == 10:  # Fixo
+                    masked_phone = f"({phone[:2]}) ****-{phone[-4:]}"
                 else:
-                    masked_phone = "****"
-
-                # Buscar todos os números comprados por esse usuário nesta campanha
-                user_numbers = RaffleNumber.objects.filter(
-                    raffle=raffle,
-                    order__user=user,
-                    order__status='paid'
-                ).order_by('number').values_list('number', flat=True)
-
-                # Converter para lista
-                user_numbers_list = list(user_numbers)
-                total_numbers = len(user_numbers_list)
-
-                # Buscar números bônus ganhos pelo usuário nesta campanha
-                # Buscar números que foram dados como bônus (purchase_bonus, milestone_bonus ou referral)
-                bonus_numbers = RaffleNumber.objects.filter(
-                    raffle=raffle,
-                    order__user=user,
-                    order__status='paid',
-                    source__in=['purchase_bonus', 'milestone_bonus', 'referral_inviter', 'referral_invitee']
-                ).order_by('number').values_list('number', flat=True)
-
-                bonus_numbers_list = list(bonus_numbers)
-                total_bonus = len(bonus_numbers_list)
-
-                # Data da compra do número sorteado
-                purchase_date = winner_number.order.created_at.strftime('%d/%m/%Y às %H:%M')
-
-                winner_data = {
-                    'number': winner_number.number,
-                    'name': user.name,
-                    'masked_phone': masked_phone,
-                    'real_phone': phone,
-                    'total_numbers': total_numbers,
-                    'user_numbers': user_numbers_list,  # Lista de todos os números
-                    'bonus_numbers': bonus_numbers_list,  # Lista dos números bônus
-                    'total_bonus': total_bonus,  # Quantidade de bônus
-                    'raffle_name': raffle.name,
-                    'user_id': user.id,
-                    'order_id': winner_number.order.id,
-                    'purchase_date': purchase_date,  # Data da compra
-                }
-
-                print(f"DEBUG: Winner data = {winner_data}")
-                # messages.success(request, f'Ganhador sorteado: {user.name}!')  # Removido - polui outras páginas
+                    masked_phone = f"****-{phone[-4:]}"
+            else:
+                masked_phone = "****"
+
+            # Buscar todos os números desse usuário nesta campanha
+            user_numbers = RaffleNumber.objects.filter(
+                raffle=raffle,
+                user=user,
+                status=RaffleNumber.Status.SOLD
+            ).order_by('number').values_list('number', 'source')
+
+            # Números bônus (purchase_bonus, milestone_bonus ou referral)
+            bonus_sources = {'purchase_bonus', 'milestone_bonus', 'referral_inviter', 'referral_invitee'}
+            user_numbers_list = []
+            bonus_numbers_list = []
+            for number, source in user_numbers:
+                user_numbers_list.append(number)
+                if source in bonus_sources:
+                    bonus_numbers_list.append(number)
+
+            # Data da compra do número sorteado (números de indicação não têm pedido)
+            order = winner_number.order
+            purchased_at = order.created_at if order else winner_number.sold_at
+            purchase_date = purchased_at.strftime('%d/%m/%Y às %H:%M') if purchased_at else None
+
+            winner_data = {
+                'number': winner_number.number,
+                'name': user.name,
+                'masked_phone': masked_phone,
+                'real_phone': phone,
+                'total_numbers': len(user_numbers_list),
+                'user_numbers': user_numbers_list,  # Lista de todos os números
+                'bonus_numbers': bonus_numbers_list,  # Lista dos números bônus
+                'total_bonus': len(bonus_numbers_list),  # Quantidade de bônus
+                'raffle_name': raffle.name,
+                'user_id': user.id,
+                'order_id': order.id if order else None,
+                'purchase_date': purchase_date,  # Data da compra
+                # Dados para conferir o sorteio
+                'draw_id': draw.id,
+                'beacon_round': draw.beacon_round,
+                'randomness': draw.randomness,
+                'sold_hash': draw.sold_hash,
+                'eligible_count': draw.eligible_count,
+                'ordinal': draw.ordinal,
+            }
+
+            print(f"DEBUG: Winner data = {winner_data}")
+            # messages.success(request, f'Ganhador sorteado: {user.name}!')  # Removido - polui outras páginas
 
         except Raffle.DoesNotExist:
             messages.error(request, 'Campanha não encontrada.')
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            # Um sorteio anulado libera um novo compromisso
+            if pending_draw:
+                pending_draw.refresh_from_db()
+                if pending_draw.status != RaffleDraw.Status.COMMITTED:
+                    pending_draw = None
         except Exception as e:
             messages.error(request, f'Erro ao sortear: {str(e)}')
 
+    if raffle_id:
+        past_draws = RaffleDraw.objects.filter(
+            raffle_id=raffle_id,
+            status__in=[RaffleDraw.Status.REVEALED, RaffleDraw.Status.VOID]
+        ).select_related('winner').order_by('-committed_at')[:10]
+
     context = {
         'raffles': raffles,
         'selected_raffle_id': raffle_id,
         'winner_data': json.dumps(winner_data) if winner_data else None,
+        'pending_draw': pending_draw,
+        'past_draws': past_draws,
     }
 
     return render(request, 'raffles/draw.html', context)
@@ -0,0 +1,155 @@
+/**
+ * Mapa de Números da Rifa
+ * Desenha o status de todos os números a partir do grid compactado da API
+ * (/api/raffles/<id>/grid/) e o mantém atualizado pelo feed de mudanças
+ * (/api/raffles/<id>/grid-changes/?since=<versão>)
+ */
+
+const GRID_STATUS = {
+    available: 0,
+    reserved: 1,
+    vendido: 2,
+};
+
+// Cores RGBA de cada status (disponível, reservado, vendido)
+const GRID_COLORS = [
+    [229, 231, 235, 255],
+    [245, 158, 11, 255],
+    [16, 185, 129, 255],
+];
+
+class NumberGridManager {
+    constructor(raffleId, containerId = 'number-grid-container', pollSeconds = 5) {
+        this.raffleId = raffleId;
+        this.container = document.getElementById(containerId);
+        this.pollSeconds = pollSeconds;
+        this.version = null;
+        this.totalNumbers = 0;
+        this.statuses = null;
+        this.pollTimer = null;
+    }
+
+    /**
+     * Inicia o gerenciador
+     */
+    async init() {
+        if (!this.container || typeof DecompressionStream === 'undefined') {
+            return;
+        }
+
+        await this.loadGrid();
+        this.pollTimer = setInterval(() => this.pollChanges(), this.pollSeconds * 1000);
+    }
+
+    /**
+     * Baixa o grid completo (o navegador revalida pelo ETag)
+     */
+    async loadGrid() {
+        try {
+            const response = await fetch(`/api/raffles/${this.raffleId}/grid/`);
+            if (!response.ok) {
+                console.warn(`⚠️ Erro ao carregar o grid: ${response.status}`);
+                return;
+            }
+
+            const data = await response.json();
+            const packed = await this.inflate(data.grid);
+
+            this.totalNumbers = data.total_numbers;
+            this.version = data.version;
+            this.statuses = new Uint8Array(this.totalNumbers);
+            for (let position = 0; position < this.totalNumbers; position++) {
+                this.statuses[position] = (packed[position >> 2] >> ((position & 3) << 1)) & 3;
+            }
+
+            this.render();
+        } catch (error) {
+            console.error('❌ Erro ao carregar o grid:', error);
+        }
+    }
+
+    /**
+     * Aplica as mudanças desde a última versão conhecida
+     */
+    async pollChanges() {
+        if (this.version === null) {
+            return this.loadGrid();
+        }
+
+        try {
+            const response = await fetch(`/api/raffles/${this.raffleId}/grid-changes/?since=${this.version}`);
+            if (!response.ok) {
+                return;
+            }
+
+            const data = await response.json();
+            if (data.full_reload || data.total_numbers !== this.totalNumbers) {
+                return this.loadGrid();
+            }
+
+            for (const [status, numbers] of Object.entries(data.changes)) {
+                const code = GRID_STATUS[status];
+                for (const number of numbers) {
+                    this.statuses[number - 1] = code;
+                }
+            }
+            this.version = data.version;
+
+            if (Object.keys(data.changes).length) {
+                this.render();
+            }
+        } catch (error) {
+            console.warn('⚠️ Erro ao buscar mudanças do grid:', error);
+        }
+    }
+
+    /**
+     * Descompacta o grid (base64 de zlib)
+     */
+    async inflate(encoded) {
+        const bytes = Uint8Array.from(atob(encoded), char => char.charCodeAt(0));
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Uint8Array(await new Response(stream).arrayBuffer());
+    }
+
+    /**
+     * Desenha um pixel por número e atualiza a legenda
+     */
+    render() {
+        const canvas = this.container.querySelector('canvas');
+        const columns = Math.min(this.totalNumbers, Math.max(100, Math.ceil(Math.sqrt(this.totalNumbers))));
+        const rows = Math.ceil(this.totalNumbers / columns);
+        canvas.width = columns;
+        canvas.height = rows;
+
+        const context = canvas.getContext('2d');
+        const image = context.createImageData(columns, rows);
+        const counts = [0, 0, 0];
+
+        for (let position = 0; position < this.totalNumbers; position++) {
+            const code = this.statuses[position];
+            counts[code]++;
+            image.data.set(GRID_COLORS[code], position * 4);
+        }
+        context.putImageData(image, 0, 0);
+
+        this.container.querySelector('[data-grid-count="available"]').textContent = counts[0].toLocaleString('pt-BR');
+        this.container.querySelector('[data-grid-count="reserved"]').textContent = counts[1].toLocaleString('pt-BR');
+        this.container.querySelector('[data-grid-count="sold"]').textContent = counts[2].toLocaleString('pt-BR');
+        this.container.hidden = false;
+    }
+}
+
+/**
+ * Inicializar automaticamente quando a página carregar
+ */
+document.addEventListener('DOMContentLoaded', function() {
+    const gridElement = document.querySelector('[data-number-grid]');
+
+    if (gridElement) {
+        const manager = new NumberGridManager(gridElement.getAttribute('data-number-grid'), gridElement.id);
+        manager.init();
+
+        window.numberGridManager = manager;
+    }
+});